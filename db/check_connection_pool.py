@@ -0,0 +1,132 @@
+#!/usr/bin/python
+import filecmp
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from connection_pool import ConnectionPool
+from db import DbOperator
+
+
+"""
+check of the ConnectionPool and the transactions of the DbOperator without
+a PostgreSQL server: the connections are sqlite3 connections to a temporary
+database file (psycopg2 must be installed all the same, db.py imports it).
+
+- connections are reused, at most maxConnections are open at a time and
+  broken connections are replaced
+- transaction() commits, rolls back all statements of a failing block and
+  re-raises the error; nested blocks are part of the outer transaction
+- connection_pool.py is the same in db/ and preprototype_manually/
+
+call from the db folder: python check_connection_pool.py
+
+@institution: TH Luebeck
+@project: DiWi WiSe20/21
+"""
+
+
+# sqlite3 connect function that counts the opened connections
+class SqliteConnector:
+
+
+    def __init__(self, path):
+        self.path = path
+        self.opened = 0
+        self.lock = threading.Lock()
+
+
+    def __call__(self):
+        with self.lock:
+            self.opened = self.opened + 1
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+
+def check(name, ok):
+    print("{:<65} {}".format(name, "ok" if ok else "FAILED"))
+    return not ok
+
+
+def checkPool(path):
+    failed = 0
+    connector = SqliteConnector(path)
+    pool = ConnectionPool(connector, 1, 2)
+    for i in range(10):
+        conn = pool.getConnection()
+        conn.execute("SELECT 1")
+        pool.putConnection(conn)
+    failed = failed + check("10 statements one after another use 1 connection", connector.opened == 1)
+
+    # 8 threads, each holding a connection for a moment
+    inUse = [0, 0]
+    lock = threading.Lock()
+    def work():
+        conn = pool.getConnection()
+        with lock:
+            inUse[0] = inUse[0] + 1
+            inUse[1] = max(inUse[1], inUse[0])
+        time.sleep(0.02)
+        with lock:
+            inUse[0] = inUse[0] - 1
+        pool.putConnection(conn)
+    threads = [threading.Thread(target=work) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    failed = failed + check("8 threads share at most maxConnections = 2", inUse[1] == 2 and connector.opened == 2)
+
+    first = pool.getConnection()
+    second = pool.getConnection()
+    pool.putConnection(first, broken=True)
+    pool.putConnection(second)
+    first = pool.getConnection()
+    second = pool.getConnection()
+    pool.putConnection(first)
+    pool.putConnection(second)
+    failed = failed + check("a broken connection is replaced", pool.opened == 2 and connector.opened == 3)
+    pool.closeAll()
+    failed = failed + check("closeAll closes the idle connections", pool.opened == 0 and len(pool.idle) == 0)
+    return failed
+
+
+def checkTransaction(path):
+    failed = 0
+    dbOperator = DbOperator(SqliteConnector(path))
+    dbOperator.execute("CREATE TABLE sellers (seller_id TEXT PRIMARY KEY, seller_city TEXT);")
+    with dbOperator.transaction():
+        dbOperator.execute("INSERT INTO sellers VALUES ('a', 'luebeck');")
+        with dbOperator.transaction():
+            dbOperator.execute("INSERT INTO sellers VALUES ('b', 'kiel');")
+    failed = failed + check("transaction commits all statements", countSellers(dbOperator) == 2)
+
+    raised = False
+    try:
+        with dbOperator.transaction():
+            dbOperator.execute("INSERT INTO sellers VALUES ('c', 'hamburg');")
+            # duplicate primary key
+            dbOperator.execute("INSERT INTO sellers VALUES ('a', 'berlin');")
+    except sqlite3.IntegrityError:
+        raised = True
+    failed = failed + check("failing transaction re-raises the error", raised)
+    failed = failed + check("failing transaction rolls back all statements", countSellers(dbOperator) == 2)
+    failed = failed + check("connection is released after the failure", dbOperator.pool.opened == len(dbOperator.pool.idle))
+    dbOperator.close()
+    return failed
+
+
+def countSellers(dbOperator):
+    return dbOperator.select("SELECT count(*) FROM sellers;")[0][0]
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as folder:
+        failed = checkPool(os.path.join(folder, "pool.sqlite"))
+        failed = failed + checkTransaction(os.path.join(folder, "transaction.sqlite"))
+    failed = failed + check("connection_pool.py is the same in db/ and preprototype_manually/",
+                            filecmp.cmp("connection_pool.py", "../preprototype_manually/connection_pool.py", shallow=False))
+    if(failed > 0):
+        raise SystemExit(str(failed) + " checks failed")
+    print("all checks passed")
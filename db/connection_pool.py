@@ -0,0 +1,94 @@
+#!/usr/bin/python
+import threading
+
+
+"""
+class ConnectionPool
+keeps database connections open and hands them out again, so the
+DbOperator does not connect once per statement.
+
+connect is any function returning a DB-API connection, e.g.
+lambda: psycopg2.connect(**params) or a stand-in like
+lambda: sqlite3.connect(":memory:", check_same_thread=False)
+(see db/check_connection_pool.py).
+
+db/ and preprototype_manually/ are run on their own from their folders,
+so both contain this module; db/check_connection_pool.py checks that the
+two copies are the same.
+
+@institution: TH Luebeck
+@project: DiWi WiSe20/21
+"""
+
+class ConnectionPool:
+
+
+    # @param connect: function that opens a new connection
+    # @param minConnections: connections opened right away and kept open
+    # @param maxConnections: upper limit, further callers wait for a free connection
+    def __init__(self, connect, minConnections=1, maxConnections=4):
+        self.connect = connect
+        self.minConnections = min(minConnections, maxConnections)
+        self.maxConnections = max(maxConnections, 1)
+        self.idle = []
+        self.opened = 0
+        self.started = False
+        self.condition = threading.Condition()
+
+
+    # returns an idle connection or opens a new one below maxConnections.
+    # The first call opens minConnections, so a DbOperator that is never
+    # used (csv datasource) does not connect at all.
+    def getConnection(self):
+        with self.condition:
+            if(not self.started):
+                self.started = True
+                for i in range(self.minConnections):
+                    self.idle.append(self.openConnection())
+                    self.opened = self.opened + 1
+            while(len(self.idle) == 0 and self.opened >= self.maxConnections):
+                self.condition.wait()
+            if(len(self.idle) > 0):
+                return self.idle.pop()
+            self.opened = self.opened + 1
+        try:
+            return self.openConnection()
+        except Exception:
+            with self.condition:
+                self.opened = self.opened - 1
+                self.condition.notify()
+            raise
+
+
+    # gives a connection back; broken or closed connections are discarded
+    # @param conn: connection from getConnection
+    # @param broken: True if the connection must not be reused
+    def putConnection(self, conn, broken=False):
+        with self.condition:
+            if(broken or getattr(conn, "closed", 0)):
+                self.closeConnection(conn)
+                self.opened = self.opened - 1
+            else:
+                self.idle.append(conn)
+            self.condition.notify()
+
+
+    # closes all idle connections
+    def closeAll(self):
+        with self.condition:
+            for conn in self.idle:
+                self.closeConnection(conn)
+            self.opened = self.opened - len(self.idle)
+            self.idle = []
+
+
+    def openConnection(self):
+        print('Connecting to the PostgreSQL database...')
+        return self.connect()
+
+
+    def closeConnection(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+from concurrent.futures import ThreadPoolExecutor
+import io
+import time
+
+
+"""
+class CsvLoader
+streams the csv files of ../config/db.json from the client into postgres
+with COPY ... FROM STDIN, so the database server does not need to see the
+paths in db.json.
+
+Each file is sent as it is, in chunks of chunkRows rows cut at record
+boundaries, so COPY sees the same text as in the file (e.g. "" stays an
+empty string, an empty field stays NULL). Tables are loaded level by
+level in foreign key order (customers before orders before reviews and
+payments); the tables of one level are independent and load in parallel,
+each on its own pooled connection and in its own transaction.
+
+@institution: TH Luebeck
+@project: DiWi WiSe20/21
+"""
+
+class CsvLoader:
+
+
+    # @param dbOperator: DbOperator whose pool provides the connections
+    # @param statementFactory: StatementFactory for the COPY statements
+    # @param datamodel: datamodel parsed from ../config/db.json
+    # @param chunkRows: rows per COPY chunk
+    # @param workers: tables loaded at the same time
+    def __init__(self, dbOperator, statementFactory, datamodel, chunkRows=50000, workers=4):
+        self.dbOperator = dbOperator
+        self.statementFactory = statementFactory
+        self.datamodel = datamodel
+        self.chunkRows = chunkRows
+        self.workers = workers
+
+
+    # loads all tables, returns dict table -> (rows, seconds, bytes)
+    def load(self):
+        statistics = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            for level in self.getLevels():
+                print("loading " + ", ".join(level))
+                for table, result in zip(level, executor.map(self.loadTable, level)):
+                    statistics[table] = result
+        self.printStatistics(statistics, time.perf_counter() - start)
+        return statistics
+
+
+    # tables grouped by foreign key dependencies, a level only references
+    # tables of earlier levels
+    def getLevels(self):
+        tables = self.datamodel["tables"]
+        requires = {}
+        for table in tables:
+            requires[table] = set([fkey.split(".")[1] for fkey in tables[table]["foreignkeys"]
+                                   if fkey != "" and fkey.split(".")[1] != table])
+        levels = []
+        done = set()
+        while(len(done) < len(tables)):
+            level = [table for table in tables if table not in done and requires[table] <= done]
+            if(len(level) == 0):
+                raise Exception("cyclic foreign keys in db.json")
+            levels.append(level)
+            done.update(level)
+        return levels
+
+
+    # streams one csv file into its table
+    # @param table: name of the table
+    def loadTable(self, table):
+        start = time.perf_counter()
+        statement = self.statementFactory.createCopyFromStdinStatement(self.datamodel, table)
+        rows = 0
+        sentBytes = 0
+        with self.dbOperator.connection() as conn:
+            cur = conn.cursor()
+            with open(self.datamodel["tables"][table]["source"], newline="") as csvFile:
+                records = readRecords(csvFile)
+                # the columns are listed in the COPY statement in db.json order
+                next(records, None)
+                for chunk in self.readChunks(records):
+                    cur.copy_expert(statement, chunk)
+                    rows = rows + chunk.rowCount
+                    sentBytes = sentBytes + len(chunk.getvalue())
+                    print("{}: {} rows".format(table, rows))
+            cur.close()
+        return (rows, time.perf_counter() - start, sentBytes)
+
+
+    # csv chunks of chunkRows rows; quoted line breaks stay inside their row
+    def readChunks(self, records):
+        chunk = CsvChunk()
+        for record in records:
+            chunk.writeRecord(record)
+            if(chunk.rowCount == self.chunkRows):
+                chunk.seek(0)
+                yield chunk
+                chunk = CsvChunk()
+        if(chunk.rowCount > 0):
+            chunk.seek(0)
+            yield chunk
+
+
+    def printStatistics(self, statistics, total):
+        print("table                rows    seconds     rows/s       MB/s")
+        for table, (rows, seconds, sentBytes) in statistics.items():
+            print("{:<15} {:>9} {:>10.2f} {:>10.0f} {:>10.2f}".format(
+                table, rows, seconds, rows / seconds if seconds else 0, sentBytes / 2**20 / seconds if seconds else 0))
+        rows = sum([result[0] for result in statistics.values()])
+        print("{:<15} {:>9} {:>10.2f} {:>10.0f}".format("total", rows, total, rows / total if total else 0))
+
+
+# in-memory csv buffer for one COPY, holds the records as they are in the file
+class CsvChunk(io.StringIO):
+
+    def __init__(self):
+        io.StringIO.__init__(self)
+        self.rowCount = 0
+
+    # @param record: text of one record, see readRecords
+    def writeRecord(self, record):
+        self.write(record)
+        self.rowCount = self.rowCount + 1
+
+
+# raw text of every record of a csv file opened with newline="", the header
+# is the first record. A line ends a record if the number of quotes since the
+# start of the record is even, otherwise a quoted field continues on the next
+# line (escaped quotes "" do not change the parity).
+def readRecords(csvFile):
+    lines = []
+    quotes = 0
+    for line in csvFile:
+        lines.append(line)
+        quotes = quotes + line.count('"')
+        if(quotes % 2 == 0):
+            yield "".join(lines)
+            lines = []
+            quotes = 0
+    if(len(lines) > 0):
+        yield "".join(lines)
@@ -24,17 +24,18 @@ class DataAccessor:
         self.dbOperator = DbOperator()
         self.statementFactory = StatementFactory()
         
-    def getTable(self, table):
+    # @param columns: optional list of columns, only these are read
+    def getTable(self, table, columns=None):
         if(self.main_config["datasource"]=="csv"):
             print("getting Data fom csv")
 
-            return pd.read_csv(self.data_model["tables"][table]["source"])
+            return pd.read_csv(self.data_model["tables"][table]["source"], usecols=columns)
         elif(self.main_config["datasource"]=="postgres"):
             print("getting Data fom postges")
 
-            selectStatements = self.statementFactory.createSeletStatementByTableName(table)
+            selectStatements = self.statementFactory.createSeletStatementByTableName(table, "*" if columns is None else columns)
             df = self.dbOperator.select(selectStatements)
             #return df #falls df schon ein dataframe ist
-            return pd.DataFrame(np.array(df))
+            return pd.DataFrame(np.array(df), columns=columns)
         else:
             print("data source must be either 'csv' or 'postgres'")
\ No newline at end of file
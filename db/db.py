@@ -1,12 +1,18 @@
 #!/usr/bin/python
 from configparser import ConfigParser
+from contextlib import contextmanager
+import threading
 import psycopg2
 
+from connection_pool import ConnectionPool
+
 
 """ 
 class DbOperator
 DbOperator connects to database via ../config/database.ini and 
 executes postgres statements or selects data based on ../conf/db.json
+The connections are kept in a ConnectionPool ([pool] section of database.ini)
+and reused across statements.
 
 @institution: TH Luebeck
 @author: Jakob Poley
@@ -16,8 +22,16 @@ executes postgres statements or selects data based on ../conf/db.json
 class DbOperator:
 
 
-    def __init__(self):
+    # @param connect: optional function that opens a connection, e.g. a
+    #                 stand-in for tests; default is psycopg2.connect with database.ini
+    def __init__(self, connect=None):
         self.params = self.config()
+        poolParams = self.poolConfig()
+        if(connect is None):
+            connect = lambda: psycopg2.connect(**self.params)
+        self.pool = ConnectionPool(connect, int(poolParams["minconnections"]), int(poolParams["maxconnections"]))
+        # connection of the currently open transaction, per thread
+        self.local = threading.local()
 
 
     # setting config parameters for database connection
@@ -41,59 +55,119 @@ class DbOperator:
         return db
 
 
+    # pool sizes from the [pool] section of database.ini, defaults if missing
+    # @param filename: path to db-access config file database.ini
+    def poolConfig(self, filename='../config/database.ini'):
+        pool = {"minconnections": 1, "maxconnections": 4}
+        parser = ConfigParser()
+        parser.read(filename)
+        if parser.has_section('pool'):
+            pool.update(parser.items('pool'))
+        return pool
+
+
+    # runs all statements of the with-block in one transaction on one
+    # connection: commit at the end, rollback and re-raise if a statement fails
+    #   with dbOperator.transaction():
+    #       dbOperator.execute(...)
+    @contextmanager
+    def transaction(self):
+        if(getattr(self.local, "conn", None) is not None):
+            # nested: part of the outer transaction
+            yield
+            return
+        conn = self.pool.getConnection()
+        self.local.conn = conn
+        broken = False
+        try:
+            yield
+            conn.commit()
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(error)
+            print('Transaction rolled back.')
+            broken = self.rollback(conn)
+            raise
+        finally:
+            self.local.conn = None
+            self.pool.putConnection(conn, broken)
+
+
+    # connection for one statement: the one of the open transaction, otherwise
+    # a pooled connection that is committed (or rolled back) afterwards
+    @contextmanager
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if(conn is not None):
+            yield conn
+            return
+        conn = self.pool.getConnection()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            broken = self.rollback(conn)
+            raise
+        finally:
+            self.pool.putConnection(conn, broken)
+
+
+    # returns True if the connection is unusable after the failed rollback
+    def rollback(self, conn):
+        try:
+            conn.rollback()
+            return False
+        except Exception:
+            return True
+
+
+    # closes the pooled connections
+    def close(self):
+        self.pool.closeAll()
+        print('Database connection closed.')
+
+
     # executes query
     # @param query: query string
     def execute(self, query):
-        """ Connect to the PostgreSQL database server """
-        conn = None
+        """ execute on a pooled connection """
         try:
-            # connect to the PostgreSQL server
-            print('Connecting to the PostgreSQL database...')
-            conn = psycopg2.connect(**self.params)
-
-            # create a cursor
-            cur = conn.cursor()
-
-            # execute a statement
-            cur.execute(query)
-            
-            # close the communication with the PostgreSQL
-            cur.close()
-            conn.commit()
+            with self.connection() as conn:
+                # create a cursor
+                cur = conn.cursor()
+
+                # execute a statement
+                cur.execute(query)
+
+                # close the communication with the PostgreSQL
+                cur.close()
         except (Exception, psycopg2.DatabaseError) as error:
+            if(getattr(self.local, "conn", None) is not None):
+                # inside a transaction: transaction() rolls back
+                raise
             print(error)
-        finally:
-            if conn is not None:
-                conn.close()
-                print('Database connection closed.')
 
 
     # selects data
     # @param query: query string
     def select(self, query):
-        """ Connect to the PostgreSQL database server """
-        conn = None
+        """ select on a pooled connection """
+        content = None
         try:
-            # connect to the PostgreSQL server
-            print('Connecting to the PostgreSQL database...')
-            conn = psycopg2.connect(**self.params)
-
-            # create a cursor
-            cur = conn.cursor()
+            with self.connection() as conn:
+                # create a cursor
+                cur = conn.cursor()
 
-            # execute a statement
-            cur.execute(query)
-            
-            # display the postgreSQL select content 
-            content = cur.fetchall()
+                # execute a statement
+                cur.execute(query)
 
-            # close the communication with the PostgreSQL
-            cur.close()
+                # display the postgreSQL select content
+                content = cur.fetchall()
 
+                # close the communication with the PostgreSQL
+                cur.close()
         except (Exception, psycopg2.DatabaseError) as error:
+            if(getattr(self.local, "conn", None) is not None):
+                raise
             print(error)
-        finally:
-            if conn is not None:
-                conn.close()
-                print('Database connection closed.')
-                return content
+        return content
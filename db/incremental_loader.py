@@ -0,0 +1,155 @@
+#!/usr/bin/python
+import csv
+import datetime
+import hashlib
+import time
+
+from csv_loader import CsvChunk, readRecords
+
+
+"""
+class IncrementalLoader
+loads only new or changed rows of the csv files of ../config/db.json instead
+of TRUNCATE and a full COPY of every table.
+
+Per table one of two ways to find the new rows:
+- high-water mark: tables with a last-modified column in program.json
+  ("incremental" -> "watermarks", e.g. reviews.review_answer_timestamp) only
+  send rows whose timestamp is not older than the largest timestamp of the
+  last load. Rows with that same timestamp may still follow in a later file,
+  so they are sent again. The column must change whenever the row changes:
+  orders have no such column (status and delivery dates change after the
+  purchase timestamp) and therefore no watermark.
+- checksum: all other tables are skipped as long as the sha1 of the csv file
+  is unchanged, otherwise all rows are staged and compared
+
+The rows are copied into a temporary staging table, of several staged rows
+with the same upsert key the last one in the file is kept. In the same
+transaction rows that differ from the stored row (by the upsert key) are
+updated, rows with a new key are inserted, and the batch is recorded in the
+metadata table
+load_batches together with the new high-water mark and the checksum. Tables
+without any key (geolocation) are replaced by the staged rows.
+
+@institution: TH Luebeck
+@project: DiWi WiSe20/21
+"""
+
+class IncrementalLoader:
+
+
+    # @param dbOperator: DbOperator whose pool provides the connections
+    # @param statementFactory: StatementFactory for the statements
+    # @param datamodel: datamodel parsed from ../config/db.json
+    # @param incrementalConfig: "incremental" section of program.json
+    # @param levels: tables grouped in foreign key order (CsvLoader.getLevels)
+    def __init__(self, dbOperator, statementFactory, datamodel, incrementalConfig, levels):
+        self.dbOperator = dbOperator
+        self.statementFactory = statementFactory
+        self.datamodel = datamodel
+        self.watermarks = incrementalConfig.get("watermarks", {})
+        self.keys = incrementalConfig.get("keys", {})
+        self.chunkRows = incrementalConfig.get("chunkRows", 50000)
+        self.levels = levels
+
+
+    # loads all tables in foreign key order
+    def load(self):
+        self.dbOperator.execute(self.statementFactory.createLoadBatchTableStatement())
+        for level in self.levels:
+            for table in level:
+                self.loadTable(table)
+
+
+    # loads the new or changed rows of one table in one transaction
+    # @param table: name of the table
+    def loadTable(self, table):
+        source = self.datamodel["tables"][table]["source"]
+        checksum = fileHash(source)
+        started = datetime.datetime.now()
+        start = time.perf_counter()
+        with self.dbOperator.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(self.statementFactory.createSelectLastLoadBatchStatement(), (table,))
+            lastBatch = cur.fetchone()
+            if(lastBatch is not None and lastBatch[1] == checksum):
+                print(table + ": unchanged")
+                cur.close()
+                return
+            watermarkField = self.watermarks.get(table)
+            watermark = lastBatch[0] if lastBatch is not None and watermarkField is not None else None
+            staged, newWatermark = self.stage(cur, table, source, watermarkField, watermark)
+            keys = self.getKeys(table)
+            if(len(keys) > 0):
+                cur.execute(self.statementFactory.createDeduplicateStagingStatement(table, keys))
+                staged = staged - cur.rowcount
+                cur.execute(self.statementFactory.createUpdateFromStagingStatement(self.datamodel, table, keys))
+                updated = cur.rowcount
+                cur.execute(self.statementFactory.createInsertFromStagingStatement(self.datamodel, table, keys))
+                inserted = cur.rowcount
+            else:
+                cur.execute("DELETE FROM " + table + ";")
+                cur.execute(self.statementFactory.createInsertFromStagingStatement(self.datamodel, table, keys))
+                updated = 0
+                inserted = cur.rowcount
+            cur.execute(self.statementFactory.createInsertLoadBatchStatement(),
+                        (table, started, datetime.datetime.now(), staged, inserted, updated,
+                         newWatermark if newWatermark is not None else watermark, checksum))
+            cur.close()
+        print("{}: {} rows staged, {} inserted, {} updated in {:.2f} s".format(
+            table, staged, inserted, updated, time.perf_counter() - start))
+
+
+    # copies the rows not older than the watermark into a temporary staging
+    # table. The records are sent as they are in the file, like by the
+    # CsvLoader; only the watermark field is parsed.
+    # @return: number of staged rows and largest staged watermark value
+    def stage(self, cur, table, source, watermarkField, watermark):
+        cur.execute(self.statementFactory.createStagingTableStatement(table))
+        statement = self.statementFactory.createCopyFromStdinStatement(self.datamodel, table, "staging_" + table)
+        fields = self.datamodel["tables"][table]["fields"]
+        watermarkIndex = fields.index(watermarkField) if watermarkField is not None else None
+        staged = 0
+        newWatermark = None
+        chunk = CsvChunk()
+        with open(source, newline="") as csvFile:
+            records = readRecords(csvFile)
+            next(records, None)
+            for record in records:
+                if(watermarkIndex is not None):
+                    # timestamps in the Olist format compare correctly as text;
+                    # rows without timestamp are always staged, the key dedups them
+                    value = next(csv.reader([record]))[watermarkIndex]
+                    if(value != "" and watermark is not None and value < watermark):
+                        continue
+                    if(value != "" and (newWatermark is None or value > newWatermark)):
+                        newWatermark = value
+                chunk.writeRecord(record)
+                if(chunk.rowCount == self.chunkRows):
+                    staged = staged + self.copyChunk(cur, statement, chunk)
+                    chunk = CsvChunk()
+        staged = staged + self.copyChunk(cur, statement, chunk)
+        return staged, newWatermark
+
+
+    def copyChunk(self, cur, statement, chunk):
+        if(chunk.rowCount > 0):
+            chunk.seek(0)
+            cur.copy_expert(statement, chunk)
+        return chunk.rowCount
+
+
+    # upsert key: program.json "incremental" -> "keys", else the primary key of db.json
+    def getKeys(self, table):
+        if(table in self.keys):
+            return self.keys[table]
+        return [key for key in self.datamodel["tables"][table]["primarykeys"] if key != ""]
+
+
+# sha1 of a file, read in blocks of 1 MB
+def fileHash(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as sourceFile:
+        for block in iter(lambda: sourceFile.read(2**20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
@@ -1,8 +1,13 @@
 #!/usr/bin/python
 
+import time
+
 from json_parse import JsonParser 
 from db import DbOperator
 from statementFactory import StatementFactory
+from csv_loader import CsvLoader
+from incremental_loader import IncrementalLoader
+from rollups import RollupRefresher
 
 '''
 ProgramController: program flow controller creates a SQL statement and executes it in pstgresql depending on main.json
@@ -18,33 +23,103 @@ class ProgramController:
         self.data_model = JsonParser("../config/db.json").parse()
         self.dbOperator = DbOperator()
         self.statementFactory = StatementFactory()
+        self.timings = []
 
     # executes program parts
     def execute(self):
-        self.initializeDatabase()
+        try:
+            self.initializeDatabase()
+        finally:
+            self.dbOperator.close()
 
     # initializes database with steps that are defined in ../config/program.json
+    # every step runs in one transaction on one pooled connection
     def initializeDatabase(self):
+        self.timings = []
+        # "ddl" -> "mode": "deferred" creates bare tables and adds keys and
+        # indexes after the insert, so COPY does not maintain them row by row
+        ddlConfig = self.main_json.get("ddl", {"mode": "inline"})
+        deferred = ddlConfig["mode"]=="deferred"
         if(self.main_json["db"]["create"]=="y"):
             print("create database")
-            createTableStatements = self.statementFactory.createCreateTablesStatement(self.data_model)
-            for val in createTableStatements.values():
-                self.dbOperator.execute(val)
+            start = time.perf_counter()
+            if(deferred):
+                createTableStatements = self.statementFactory.createCreateBareTablesStatement(self.data_model)
+            else:
+                createTableStatements = self.statementFactory.createCreateTablesStatement(self.data_model)
+            self.executeInTransaction(createTableStatements.values())
+            self.timings.append(("create", time.perf_counter() - start))
         if(self.main_json["db"]["insert"]=="y"):
             print("insert csv data into tables")
-            statements = self.statementFactory.createStatementInsertCsvIntoTable(self.data_model) 
-            for query in statements.values():
-                self.dbOperator.execute(query)
+            start = time.perf_counter()
+            copyConfig = self.main_json.get("copy", {"mode": "server"})
+            if(copyConfig["mode"]=="stdin"):
+                # client streams the csv files, one transaction per table
+                CsvLoader(self.dbOperator, self.statementFactory, self.data_model,
+                          copyConfig.get("chunkRows", 50000), copyConfig.get("workers", 4)).load()
+            else:
+                statements = self.statementFactory.createStatementInsertCsvIntoTable(self.data_model) 
+                self.executeInTransaction(statements.values())
+            self.timings.append(("insert", time.perf_counter() - start))
+        if(deferred and self.main_json["db"]["create"]=="y"):
+            self.createConstraints(ddlConfig.get("indexes", {}))
+        if(self.main_json["db"].get("incremental", "n")=="y"):
+            print("load new and changed rows into tables")
+            levels = CsvLoader(self.dbOperator, self.statementFactory, self.data_model).getLevels()
+            IncrementalLoader(self.dbOperator, self.statementFactory, self.data_model,
+                              self.main_json.get("incremental", {}), levels).load()
+        # "db" -> "rollups": pre-aggregated results for the reports, refreshed
+        # after every load; they depend on the tables and are dropped with them
+        rollups = RollupRefresher(self.dbOperator, self.statementFactory, self.main_json.get("rollups", {}))
         if(self.main_json["db"]["drop"]=="y"):
+            print("drop rollups from database")
+            rollups.drop()
             print("drop tables from database")
             dropTableStatements = self.statementFactory.createDropTablesStatement(self.data_model)
-            for val in dropTableStatements.values():
-                self.dbOperator.execute(val)
+            self.executeInTransaction(dropTableStatements.values())
         if(self.main_json["db"]["delete"]=="y"):
             print("delete content from tables")
             deleteContentStatements = self.statementFactory.createDeleteContentFromTablesStatement(self.data_model)
-            for val in deleteContentStatements.values():
-                self.dbOperator.execute(val)
+            self.executeInTransaction(deleteContentStatements.values())
+        if(self.main_json["db"].get("rollups", "n")=="y" and self.main_json["db"]["drop"]!="y"):
+            print("refresh rollups")
+            start = time.perf_counter()
+            rollups.refresh()
+            self.timings.append(("rollups", time.perf_counter() - start))
+            rollups.printStatus()
+        self.printTimings()
+
+    # adds primary keys, foreign keys and secondary indexes to the loaded
+    # tables and updates the planner statistics, one timing per phase
+    # @param indexes: additional indexed fields per table from program.json
+    def createConstraints(self, indexes):
+        print("add primary keys")
+        start = time.perf_counter()
+        self.executeInTransaction(self.statementFactory.createAddPrimaryKeysStatement(self.data_model).values())
+        self.timings.append(("primary keys", time.perf_counter() - start))
+        print("add foreign keys")
+        start = time.perf_counter()
+        self.executeInTransaction(self.statementFactory.createAddForeignKeysStatement(self.data_model).values())
+        self.timings.append(("foreign keys", time.perf_counter() - start))
+        print("create secondary indexes")
+        start = time.perf_counter()
+        self.executeInTransaction(self.statementFactory.createSecondaryIndexesStatement(self.data_model, indexes).values())
+        self.timings.append(("indexes", time.perf_counter() - start))
+        print("analyze")
+        start = time.perf_counter()
+        self.dbOperator.execute(self.statementFactory.createAnalyzeStatement())
+        self.timings.append(("analyze", time.perf_counter() - start))
+
+    def printTimings(self):
+        for phase, seconds in self.timings:
+            print("{:<15} {:>8.2f} s".format(phase, seconds))
+
+    # executes statements all-or-nothing
+    # @param statements: SQL statements
+    def executeInTransaction(self, statements):
+        with self.dbOperator.transaction():
+            for statement in statements:
+                self.dbOperator.execute(statement)
 
 
 if __name__ == '__main__':
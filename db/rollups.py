@@ -0,0 +1,95 @@
+#!/usr/bin/python
+import datetime
+import time
+
+
+"""
+class RollupRefresher
+creates and refreshes the pre-aggregated rollups of the five reports (sales
+per seller, orders per day, mean delay per state, score per seller and
+product, score and payment type counts), so the reports read a few hundred
+rows instead of joining the fact tables.
+
+The rollups are materialized views ("rollups" -> "mode": "view") or plain
+tables ("table") defined by StatementFactory.createRollupQueries. Every
+refresh runs in its own transaction and is recorded in the metadata table
+rollup_refreshes. A rollup is stale if an incremental load batch finished
+after its last refresh (load_batches, see IncrementalLoader) or the refresh
+is older than "staleAfterHours".
+
+@institution: TH Luebeck
+@project: DiWi WiSe20/21
+"""
+
+class RollupRefresher:
+
+
+    # @param dbOperator: DbOperator whose pool provides the connections
+    # @param statementFactory: StatementFactory for the statements
+    # @param rollupConfig: "rollups" section of program.json
+    def __init__(self, dbOperator, statementFactory, rollupConfig):
+        self.dbOperator = dbOperator
+        self.statementFactory = statementFactory
+        self.mode = rollupConfig.get("mode", "view")
+        self.staleAfterHours = rollupConfig.get("staleAfterHours", 24)
+        self.rollups = self.statementFactory.createRollupQueries()
+
+
+    # creates missing rollups and refreshes all of them
+    # @return: dict rollup name -> (rows, seconds)
+    def refresh(self):
+        self.dbOperator.execute(self.statementFactory.createRollupRefreshTableStatement())
+        statistics = {}
+        for name, query in self.rollups.items():
+            statistics[name] = self.refreshRollup(name, query)
+        return statistics
+
+
+    def refreshRollup(self, name, query):
+        start = time.perf_counter()
+        with self.dbOperator.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(self.statementFactory.createCreateRollupStatement(name, query, self.mode))
+            cur.execute(self.statementFactory.createRefreshRollupStatement(name, query, self.mode))
+            cur.execute("SELECT COUNT(*) FROM " + name + ";")
+            rows = cur.fetchone()[0]
+            seconds = time.perf_counter() - start
+            cur.execute(self.statementFactory.createInsertRollupRefreshStatement(),
+                        (name, datetime.datetime.now(), seconds, rows))
+            cur.close()
+        print("{}: {} rows in {:.2f} s".format(name, rows, seconds))
+        return (rows, seconds)
+
+
+    # drops all rollups, e.g. before the tables they are built from
+    def drop(self):
+        self.dbOperator.execute(" ".join([self.statementFactory.createDropRollupStatement(name, self.mode)
+                                          for name in self.rollups]))
+
+
+    # prints the last refresh of every rollup and whether it is stale
+    def printStatus(self):
+        self.dbOperator.execute(self.statementFactory.createRollupRefreshTableStatement())
+        self.dbOperator.execute(self.statementFactory.createLoadBatchTableStatement())
+        refreshes = self.dbOperator.select(self.statementFactory.createSelectLastRollupRefreshesStatement()) or []
+        lastLoad = (self.dbOperator.select(self.statementFactory.createSelectLastLoadStatement()) or [(None,)])[0][0]
+        refreshes = dict([(refresh[0], refresh[1:]) for refresh in refreshes])
+        now = datetime.datetime.now()
+        print("rollup                       refreshed at           seconds       rows  status")
+        for name in self.rollups:
+            if(name not in refreshes):
+                print("{:<28} {:<19} {:>9} {:>10}  stale".format(name, "never", "", ""))
+                continue
+            refreshedAt, seconds, rows = refreshes[name]
+            print("{:<28} {:%Y-%m-%d %H:%M:%S} {:>9.2f} {:>10}  {}".format(
+                name, refreshedAt, seconds, rows, self.getStatus(refreshedAt, lastLoad, now)))
+
+
+    # "fresh" or the reason why the rollup is stale
+    def getStatus(self, refreshedAt, lastLoad, now):
+        if(lastLoad is not None and lastLoad > refreshedAt):
+            return "stale since load at {:%Y-%m-%d %H:%M:%S}".format(lastLoad)
+        staleAt = refreshedAt + datetime.timedelta(hours=self.staleAfterHours)
+        if(now > staleAt):
+            return "stale since {:%Y-%m-%d %H:%M:%S}".format(staleAt)
+        return "fresh until {:%Y-%m-%d %H:%M:%S}".format(staleAt)
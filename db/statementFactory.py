@@ -42,6 +42,62 @@ class StatementFactory:
         return statement
 
 
+    # creates tables without primary keys, foreign keys and indexes, they are
+    # added after the bulk load (see createAddPrimaryKeysStatement etc.)
+    # @param datamodel: datamodel parsed from ../config/db.json with JsonParser in program.py
+    def createCreateBareTablesStatement(self, datamodel):
+        statement = {}
+        for table in datamodel["tables"]:
+            fields = datamodel["tables"][table]["fields"]
+            types = datamodel["tables"][table]["types"]
+            parts = ", ".join([fields[i] + " " + types[i] for i in range(len(fields))])
+            statement["createTable"+table]="CREATE TABLE " + table + " (" + parts + ");"
+        return statement
+
+
+    # adds the primary keys of db.json to existing tables
+    # @param datamodel: datamodel parsed from ../config/db.json with JsonParser in program.py
+    def createAddPrimaryKeysStatement(self, datamodel):
+        statement = {}
+        for table in datamodel["tables"]:
+            primarykey = [key for key in datamodel["tables"][table]["primarykeys"] if key != ""]
+            if(len(primarykey) > 0):
+                statement["primaryKey"+table]="ALTER TABLE " + table + " ADD PRIMARY KEY (" + ", ".join(primarykey) + ");"
+        return statement
+
+
+    # adds the foreign keys of db.json (field.table.field) to existing tables
+    # @param datamodel: datamodel parsed from ../config/db.json with JsonParser in program.py
+    def createAddForeignKeysStatement(self, datamodel):
+        statement = {}
+        for table in datamodel["tables"]:
+            for fkey in datamodel["tables"][table]["foreignkeys"]:
+                if(fkey != ""):
+                    fkeyparts = fkey.split(".")
+                    statement["foreignKey"+table+fkeyparts[0]]=("ALTER TABLE " + table + " ADD FOREIGN KEY (" + fkeyparts[0]
+                                                                 + ") REFERENCES " + fkeyparts[1] + "(" + fkeyparts[2] + ");")
+        return statement
+
+
+    # creates secondary indexes on all foreign key fields of db.json and on
+    # the additional fields per table (e.g. {"order_items": ["seller_id"]})
+    # @param datamodel: datamodel parsed from ../config/db.json with JsonParser in program.py
+    # @param indexes: additional indexed fields per table
+    def createSecondaryIndexesStatement(self, datamodel, indexes={}):
+        statement = {}
+        for table in datamodel["tables"]:
+            fields = [fkey.split(".")[0] for fkey in datamodel["tables"][table]["foreignkeys"] if fkey != ""]
+            fields = fields + [field for field in indexes.get(table, []) if field not in fields]
+            for field in fields:
+                statement["index"+table+field]="CREATE INDEX IF NOT EXISTS " + table + "_" + field + "_idx ON " + table + " (" + field + ");"
+        return statement
+
+
+    # updates the planner statistics of all tables
+    def createAnalyzeStatement(self):
+        return "ANALYZE;"
+
+
     # inserts csv-files into tables
     # @param datamodel: datamodel parsed from ../config/db.json with JsonParser in program.py
     def createStatementInsertCsvIntoTable(self, datamodel):
@@ -52,6 +108,150 @@ class StatementFactory:
         return statement
 
 
+    # copies csv data sent by the client (see CsvLoader) into a table
+    # @param datamodel: datamodel parsed from ../config/db.json with JsonParser in program.py
+    # @param table: name of the table
+    # @param target: table to copy into, default table (e.g. its staging table)
+    def createCopyFromStdinStatement(self, datamodel, table, target=None):
+        fields = datamodel["tables"][table]["fields"]
+        return "COPY " + (target or table) + " (" + ", ".join(fields) + ") FROM STDIN WITH (FORMAT csv);"
+
+
+    # metadata table with one row per incremental load batch (see IncrementalLoader)
+    def createLoadBatchTableStatement(self):
+        return ("CREATE TABLE IF NOT EXISTS load_batches (batch_id SERIAL PRIMARY KEY, table_name VARCHAR, "
+                "started_at TIMESTAMP, finished_at TIMESTAMP, rows_staged INT, rows_inserted INT, rows_updated INT, "
+                "high_water_mark VARCHAR, source_checksum VARCHAR);")
+
+
+    # high-water mark and checksum of the last load batch of a table (parameter: table name)
+    def createSelectLastLoadBatchStatement(self):
+        return ("SELECT high_water_mark, source_checksum FROM load_batches "
+                "WHERE table_name = %s ORDER BY batch_id DESC LIMIT 1;")
+
+
+    # records a load batch (parameters: table name, started, finished, rows staged,
+    # inserted and updated, high-water mark, checksum)
+    def createInsertLoadBatchStatement(self):
+        return ("INSERT INTO load_batches (table_name, started_at, finished_at, rows_staged, rows_inserted, "
+                "rows_updated, high_water_mark, source_checksum) VALUES (%s, %s, %s, %s, %s, %s, %s, %s);")
+
+
+    # temporary staging table with the columns of a table, dropped at commit
+    # @param table: name of the table
+    def createStagingTableStatement(self, table):
+        return "CREATE TEMPORARY TABLE staging_" + table + " (LIKE " + table + ") ON COMMIT DROP;"
+
+
+    # deletes staged rows whose key is staged again later, the last row of a
+    # key in the file stays (the staging table is filled in file order)
+    # @param table: name of the table
+    # @param keys: fields identifying a row
+    def createDeduplicateStagingStatement(self, table, keys):
+        matches = " AND ".join(["s." + key + " = later." + key for key in keys])
+        return ("DELETE FROM staging_" + table + " AS s USING staging_" + table + " AS later WHERE " + matches
+                + " AND s.ctid < later.ctid;")
+
+
+    # updates the rows whose key is in the staging table and whose values differ
+    # @param datamodel: datamodel parsed from ../config/db.json with JsonParser in program.py
+    # @param table: name of the table
+    # @param keys: fields identifying a row
+    def createUpdateFromStagingStatement(self, datamodel, table, keys):
+        fields = [field for field in datamodel["tables"][table]["fields"] if field not in keys]
+        assignments = ", ".join([field + " = s." + field for field in fields])
+        matches = " AND ".join([table + "." + key + " = s." + key for key in keys])
+        targetValues = ", ".join([table + "." + field for field in fields])
+        stagedValues = ", ".join(["s." + field for field in fields])
+        return ("UPDATE " + table + " SET " + assignments + " FROM staging_" + table + " AS s WHERE " + matches
+                + " AND (" + targetValues + ") IS DISTINCT FROM (" + stagedValues + ");")
+
+
+    # inserts the staged rows whose key is not in the table yet, all staged
+    # rows if there is no key
+    # @param datamodel: datamodel parsed from ../config/db.json with JsonParser in program.py
+    # @param table: name of the table
+    # @param keys: fields identifying a row
+    def createInsertFromStagingStatement(self, datamodel, table, keys):
+        fields = datamodel["tables"][table]["fields"]
+        statement = ("INSERT INTO " + table + " (" + ", ".join(fields) + ") SELECT "
+                     + ", ".join(["s." + field for field in fields]) + " FROM staging_" + table + " AS s")
+        if(len(keys) == 0):
+            return statement + ";"
+        matches = " AND ".join(["t." + key + " = s." + key for key in keys])
+        return statement + " WHERE NOT EXISTS (SELECT 1 FROM " + table + " AS t WHERE " + matches + ");"
+
+
+    # queries of the pre-aggregated rollups the reports read instead of the
+    # fact tables (see RollupRefresher), name -> SELECT
+    def createRollupQueries(self):
+        delay = "FLOOR(EXTRACT(EPOCH FROM (o.order_estimated_delivery_date - o.order_delivered_customer_date)) / 86400)"
+        rollups = {}
+        rollups["rollup_sales_per_seller"] = ("SELECT i.seller_id, SUM(i.price) AS price, COUNT(*) AS items "
+                                              "FROM order_items i JOIN orders o ON o.order_id = i.order_id GROUP BY i.seller_id")
+        rollups["rollup_orders_per_day"] = ("SELECT CAST(o.order_purchase_timestamp AS DATE) AS purchase_date, "
+                                            "COUNT(DISTINCT o.order_id) AS orders, COUNT(i.order_id) AS items, SUM(i.price) AS price "
+                                            "FROM orders o LEFT JOIN order_items i ON i.order_id = o.order_id "
+                                            "GROUP BY CAST(o.order_purchase_timestamp AS DATE)")
+        rollups["rollup_delay_per_state"] = ("SELECT c.customer_state, AVG(" + delay + ") AS difftime, COUNT(" + delay + ") AS orders "
+                                             "FROM orders o LEFT JOIN customers c ON c.customer_id = o.customer_id GROUP BY c.customer_state")
+        for field in ["seller_id", "product_id"]:
+            rollups["rollup_score_per_" + field.split("_")[0]] = ("SELECT i." + field + ", AVG(r.review_score) AS review_score, COUNT(*) AS reviews "
+                                                                  "FROM orders o JOIN order_items i ON i.order_id = o.order_id "
+                                                                  "JOIN reviews r ON r.order_id = o.order_id GROUP BY i." + field)
+        rollups["rollup_score_counts"] = ("SELECT review_score, COUNT(*) AS number, SUM(review_score) AS score "
+                                          "FROM reviews WHERE review_score BETWEEN 1 AND 5 GROUP BY review_score")
+        rollups["rollup_payment_types"] = ("SELECT payment_type, COUNT(*) AS number, SUM(payment_value) AS payment_value "
+                                           "FROM payments GROUP BY payment_type")
+        return rollups
+
+
+    # creates a rollup without data if it does not exist yet
+    # @param name: name of the rollup
+    # @param query: SELECT of the rollup
+    # @param mode: "view" for a materialized view, "table" for a rollup table
+    def createCreateRollupStatement(self, name, query, mode="view"):
+        if(mode == "table"):
+            return "CREATE TABLE IF NOT EXISTS " + name + " AS " + query + " WITH NO DATA;"
+        return "CREATE MATERIALIZED VIEW IF NOT EXISTS " + name + " AS " + query + " WITH NO DATA;"
+
+
+    # recomputes a rollup, a rollup table is emptied and filled again in
+    # the same transaction
+    def createRefreshRollupStatement(self, name, query, mode="view"):
+        if(mode == "table"):
+            return "DELETE FROM " + name + "; INSERT INTO " + name + " " + query + ";"
+        return "REFRESH MATERIALIZED VIEW " + name + ";"
+
+
+    def createDropRollupStatement(self, name, mode="view"):
+        if(mode == "table"):
+            return "DROP TABLE IF EXISTS " + name + ";"
+        return "DROP MATERIALIZED VIEW IF EXISTS " + name + ";"
+
+
+    # metadata table with one row per refresh of a rollup
+    def createRollupRefreshTableStatement(self):
+        return ("CREATE TABLE IF NOT EXISTS rollup_refreshes (refresh_id SERIAL PRIMARY KEY, rollup_name VARCHAR, "
+                "refreshed_at TIMESTAMP, seconds FLOAT, row_count INT);")
+
+
+    # records a refresh (parameters: rollup name, refreshed at, seconds, rows)
+    def createInsertRollupRefreshStatement(self):
+        return "INSERT INTO rollup_refreshes (rollup_name, refreshed_at, seconds, row_count) VALUES (%s, %s, %s, %s);"
+
+
+    # last refresh per rollup
+    def createSelectLastRollupRefreshesStatement(self):
+        return ("SELECT DISTINCT ON (rollup_name) rollup_name, refreshed_at, seconds, row_count FROM rollup_refreshes "
+                "ORDER BY rollup_name, refresh_id DESC;")
+
+
+    # end of the last incremental load batch, NULL without batches
+    def createSelectLastLoadStatement(self):
+        return "SELECT MAX(finished_at) FROM load_batches;"
+
+
     # deletes content from tables
     # @param datamodel: datamodel parsed from ../config/db.json with JsonParser in program.py
     def createDeleteContentFromTablesStatement(self, datamodel):
@@ -71,6 +271,8 @@ class StatementFactory:
 
     # gets data form postges
     # @param tablename: name of the table to select in DataAccessor
-    # @param fields: fields of the table to select in DataAccessor -> not implemented yet!!!
+    # @param fields: "*" or list of the fields of the table to select in DataAccessor
     def createSeletStatementByTableName(self, tablename, fields="*"):
+        if(isinstance(fields, list)):
+            fields = ", ".join(fields)
         return "SELECT " + fields +" FROM " +tablename
\ No newline at end of file
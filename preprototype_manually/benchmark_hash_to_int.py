@@ -0,0 +1,64 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+micro-benchmark of the HashToIntConverter
+
+Vergleicht den vektorisierten HashToIntConverter mit der ursprünglichen
+Implementierung (dict + Python-Schleife über data.index) auf synthetischen
+32-stelligen Hex-ids in der Größenordnung der Olist Produkte.
+
+Aufruf: python benchmark_hash_to_int.py [Anzahl ids]
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import sys
+import timeit
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from hash_to_int_converter import HashToIntConverter
+
+
+# original implementation for comparison
+class LoopHashToIntConverter:
+    def __init__(self, hashvalues):
+        self.hashvalues = hashvalues
+    def getDict(self):
+        hashvalues = self.hashvalues
+        result={}
+        for index, hashvalue in enumerate(hashvalues):
+            result[hashvalue] = index
+        return result
+    def convert(self, data):
+        dicttemp = self.getDict()
+        indexlist = []
+        for index in data.index:
+            indexlist.append(dicttemp[index])
+        data.index = indexlist
+        return data
+
+
+def benchmark(numberOfIds, repeat=5):
+    hashvalues = [uuid.uuid4().hex for i in range(numberOfIds)]
+    data = pd.Series(np.random.rand(numberOfIds), index=hashvalues)
+
+    loopResult = LoopHashToIntConverter(data.index).convert(data.copy())
+    vectorizedResult = HashToIntConverter(data.index).convert(data)
+    assert loopResult.index.tolist() == vectorizedResult.index.tolist()
+    assert data.index.tolist() == hashvalues
+
+    loopTime = min(timeit.repeat(lambda: LoopHashToIntConverter(data.index).convert(data.copy()), number=1, repeat=repeat))
+    vectorizedTime = min(timeit.repeat(lambda: HashToIntConverter(data.index).convert(data), number=1, repeat=repeat))
+    print("ids: {}".format(numberOfIds))
+    print("loop:       {:8.2f} ms".format(1000 * loopTime))
+    print("vectorized: {:8.2f} ms".format(1000 * vectorizedTime))
+    print("speedup:    {:8.1f} x".format(loopTime / vectorizedTime))
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 33000)
@@ -0,0 +1,109 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+scaling benchmark of the PartitionedAggregator
+
+Erzeugt eine synthetische order item fact table mit dem scale-fachen der
+Olist Größe (ca. 112.650 order items, 3.095 Verkäufer, 32.951 Produkte)
+und misst die Kennzahlen pro Verkäufer und pro Produkt mit einem
+einfachen pandas groupby und mit dem PartitionedAggregator auf 1 bis N
+Prozessen:
+  sales per seller     -> 1.6 Summe price pro seller_id
+  punctuality          -> 3.2 mean, median, p95 und count pro seller_id
+  score per product    -> 5.3 mean review_score pro product_id
+  price differences    -> 1.8 Preisabweichung pro Produkt, mean pro seller_id
+Laufzeiten und Ergebnisse aller Prozesszahlen werden mit dem groupby
+verglichen.
+
+Aufruf: python benchmark_partitioned_aggregation.py [scale] [max workers]
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from dimension_metrics import getPriceDifferences
+from partitioned_aggregation import PartitionedAggregator
+
+
+OLIST_ITEMS = 112650
+OLIST_SELLERS = 3095
+OLIST_PRODUCTS = 32951
+
+
+# order items with seller, product, price, delay and review score; sellers
+# and products grow with the scale, a few large sellers have most items
+def createFact(scale, seed=42):
+    random = np.random.default_rng(seed)
+    rows = OLIST_ITEMS * scale
+    return pd.DataFrame({
+        "seller_id": (random.zipf(1.3, rows) % (OLIST_SELLERS * scale)).astype("int32"),
+        "product_id": random.integers(0, OLIST_PRODUCTS * scale, rows).astype("int32"),
+        "price": np.round(random.lognormal(4.5, 0.9, rows), 2),
+        "delay": random.normal(-260, 200, rows),
+        "review_score": random.integers(1, 6, rows).astype("float64")})
+
+
+def getWorkloads(aggregator):
+    return {
+        "sales per seller": lambda fact: aggregator.aggregate(fact, "seller_id", [("price", "price", "sum")]),
+        "punctuality": lambda fact: aggregator.aggregate(fact, "seller_id", [("mean_delay_hours", "delay", "mean"),
+                                                                             ("median_delay_hours", "delay", "median"),
+                                                                             ("p95_delay_hours", "delay", "p95"),
+                                                                             ("orders", None, "count")]),
+        "score per product": lambda fact: aggregator.aggregate(fact, "product_id", [("review_score", "review_score", "mean")]),
+        "price differences": lambda fact: aggregator.aggregate(
+            aggregator.mapPartitions(fact[["product_id", "seller_id", "price"]], "product_id", getPriceDifferences),
+            "seller_id", [("price_difference", "price_difference", "mean")])}
+
+
+# the same workloads with a plain pandas groupby in this process
+def getGroupbyWorkloads():
+    return {
+        "sales per seller": lambda fact: fact.groupby("seller_id")[["price"]].sum(),
+        "punctuality": groupbyPunctuality,
+        "score per product": lambda fact: fact.groupby("product_id")[["review_score"]].mean(),
+        "price differences": lambda fact: getPriceDifferences(fact[["product_id", "seller_id", "price"]]).groupby("seller_id")[["price_difference"]].mean()}
+
+
+def groupbyPunctuality(fact):
+    delay = fact.groupby("seller_id")["delay"]
+    return pd.DataFrame({"mean_delay_hours": delay.mean(), "median_delay_hours": delay.median(),
+                         "p95_delay_hours": delay.quantile(0.95), "orders": delay.size()})
+
+
+def isEqual(expected, result):
+    return (expected.shape == result.shape and expected.index.equals(result.index)
+            and np.allclose(expected.to_numpy(dtype="float64"), result.to_numpy(dtype="float64"), equal_nan=True))
+
+
+def benchmark(scale, maxWorkers, repeat=3):
+    fact = createFact(scale)
+    print("rows: {}, sellers: {}, products: {}".format(len(fact), fact["seller_id"].nunique(), fact["product_id"].nunique()))
+    workerCounts = sorted(set([1] + [2**exponent for exponent in range(1, maxWorkers.bit_length()) if 2**exponent < maxWorkers] + [maxWorkers]))
+    expected = {}
+    baseline = {}
+    print("{:<20} {:>8} {:>10} {:>10}".format("workload", "workers", "s", "speedup"))
+    for name, workload in getGroupbyWorkloads().items():
+        expected[name] = workload(fact)
+        baseline[name] = min(timeit.repeat(lambda: workload(fact), number=1, repeat=repeat))
+        print("{:<20} {:>8} {:>10.2f} {:>10.2f}".format(name, "groupby", baseline[name], 1.0))
+    for workers in workerCounts:
+        workloads = getWorkloads(PartitionedAggregator(workers, minRows=0))
+        for name, workload in workloads.items():
+            result = workload(fact)
+            seconds = min(timeit.repeat(lambda: workload(fact), number=1, repeat=repeat))
+            status = "" if isEqual(expected[name], result) else "   DIFFERENT"
+            print("{:<20} {:>8} {:>10.2f} {:>10.2f}{}".format(name, workers, seconds, baseline[name] / seconds, status))
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+              int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count())
@@ -0,0 +1,82 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+calendar dimension for the time based reports
+
+Die reports 1.3 und 2.2 teilen die Bestellungen bzw. Umsätze pro Tag im
+Monat, Wochentag und Monat durch die Anzahl der Tage dieses Kalender-
+abschnitts. Statt diese Teiler in jedem report aus den Zeitstempeln neu zu
+berechnen (pd.to_datetime, dt.date, drop_duplicates, groupby), wird einmal
+eine Kalendertabelle mit einer Zeile pro Tag des Zeitraums gebaut und die
+Anzahl der Tage pro Abschnitt vorab gezählt. Die Teiler sind dann nur noch
+Lookups.
+
+Die Kalender-Schlüssel (Day, Dayofweek, Month, Year, Season) werden mit
+addCalendarKeys vektorisiert an beliebige Zeitstempel-Spalten angehängt.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import numpy as np
+import pandas as pd
+
+
+CALENDAR_KEYS = ["Day", "Dayofweek", "Month", "Year", "Season"]
+
+# season per month (index 1-12): Spring = 2, Summer = 3, Autumn = 4, Winter = 1
+SEASONS = np.array([0, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 1])
+
+
+# adds the calendar keys of a timestamp column as <key><suffix> columns,
+# e.g. Day_order, Month_order for suffix "_order"
+# @param df: DataFrame, modified in place and returned
+# @param column: timestamp column (parsed if it is still text)
+# @param suffix: appended to the key names
+def addCalendarKeys(df, column, suffix=""):
+    timestamps = df[column]
+    if(not pd.api.types.is_datetime64_any_dtype(timestamps.dtype)):
+        timestamps = pd.to_datetime(timestamps)
+    calendar = timestamps.dt
+    df["Day" + suffix] = calendar.day
+    df["Dayofweek" + suffix] = calendar.dayofweek
+    df["Month" + suffix] = calendar.month
+    df["Year" + suffix] = calendar.year
+    # missing timestamps get season 0
+    df["Season" + suffix] = SEASONS[calendar.month.fillna(0).to_numpy().astype("int64")]
+    return df
+
+
+# one row per day from the first to the last timestamp with its calendar
+# keys; "observed" marks the days with at least one timestamp
+# @param timestamps: Series of timestamps, e.g. the purchase timestamps
+def buildCalendar(timestamps):
+    dates = pd.to_datetime(timestamps).dropna().dt.normalize()
+    if(len(dates) == 0):
+        days = pd.DatetimeIndex([])
+    else:
+        days = pd.date_range(dates.min(), dates.max(), freq="D")
+    calendar = addCalendarKeys(pd.DataFrame({"date": days}), "date")
+    calendar["observed"] = calendar["date"].isin(dates.unique())
+    return calendar
+
+
+# calendar table with precomputed numbers of days per calendar key
+class CalendarDimension:
+
+    # @param calendar: DataFrame from buildCalendar
+    def __init__(self, calendar):
+        self.calendar = calendar
+        observed = calendar[calendar["observed"]]
+        self.observedDays = dict([(key, observed.groupby(key).size()) for key in CALENDAR_KEYS])
+        self.rangeDays = dict([(key, calendar.groupby(key).size()) for key in CALENDAR_KEYS])
+
+    # number of days per value of a calendar key, e.g. per day of the month
+    # @param key: one of CALENDAR_KEYS
+    # @param observedOnly: True counts only days with a timestamp (the
+    #        divider of the reports), False every day of the range
+    def getDayCounts(self, key, observedOnly=True):
+        if(observedOnly):
+            return self.observedDays[key]
+        return self.rangeDays[key]
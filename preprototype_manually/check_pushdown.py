@@ -0,0 +1,79 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+comparison of the postgres pushdown with the pandas aggregation
+
+Ruft jede DataWrangler Methode mit pushdown (main.json "postgres" ->
+"pushdown") einmal mit "n" (Tabellen laden, in pandas aggregieren) und einmal
+mit "y" (Aggregation als SQL in postgres) gegen die konfigurierte Datenbank
+auf und vergleicht die Ergebnisse und die Laufzeiten.
+
+Mit dem Argument "embedded" wird unabhängig von der main.json gegen eine
+DuckDB Datenbank im Prozess über die .csv Dateien der db.json geprüft, ohne
+postgres Server (benötigt das duckdb Paket).
+
+Aufruf: python check_pushdown.py [embedded]  (sonst main.json "datasource": "postgres" oder "embedded")
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from preprototypeManuallyCsv import DataAccessor, DataWrangler
+
+
+METHODS = ["getNumberSellers", "getNumberOfCustomers", "getNumberOfOrders", "getSalesBySeller",
+           "getTotalPrice", "getDeliveryDateDelayVersusGeoLocation", "getNumberOfPaymenttypes",
+           "getGeneralCustomerSatisfaction", "getReviewScoreVersusSeller", "getReviewScoreVersusProduct"]
+
+
+# numbers of a result as flat float array, Series and DataFrames sorted by index
+def toNumbers(result):
+    if(isinstance(result, (pd.Series, pd.DataFrame))):
+        result = result.sort_index()
+    return np.asarray(result, dtype="float64").ravel()
+
+
+def isEqual(pandasResult, sqlResult):
+    if(isinstance(pandasResult, (pd.Series, pd.DataFrame))):
+        if(list(pandasResult.sort_index().index) != list(sqlResult.sort_index().index)):
+            return False
+    pandasNumbers = toNumbers(pandasResult)
+    sqlNumbers = toNumbers(sqlResult)
+    return pandasNumbers.shape == sqlNumbers.shape and np.allclose(pandasNumbers, sqlNumbers, equal_nan=True)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+if __name__=="__main__":
+    dataAccessor = DataAccessor()
+    if("embedded" in sys.argv[1:]):
+        dataAccessor.main_config["datasource"] = "embedded"
+        dataAccessor.dbOperator = dataAccessor.createDbOperator()
+    if(not dataAccessor.isSqlDatasource()):
+        raise SystemExit('main.json "datasource" must be "postgres" or "embedded"')
+    postgresConfig = dataAccessor.main_config.setdefault("postgres", {})
+    dataWrangler = DataWrangler(dataAccessor)
+    failed = 0
+    print("{:<45} {:>10} {:>10}".format("method", "pandas s", "sql s"))
+    for method in METHODS:
+        postgresConfig["pushdown"] = "n"
+        pandasResult, pandasTime = timed(getattr(dataWrangler, method))
+        postgresConfig["pushdown"] = "y"
+        sqlResult, sqlTime = timed(getattr(dataWrangler, method))
+        equal = isEqual(pandasResult, sqlResult)
+        failed = failed + (0 if equal else 1)
+        print("{:<45} {:>10.2f} {:>10.2f}   {}".format(method, pandasTime, sqlTime, "ok" if equal else "DIFFERENT"))
+    dataAccessor.dbOperator.close()
+    if(failed > 0):
+        raise SystemExit(str(failed) + " methods differ")
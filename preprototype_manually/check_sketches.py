@@ -0,0 +1,133 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+error bounds of the sketches of the approximate mode
+
+Prüft HyperLogLog und TDigest aus sketches.py auf synthetischen Daten:
+- HyperLogLog: relativer Fehler höchstens 3 Standardfehler
+  (3 * 1.04 / sqrt(2^precision)) für 10 bis 10^6 unterschiedliche Werte
+- TDigest: Rangfehler der geschätzten cdf an den exakten Quantilen p1 bis
+  p99 höchstens 1 % für mehrere Verteilungen, Histogramm kumuliert ebenso
+- merge: chunkweise gefüllte und zusammengeführte Sketches halten dieselben
+  Grenzen ein (HyperLogLog sogar mit identischen Registern)
+
+Mit dem Argument "data" werden zusätzlich die DataWrangler Methoden des
+approximate mode mit dem exakten Ergebnis auf den konfigurierten Daten
+verglichen.
+
+Aufruf: python check_sketches.py [data]
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from sketches import HyperLogLog, TDigest
+
+
+CARDINALITIES = [10, 1000, 50000, 1000000]
+QUANTILES = np.linspace(0.01, 0.99, 99)
+MAX_RANK_ERROR = 0.01
+CHUNKS = 10
+
+
+def hexIds(numbers):
+    return pd.Series(numbers).map("{:032x}".format)
+
+
+def checkHyperLogLog(random, precision=14):
+    failed = 0
+    print("{:<25} {:>10} {:>10} {:>10} {:>10}".format("HyperLogLog", "exact", "estimate", "error %", "bound %"))
+    for cardinality in CARDINALITIES:
+        # every id twice, like the ids of a fact table
+        ids = hexIds(random.permutation(np.repeat(random.choice(2**62, cardinality, replace=False), 2)))
+        sketch = HyperLogLog(precision).add(ids)
+        merged = HyperLogLog(precision)
+        for chunk in np.array_split(ids, CHUNKS):
+            merged.merge(HyperLogLog(precision).add(chunk))
+        error = abs(sketch.count() - cardinality) / cardinality
+        bound = 3 * sketch.relativeError()
+        ok = error <= bound and np.array_equal(sketch.registers, merged.registers)
+        failed = failed + (not ok)
+        print("{:<25} {:>10} {:>10} {:>10.3f} {:>10.3f} {}".format("ids", cardinality, sketch.count(), 100 * error, 100 * bound, "ok" if ok else "FAILED"))
+    return failed
+
+
+def checkTDigest(random, rows=1000000, compression=200):
+    distributions = {"uniform": random.uniform(0, 1000, rows),
+                     "normal": random.normal(0, 1, rows),
+                     "lognormal": random.lognormal(3, 1.5, rows),
+                     "hours (integer)": np.floor(random.exponential(50, rows))}
+    failed = 0
+    print("{:<25} {:>10} {:>10} {:>10}".format("TDigest", "rank %", "merged %", "hist %"))
+    for name, values in distributions.items():
+        sketch = TDigest(compression).add(values)
+        merged = TDigest(compression)
+        for chunk in np.array_split(values, CHUNKS):
+            merged.merge(TDigest(compression).add(chunk))
+        rankError = getRankError(sketch, values)
+        mergedError = getRankError(merged, values)
+        # histogram, compared cumulated over the bins
+        counts, edges = merged.histogram(100)
+        histError = getRankError(merged, values, edges[1:-1], np.cumsum(counts)[:-1] / rows)
+        ok = max(rankError, mergedError, histError) <= MAX_RANK_ERROR
+        failed = failed + (not ok)
+        print("{:<25} {:>10.3f} {:>10.3f} {:>10.3f} {}".format(name, 100 * rankError, 100 * mergedError, 100 * histError, "ok" if ok else "FAILED"))
+    return failed
+
+
+# largest distance of the estimated shares <= x to the exact ones; with ties
+# (e.g. whole hours) every share between "< x" and "<= x" is exact
+# @param points: x, default the exact quantiles QUANTILES of the values
+# @param estimates: estimated shares, default sketch.cdf(points)
+def getRankError(sketch, values, points=None, estimates=None):
+    ordered = np.sort(values)
+    if(points is None):
+        points = np.quantile(ordered, QUANTILES)
+    if(estimates is None):
+        estimates = sketch.cdf(points)
+    below = np.searchsorted(ordered, points, side="left") / len(ordered)
+    atMost = np.searchsorted(ordered, points, side="right") / len(ordered)
+    return np.max(np.maximum(0, np.maximum(below - estimates, estimates - atMost)))
+
+
+# approximate DataWrangler methods versus the exact ones on the configured data
+def checkDataWrangler():
+    from preprototypeManuallyCsv import DataAccessor, DataWrangler
+    dataAccessor = DataAccessor()
+    approximateConfig = dataAccessor.main_config.setdefault("approximate", {})
+    dataWrangler = DataWrangler(dataAccessor)
+    failed = 0
+    bound = 3 * dataAccessor.createHyperLogLog().relativeError()
+    for method in ["getNumberSellers", "getNumberOfCustomers", "getNumberOfOrders"]:
+        approximateConfig["enabled"] = "n"
+        exact = getattr(dataWrangler, method)()
+        approximateConfig["enabled"] = "y"
+        estimate = getattr(dataWrangler, method)()
+        ok = abs(estimate - exact) <= bound * exact
+        failed = failed + (not ok)
+        print("{:<25} {:>10} {:>10} {}".format(method, exact, estimate, "ok" if ok else "FAILED"))
+    approximateConfig["enabled"] = "n"
+    values = dataWrangler.getReviewAnswerSpeed().dropna().to_numpy()
+    approximateConfig["enabled"] = "y"
+    sketch = dataWrangler.getReviewAnswerSpeed()
+    rankError = getRankError(sketch, values)
+    ok = rankError <= MAX_RANK_ERROR
+    failed = failed + (not ok)
+    print("{:<25} {:>10} {:>10.3f} {}".format("getReviewAnswerSpeed", len(values), 100 * rankError, "ok" if ok else "FAILED"))
+    return failed
+
+
+if __name__=="__main__":
+    random = np.random.default_rng(42)
+    failed = checkHyperLogLog(random) + checkTDigest(random)
+    if("data" in sys.argv[1:]):
+        failed = failed + checkDataWrangler()
+    if(failed > 0):
+        raise SystemExit(str(failed) + " checks failed")
+    print("all error bounds hold")
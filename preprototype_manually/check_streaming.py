@@ -0,0 +1,59 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+comparison of the streaming mode with the in-memory aggregation
+
+Ruft jede DataWrangler Methode mit streaming mode (main.json "streaming")
+einmal mit ganz geladenen Tabellen und der order fact table und einmal
+chunkweise mit Teilaggregaten auf, jeweils mit einem eigenen DataAccessor
+ohne Cache, und vergleicht Ergebnisse, Laufzeiten und den höchsten
+Speicherbedarf (tracemalloc).
+
+Aufruf: python check_streaming.py [chunkRows]
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import sys
+import tracemalloc
+
+from preprototypeManuallyCsv import DataAccessor, DataWrangler
+from check_pushdown import isEqual, timed
+
+
+METHODS = ["getNumberOfOrders", "getSalesBySeller", "getTotalPrice", "getDeliveryDateDelayVersusGeoLocation",
+           "getNumberOfPaymenttypes", "getGeneralCustomerSatisfaction"]
+
+
+# results, seconds and peak memory in MB of all METHODS
+def runMethods(streaming, chunkRows):
+    dataAccessor = DataAccessor()
+    dataAccessor.main_config["cache"] = {"enabled": "n"}
+    dataAccessor.main_config["streaming"] = {"enabled": streaming, "chunkRows": chunkRows}
+    dataAccessor.tableCache = None
+    dataWrangler = DataWrangler(dataAccessor)
+    results = {}
+    seconds = {}
+    tracemalloc.start()
+    for method in METHODS:
+        results[method], seconds[method] = timed(getattr(dataWrangler, method))
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return results, seconds, peak
+
+
+if __name__=="__main__":
+    chunkRows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    memoryResults, memorySeconds, memoryPeak = runMethods("n", chunkRows)
+    streamResults, streamSeconds, streamPeak = runMethods("y", chunkRows)
+    failed = 0
+    print("{:<45} {:>10} {:>10}".format("method", "memory s", "stream s"))
+    for method in METHODS:
+        equal = isEqual(memoryResults[method], streamResults[method])
+        failed = failed + (0 if equal else 1)
+        print("{:<45} {:>10.2f} {:>10.2f}   {}".format(method, memorySeconds[method], streamSeconds[method], "ok" if equal else "DIFFERENT"))
+    print("{:<45} {:>10.1f} {:>10.1f}".format("peak memory MB", memoryPeak, streamPeak))
+    if(failed > 0):
+        raise SystemExit(str(failed) + " methods differ")
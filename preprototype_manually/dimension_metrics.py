@@ -0,0 +1,158 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+metric by dimension: one statistic per group in a single pass
+
+Statt für jede Gruppe (z.B. jeden Bundesstaat einer hartcodierten Liste)
+eine Maske über alle Zeilen zu bilden, werden die Gruppen einmal in
+Integer-Codes übersetzt (pd.factorize, bei category Spalten sind das die
+vorhandenen Codes). count, sum und mean sind dann ein np.bincount, min und
+max ein ufunc.at, median und Perzentile (p90, p95, ...) ein gemeinsames
+Sortieren nach Code und Wert, das pro Spalte nur einmal stattfindet.
+Der Aufwand hängt nur noch von der Anzahl der Zeilen ab, nicht von Zeilen
+mal Gruppen. Die Gruppen kommen aus den Daten.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import numpy as np
+import pandas as pd
+
+
+# statistic of the values per group, groups sorted, missing keys and
+# missing values are left out
+# @param keys: group of every row (Series, array or list)
+# @param values: metric of every row; None counts the rows per group
+# @param statistic: "count", "sum", "mean", "min", "max", "median" or
+#        "p<percent>", e.g. "p90"
+# @return: Series indexed by the groups found in keys
+def metricByDimension(keys, values=None, statistic="mean"):
+    name = statistic if values is None else getattr(values, "name", statistic)
+    return metricsByDimension(keys, [(name, values, statistic)])[name]
+
+
+# several statistics per group with the groups coded only once. The values
+# of a column are converted and, for medians and percentiles, sorted only
+# once, however many statistics of the column are asked for.
+# @param keys: group of every row (Series, array or list)
+# @param metrics: list of (column name, values or None, statistic); pass the
+#        same values object for statistics of the same column
+# @return: DataFrame indexed by the groups found in keys, one column per metric
+def metricsByDimension(keys, metrics):
+    keys = pd.Series(keys, copy=False)
+    codes, groups = pd.factorize(keys, sort=True)
+    index = pd.Index(np.asarray(groups), name=keys.name)
+    columns = {}
+    codedValues = {}
+    for name, values, statistic in metrics:
+        if(id(values) not in codedValues):
+            codedValues[id(values)] = CodedValues(codes, values, len(index))
+        columns[name] = codedValues[id(values)].aggregate(statistic)
+    return pd.DataFrame(columns, index=index)
+
+
+# float values of a metric, timedeltas in days
+def toNumbers(values):
+    values = pd.Series(values, copy=False)
+    if(pd.api.types.is_timedelta64_dtype(values.dtype)):
+        values = values / pd.Timedelta(days=1)
+    return values.to_numpy(dtype="float64", na_value=np.nan)
+
+
+# the values of one metric with the group code of every value; missing keys
+# and missing values are left out
+class CodedValues:
+
+    # @param codes: group code of every row, -1 for a missing key
+    # @param values: metric of every row; None counts the rows per group
+    # @param groups: number of groups
+    def __init__(self, codes, values, groups):
+        if(values is None):
+            numbers = np.zeros(len(codes))
+        else:
+            numbers = toNumbers(values)
+        valid = (codes >= 0) & ~np.isnan(numbers)
+        self.codes = codes[valid]
+        self.values = numbers[valid]
+        self.counts = np.bincount(self.codes, minlength=groups)
+        self.ordered = None
+
+    # statistic per code 0 .. groups-1; groups without values get NaN (count 0)
+    def aggregate(self, statistic):
+        if(statistic == "count"):
+            return self.counts
+        sums = np.bincount(self.codes, weights=self.values, minlength=len(self.counts))
+        if(statistic == "sum"):
+            return sums
+        if(statistic == "mean"):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return sums / self.counts
+        if(statistic in ["min", "max"]):
+            return extremeOfCodes(self.codes, self.values, self.counts, statistic)
+        return quantileOfCodes(self.getOrdered(), self.counts, toQuantile(statistic))
+
+    # values sorted by code, within a code ascending; sorted on first use and
+    # shared by all quantiles of the values. The values are sorted first, then
+    # stable by code, with up to 32767 groups as int16 for numpy's radix sort.
+    def getOrdered(self):
+        if(self.ordered is None):
+            order = np.argsort(self.values)
+            codes = self.codes[order]
+            if(len(self.counts) <= np.iinfo("int16").max):
+                codes = codes.astype("int16")
+            self.ordered = self.values[order[np.argsort(codes, kind="stable")]]
+        return self.ordered
+
+
+# smallest or largest value per code
+def extremeOfCodes(codes, values, counts, statistic):
+    if(statistic == "min"):
+        result = np.full(len(counts), np.inf)
+        np.minimum.at(result, codes, values)
+    else:
+        result = np.full(len(counts), -np.inf)
+        np.maximum.at(result, codes, values)
+    result[counts == 0] = np.nan
+    return result
+
+
+# "median" -> 0.5, "p90" -> 0.9
+def toQuantile(statistic):
+    if(statistic == "median"):
+        return 0.5
+    if(statistic.startswith("p") and statistic[1:].replace(".", "", 1).isdigit()):
+        return float(statistic[1:]) / 100
+    raise ValueError("unknown statistic " + statistic)
+
+
+# quantile per code with linear interpolation like pandas
+# @param ordered: values sorted by code, see CodedValues.getOrdered
+# @param counts: number of values per code
+def quantileOfCodes(ordered, counts, quantile):
+    result = np.full(len(counts), np.nan)
+    if(len(ordered) == 0):
+        return result
+    starts = np.cumsum(counts) - counts
+    filled = counts > 0
+    # position within the group, independent of where the group starts
+    position = quantile * (counts[filled] - 1)
+    fraction = position - np.floor(position)
+    lower = starts[filled] + np.floor(position).astype("int64")
+    upper = starts[filled] + np.ceil(position).astype("int64")
+    result[filled] = ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+    return result
+
+
+# 1.8 price difference of every seller to the average price of a product,
+# only for products sold by more than one seller; the first order item of
+# every seller and product counts. Module level, so that the
+# PartitionedAggregator can run it per partition of product_id.
+# @param product: order items with product_id, seller_id and price
+def getPriceDifferences(product):
+    dupes_without_seller = product.drop_duplicates(subset = ["seller_id", "product_id"], keep = "first")
+    only_dupes = dupes_without_seller[dupes_without_seller.duplicated(["product_id"], keep = False)]
+    average_price = only_dupes.groupby("product_id")["price"].transform("mean")
+    return pd.DataFrame({"seller_id": only_dupes["seller_id"],
+                         "price_difference": (only_dupes["price"] - average_price) / average_price})
@@ -0,0 +1,120 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+embedded analytical database as third datasource
+
+Mit main.json "datasource": "embedded" laufen die reports ohne postgres
+Server: DuckDB fragt die .csv Dateien der db.json direkt im Prozess ab
+(spaltenbasiert und vektorisiert, auf mehreren Threads). Jede Tabelle wird
+mit den in der db.json deklarierten types als view über read_csv angelegt
+bzw. mit "materialize": "y" einmal als Tabelle eingelesen. Die SELECTs
+kommen wie bei postgres aus der StatementFactory, so dass getTable mit
+Spaltenauswahl und die pushdown Aggregationen unverändert funktionieren.
+
+Wie beim ConnectionPool wird erst bei der ersten Abfrage verbunden, und
+alle EmbeddedOperator eines Prozesses (ein DataAccessor pro report,
+OutputManager usw.) teilen sich eine Verbindung pro Datenbank und db.json,
+die Tabellen werden also nur einmal angelegt bzw. eingelesen. Jeder
+worker Prozess hat seine eigene Verbindung; mit "materialize": "y" und
+":memory:" liest also jeder worker, der SQL ausführt, die .csv Dateien
+selbst ein.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import json
+import os
+import threading
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+# shared connections of this process: key -> [connection, number of operators]
+connections = {}
+connectionsLock = threading.Lock()
+
+
+# DbOperator replacement for an in-process DuckDB database
+class EmbeddedOperator:
+
+    # @param datamodel: parsed config/db.json
+    # @param statementFactory: StatementFactory for the table statements
+    # @param embeddedConfig: main.json "embedded" section with "database"
+    #        (":memory:" or a file), "threads" and "materialize"
+    def __init__(self, datamodel, statementFactory, embeddedConfig=None):
+        if duckdb is None:
+            raise ImportError("the embedded datasource requires the duckdb package")
+        self.datamodel = datamodel
+        self.statementFactory = statementFactory
+        self.embeddedConfig = embeddedConfig or {}
+        # forked processes must not use the connection of their parent
+        self.key = json.dumps([os.getpid(), self.embeddedConfig, datamodel["tables"]], sort_keys=True)
+        self.conn = None
+
+    # the shared connection, opened with the tables on the first call
+    def getConnection(self):
+        if(self.conn is None):
+            with connectionsLock:
+                if(self.key not in connections):
+                    connections[self.key] = [self.connect(), 0]
+                connections[self.key][1] = connections[self.key][1] + 1
+                self.conn = connections[self.key][0]
+        return self.conn
+
+    def connect(self):
+        conn = duckdb.connect(self.embeddedConfig.get("database", ":memory:"))
+        if("threads" in self.embeddedConfig):
+            conn.execute("SET threads TO " + str(int(self.embeddedConfig["threads"])) + ";")
+        materialize = self.embeddedConfig.get("materialize", "n")=="y"
+        for table in self.datamodel["tables"]:
+            conn.execute(self.statementFactory.createCreateCsvTableStatement(self.datamodel, table, materialize))
+        return conn
+
+    # executes a statement
+    # @param query: query string
+    def execute(self, query):
+        cur = self.getConnection().cursor()
+        cur.execute(query)
+        cur.close()
+
+    # selects data, returns the rows as list of tuples like DbOperator.select
+    # @param query: query string
+    def select(self, query):
+        cur = self.getConnection().cursor()
+        content = cur.execute(query).fetchall()
+        cur.close()
+        return content
+
+    # result of a select as DataFrames of about itersize rows; DuckDB hands
+    # out whole vectors of 2048 rows column by column
+    # @param query: query string
+    # @param itersize: rows per DataFrame
+    def selectChunks(self, query, itersize=50000):
+        # every call gets its own cursor, so the ExecutionPlanner threads
+        # can read at the same time
+        cur = self.getConnection().cursor()
+        try:
+            cur.execute(query)
+            vectors = max(1, itersize // 2048)
+            while True:
+                chunk = cur.fetch_df_chunk(vectors)
+                if(len(chunk) == 0):
+                    break
+                yield chunk
+        finally:
+            cur.close()
+
+    # gives the shared connection back, the last operator closes it
+    def close(self):
+        if(self.conn is None):
+            return
+        with connectionsLock:
+            connections[self.key][1] = connections[self.key][1] - 1
+            if(connections[self.key][1] == 0):
+                connections.pop(self.key)[0].close()
+        self.conn = None
@@ -0,0 +1,167 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+dependency-aware execution of the executionPlan in config/reportings.json
+
+Jeder report in der reportings.json listet in seinem executionPlan die
+DataWrangler Schritte, die er benötigt. Unter "steps" ist für jeden Schritt
+die DataWrangler Methode und die benötigten Tabellen bzw. anderen Schritte
+eingetragen. Der ExecutionPlanner baut daraus einen DAG über alle reports.
+Gemeinsame Teilberechnungen (z.B. die order fact Tabelle der reports 1, 2, 3
+und 5) kommen nur einmal im DAG vor. Der DAG wird mit einem Thread-Pool
+ausgeführt, jeder Knoten startet, sobald seine Vorgänger fertig sind.
+Schlägt ein Knoten fehl, wird der Fehler festgehalten und alle Knoten, die
+von ihm abhängen, werden übersprungen. Die reports berechnen die fehlenden
+Schritte dann selbst und melden den Fehler in ihrem Status.
+
+Knoten:  "table:<name>" lädt eine Tabelle in den Cache des DataAccessors,
+         "step:<name>"  ruft eine Methode des DataWranglers auf.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import time
+
+
+class ExecutionPlanner:
+
+    # @param reportings: parsed config/reportings.json
+    # @param dataWrangler: DataWrangler whose methods are the steps
+    def __init__(self, reportings, dataWrangler):
+        self.reports = reportings["reports"]
+        self.steps = reportings["steps"]
+        self.dataWrangler = dataWrangler
+        self.tables = dataWrangler.dataAccessor.db_config["tables"]
+        self.nodes = {}
+        self.results = {}
+        self.walltimes = {}
+        self.errors = {}
+
+    # builds the DAG of all nodes the given reports need
+    # @param reportNames: values of "reportName" in reportings.json
+    def buildPlan(self, reportNames):
+        self.nodes = {}
+        for report in self.reports.values():
+            if(report["reportName"] in reportNames):
+                for step in report["executionPlan"]:
+                    self.addNode("step:" + step, report["reportName"])
+        return self.nodes
+
+    def addNode(self, node, reportName):
+        if(node in self.nodes):
+            self.nodes[node]["usedBy"].add(reportName)
+            return
+        kind, name = node.split(":", 1)
+        if(kind == "table"):
+            requires = []
+        elif(name in self.steps):
+            requires = [self.toNode(required) for required in self.steps[name]["requires"]]
+        else:
+            raise ValueError("step '" + name + "' is not defined in reportings.json")
+        self.nodes[node] = {"requires": requires, "usedBy": {reportName}}
+        for required in requires:
+            self.addNode(required, reportName)
+
+    def toNode(self, name):
+        if(name in self.tables):
+            return "table:" + name
+        return "step:" + name
+
+    # nodes grouped into levels; all nodes of a level can run in parallel
+    def getLevels(self):
+        levels = []
+        done = set()
+        while(len(done) < len(self.nodes)):
+            level = sorted([node for node in self.nodes if node not in done
+                            and all(required in done for required in self.nodes[node]["requires"])])
+            if(len(level) == 0):
+                raise ValueError("cyclic dependency in reportings.json")
+            levels.append(level)
+            done.update(level)
+        return levels
+
+    def printPlan(self):
+        print("+++++ execution plan ++++")
+        for i, level in enumerate(self.getLevels()):
+            print("level " + str(i) + ":")
+            for node in level:
+                usedBy = sorted(self.nodes[node]["usedBy"])
+                print("    {:<45} used by {}".format(node, ", ".join(usedBy)))
+
+    # runs the DAG on a thread pool, every node starts as soon as all nodes it
+    # requires are finished. Table loads only pay off with the table cache.
+    # A failing node is recorded in self.errors and the nodes depending on it
+    # are skipped, the other nodes still run.
+    # @param workers: number of threads
+    def execute(self, workers=1):
+        self.results = {}
+        self.walltimes = {}
+        self.errors = {}
+        remaining = dict((node, set(self.nodes[node]["requires"])) for node in self.nodes)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            while(len(remaining) > 0 or len(running) > 0):
+                for node in [node for node in remaining if len(remaining[node]) == 0]:
+                    del remaining[node]
+                    running[executor.submit(self.executeNode, node)] = node
+                finished, pending = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = running.pop(future)
+                    try:
+                        self.results[node] = future.result()
+                    except Exception as error:
+                        self.errors[node] = "failed: " + repr(error)
+                        self.skipDependents(node, remaining)
+                        continue
+                    for waiting in remaining.values():
+                        waiting.discard(node)
+        return self.results
+
+    # removes all nodes which directly or indirectly require a failed node
+    def skipDependents(self, failedNode, remaining):
+        for node in [node for node in remaining if failedNode in self.nodes[node]["requires"]]:
+            if(node in remaining):
+                del remaining[node]
+                self.errors[node] = "skipped, " + failedNode + " failed"
+                self.skipDependents(node, remaining)
+
+    def executeNode(self, node):
+        start = time.perf_counter()
+        kind, name = node.split(":", 1)
+        try:
+            if(kind == "table"):
+                return self.dataWrangler.dataAccessor.getTable(name)
+            return getattr(self.dataWrangler, self.steps[name]["method"])()
+        finally:
+            self.walltimes[node] = time.perf_counter() - start
+
+    # step results of one report by DataWrangler method name
+    def getResults(self, reportName):
+        results = {}
+        for node in self.nodes:
+            kind, name = node.split(":", 1)
+            if(kind == "step" and reportName in self.nodes[node]["usedBy"] and node in self.results):
+                results[self.steps[name]["method"]] = self.results[node]
+        return results
+
+
+# serves the precomputed step results of the ExecutionPlanner to a report and
+# delegates all other calls to the DataWrangler, also the steps which failed
+# or were skipped in the plan
+class PlannedDataWrangler:
+
+    # @param dataWrangler: DataWrangler of the report
+    # @param results: dict DataWrangler method name -> result
+    def __init__(self, dataWrangler, results):
+        self.dataWrangler = dataWrangler
+        self.results = results
+
+    def __getattr__(self, name):
+        if(name in self.results):
+            result = self.results[name]
+            # reports modify their data, shared results are handed out as copies
+            return lambda: result.copy() if hasattr(result, "copy") else result
+        return getattr(self.dataWrangler, name)
@@ -0,0 +1,37 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+maps hash values (hex ids) to plot indices
+
+Der HashToIntConverter ersetzt den Index einer Series oder eines DataFrames
+(z.B. seller_id oder product_id nach einem groupby) durch fortlaufende
+Integer, damit die Werte als Linie geplottet werden können. Die Zuordnung
+wird über pd.factorize in einem vektorisierten Schritt berechnet.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import pandas as pd
+
+
+class HashToIntConverter:
+
+    # @param hashvalues: hash values in plot order, usually data.index
+    def __init__(self, hashvalues):
+        self.hashvalues = hashvalues
+        self.uniques = pd.factorize(pd.Index(hashvalues))[1]
+
+    # returns the mapping hash value -> int
+    def getDict(self):
+        return dict(zip(self.uniques, range(len(self.uniques))))
+
+    # returns a shallow copy of data with the hash index replaced by ints.
+    # The input is not modified. Hash values unknown to the converter get -1.
+    # @param data: Series or DataFrame indexed by hash values
+    def convert(self, data):
+        codes = pd.Categorical(data.index, categories=self.uniques).codes
+        converted = data.copy(deep=False)
+        converted.index = codes
+        return converted
@@ -0,0 +1,160 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+dictionary encoding of the hex id columns
+
+customer_id, order_id, seller_id und product_id sind 32-stellige Hex-Strings.
+Die IdRegistry vergibt für jede id einmalig einen dichten int32 Schlüssel
+(0, 1, 2, ...), so dass alle Tabellen über Integer gejoint und gruppiert
+werden. Die Zuordnung wird pro Spalte als .npy Datei neben den Snapshots
+gespeichert und kann jederzeit zurück in die Hex-Strings übersetzt werden.
+Einmal vergebene Schlüssel bleiben stabil, neue ids werden hinten angehängt.
+Nachgeschlagen wird in einem dict id -> Schlüssel, neue ids werden ohne
+Kopie der bisherigen angehängt (beim chunkweisen Lesen pro Chunk) und nur
+einmal pro Ladevorgang mit save() gespeichert, spätestens bevor ein Snapshot
+mit ihren Schlüsseln geschrieben wird.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+# code for missing ids
+MISSING_ID = -1
+
+
+# global id dictionary, one per id column
+class IdRegistry:
+
+    # @param registryFolder: folder in which the dictionaries are stored
+    # @param columns: id columns to encode, e.g. ["order_id", "seller_id"]
+    def __init__(self, registryFolder, columns):
+        self.registryFolder = registryFolder
+        self.columns = columns
+        # per column the ids in code order and the code of every id
+        self.ids = {}
+        self.codes = {}
+        self.unsaved = set()
+        # tables may be loaded from several threads (ExecutionPlanner)
+        self.lock = threading.Lock()
+        os.makedirs(self.registryFolder, exist_ok=True)
+        self.version = self.loadVersion()
+        for column in self.columns:
+            self.ids[column] = self.loadIds(column).tolist()
+            self.codes[column] = dict(zip(self.ids[column], range(len(self.ids[column]))))
+
+    # builds the dictionaries from all tables which contain an id column,
+    # tables without foreign keys (customers, sellers, products) first.
+    # @param db_config: parsed config/db.json
+    def build(self, db_config):
+        tables = sorted(db_config["tables"], key=lambda table: db_config["tables"][table]["foreignkeys"] != [""])
+        for table in tables:
+            fields = db_config["tables"][table]["fields"]
+            idColumns = [column for column in self.columns if column in fields]
+            if(len(idColumns) > 0):
+                df = pd.read_csv(db_config["tables"][table]["source"], usecols=idColumns, dtype=str)
+                for column in idColumns:
+                    self.addIds(column, df[column])
+        self.save()
+
+    # replaces the id columns of a table by their int32 codes
+    # @param df: DataFrame with hex id columns
+    def encodeTable(self, df):
+        for column in self.columns:
+            if(column in df.columns):
+                df[column] = self.encode(column, df[column])
+        return df
+
+    # returns the int32 codes of hex ids; unknown ids are added to the
+    # registry, call save() after the load to persist them
+    # @param column: name of the id column
+    # @param values: hex ids (Series or array)
+    def encode(self, column, values):
+        values = pd.Series(values, copy=False)
+        hexIds = values.to_numpy(dtype=object, na_value=None)
+        codes = self.getCodes(column, hexIds)
+        unknown = np.flatnonzero((codes == MISSING_ID) & values.notna().to_numpy())
+        if(len(unknown) > 0):
+            self.addIds(column, hexIds[unknown])
+            codes[unknown] = self.getCodes(column, hexIds[unknown])
+        return pd.Series(codes.astype("int32"), index=values.index, name=values.name)
+
+    # returns the hex ids of int32 codes
+    # @param column: name of the id column
+    # @param codes: codes (Series, Index or array)
+    def decode(self, column, codes):
+        codes = np.asarray(codes)
+        ids = self.getIds(column)
+        hexIds = np.full(len(codes), None, dtype=object)
+        known = (codes != MISSING_ID) & (codes < len(ids))
+        hexIds[known] = ids[codes[known]]
+        return hexIds
+
+    # codes of the values, MISSING_ID for unknown and missing values
+    def getCodes(self, column, values):
+        lookup = self.codes[column]
+        return np.fromiter((lookup.get(value, MISSING_ID) for value in values), dtype="int64", count=len(values))
+
+    # all ids of a column in code order
+    def getIds(self, column):
+        with self.lock:
+            return np.array(self.ids[column], dtype=object)
+
+    def addIds(self, column, values):
+        with self.lock:
+            ids = self.ids[column]
+            lookup = self.codes[column]
+            newIds = [hexId for hexId in dict.fromkeys(pd.Series(values, copy=False).dropna().astype(str).to_numpy(dtype=object)) if hexId not in lookup]
+            if(len(newIds) == 0):
+                return
+            lookup.update(zip(newIds, range(len(ids), len(ids) + len(newIds))))
+            ids.extend(newIds)
+            self.unsaved.add(column)
+
+    # writes the dictionaries with new ids, once per load instead of per chunk.
+    # Each file is written to a temporary file first and then replaced, so a
+    # concurrent or interrupted save never leaves a truncated dictionary.
+    def save(self):
+        with self.lock:
+            for column in list(self.unsaved):
+                path = self.idsPath(column)
+                temporaryPath = path + "." + str(os.getpid()) + ".tmp"
+                with open(temporaryPath, "wb") as idsFile:
+                    np.save(idsFile, np.array(self.ids[column], dtype=str))
+                os.replace(temporaryPath, path)
+                self.unsaved.discard(column)
+
+    def loadIds(self, column):
+        if(os.path.exists(self.idsPath(column))):
+            return np.load(self.idsPath(column))
+        return np.array([], dtype=str)
+
+    # the version changes whenever the registry is created from scratch, so
+    # snapshots with codes of a deleted registry can be detected
+    def loadVersion(self):
+        versionPath = os.path.join(self.registryFolder, "ids.json")
+        if(os.path.exists(versionPath)):
+            with open(versionPath) as versionFile:
+                return json.load(versionFile)["version"]
+        version = uuid.uuid4().hex
+        with open(versionPath, "w") as versionFile:
+            json.dump({"version": version}, versionFile)
+        return version
+
+    def isEmpty(self):
+        return all(len(self.ids[column]) == 0 for column in self.columns)
+
+    def getKey(self):
+        return json.dumps([self.version, self.columns])
+
+    def idsPath(self, column):
+        return os.path.join(self.registryFolder, "ids_" + column + ".npy")
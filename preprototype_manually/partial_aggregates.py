@@ -0,0 +1,127 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+mergeable partial aggregates for the streaming mode
+
+Im streaming mode (main.json "streaming" -> "enabled": "y") werden die
+großen Faktentabellen (orders, order_items, payments, reviews) nicht mehr
+ganz geladen, sondern chunkweise gelesen (read_csv mit chunksize bzw. der
+Cursor der Datenbank) und pro Chunk zu Teilergebnissen pro Schlüssel
+verdichtet: count, sum, min und max. Diese lassen sich beliebig
+zusammenführen, der mean ist sum / count.
+
+Joins (order_items mit orders, orders mit customers) laufen als Grace hash
+join: die Chunks beider Tabellen werden nach einem Hash des Join-Schlüssels
+auf "partitions" Dateien verteilt (SpilledPartitions) und danach Partition
+für Partition verbunden; alle Zeilen eines Schlüssels liegen in derselben
+Partition, die Reihenfolge der Zeilen bleibt erhalten. Im Speicher liegen
+damit höchstens ein Chunk bzw. eine Partition jeder verbundenen Tabelle
+(etwa Zeilen / partitions) und ein Teilergebnis pro Schlüssel des
+Ergebnisses; die übrigen Zeilen liegen auf der Platte.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from dimension_metrics import metricsByDimension
+from partitioned_aggregation import hashPartitions
+
+
+PARTIALS = ["count", "sum", "min", "max"]
+
+
+# count, sum, min and max of a metric per key, mergeable across chunks
+class PartialAggregate:
+
+    def __init__(self):
+        self.partials = None
+
+    # aggregates one chunk and merges it into the partials
+    # @param keys: group of every row; missing keys are left out
+    # @param values: metric of every row, None only counts the rows
+    def add(self, keys, values=None):
+        if(values is None):
+            values = pd.Series(np.zeros(len(keys)), index=getattr(keys, "index", None))
+        self.mergePartials(metricsByDimension(keys, [(partial, values, partial) for partial in PARTIALS]))
+        return self
+
+    # merges the partials of another PartialAggregate, e.g. of another partition
+    def merge(self, other):
+        if(other.partials is not None):
+            self.mergePartials(other.partials)
+        return self
+
+    def mergePartials(self, partials):
+        if(self.partials is None):
+            self.partials = partials
+            return
+        combined = pd.concat([self.partials, partials])
+        keys = pd.Series(combined.index, name=combined.index.name)
+        merged = metricsByDimension(keys, [("count", combined["count"].to_numpy(), "sum"),
+                                           ("sum", combined["sum"].to_numpy(), "sum"),
+                                           ("min", combined["min"].to_numpy(), "min"),
+                                           ("max", combined["max"].to_numpy(), "max")])
+        merged["count"] = merged["count"].astype("int64")
+        self.partials = merged
+
+    # final result per key like metricByDimension
+    # @param statistic: "count", "sum", "mean", "min" or "max"
+    # @param name: name of the Series, default the statistic
+    # @return: Series indexed by the keys, sorted
+    def getMetric(self, statistic, name=None):
+        if(self.partials is None):
+            return pd.Series([], dtype="float64", name=name or statistic)
+        if(statistic == "mean"):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result = self.partials["sum"] / self.partials["count"]
+        else:
+            result = self.partials[statistic]
+        return result.rename(name or statistic)
+
+
+# rows of a table distributed over files by the hash of a key, read back
+# one partition at a time (Grace hash join)
+class SpilledPartitions:
+
+    # @param folder: folder of the files, e.g. a TemporaryDirectory
+    # @param name: prefix of the files, e.g. the table
+    # @param partitions: number of partitions; tables which are joined need
+    #                    the same number
+    def __init__(self, folder, name, partitions):
+        self.paths = [os.path.join(folder, name + "_" + str(partition) + ".pkl") for partition in range(partitions)]
+        self.columns = None
+
+    # appends the rows of a chunk to the files of their partitions
+    # @param key: column to partition by
+    def add(self, chunk, key):
+        if(self.columns is None):
+            self.columns = list(chunk.columns)
+        if(len(chunk) == 0):
+            return self
+        # the same id has the same hash in every table, whatever the dtype
+        codes = hashPartitions(pd.Series(np.asarray(chunk[key], dtype=object)), len(self.paths))
+        for partition in np.unique(codes):
+            with open(self.paths[partition], "ab") as partitionFile:
+                pickle.dump(chunk[codes == partition], partitionFile, protocol=pickle.HIGHEST_PROTOCOL)
+        return self
+
+    # all rows of a partition in the order they were added
+    def read(self, partition):
+        pieces = []
+        if(os.path.exists(self.paths[partition])):
+            with open(self.paths[partition], "rb") as partitionFile:
+                while True:
+                    try:
+                        pieces.append(pickle.load(partitionFile))
+                    except EOFError:
+                        break
+        if(len(pieces) == 0):
+            return pd.DataFrame(columns=self.columns or [])
+        return pd.concat(pieces, ignore_index=True)
@@ -0,0 +1,113 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+hash partitioned aggregation on several cores
+
+Die Kennzahlen pro Verkäufer und pro Produkt (1.6 - 1.8, 3.2, 5.2, 5.3)
+sind Gruppierungen über die ganze order fact table in einem Prozess. Bei
+großen Datenmengen (main.json "aggregation" -> "workers" > 1 und mindestens
+"minRows" Zeilen) werden die Zeilen stattdessen über einen Hash des
+Schlüssels auf Partitionen verteilt (alle Zeilen eines Verkäufers landen in
+derselben Partition), nach Partition sortiert in shared memory gelegt
+(siehe shared_tables.py) und von einem Prozess-Pool parallel aggregiert.
+Da sich die Schlüssel der Partitionen nicht überschneiden, sind auch
+Median und Perzentile exakt; das Zusammenführen ist ein concat der
+Teilergebnisse. Innerhalb einer Partition bleibt die Reihenfolge der
+Zeilen erhalten (keep="first" usw. verhalten sich wie ohne Partitionen).
+Den Pool kann nur ein Hauptprozess starten; laufen die reports selbst in
+Prozessen ("processor" -> "workers" > 1), aggregiert jeder in seinem
+Prozess. Der Pool lohnt sich erst mit mehreren Kernen und Millionen Zeilen,
+deshalb ist "workers" standardmäßig 1.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from dimension_metrics import metricsByDimension
+from shared_tables import SharedTables, attachTables
+
+
+# distributes the rows of a frame by key over a process pool
+class PartitionedAggregator:
+
+    # @param workers: number of processes, 1 aggregates in this process
+    # @param minRows: smaller frames are aggregated in this process, starting
+    #                 the pool would cost more than it saves
+    # @param partitionsPerWorker: more partitions than workers even out
+    #                 partitions with many rows (e.g. large sellers)
+    def __init__(self, workers=1, minRows=500000, partitionsPerWorker=4):
+        self.workers = workers
+        self.minRows = minRows
+        self.partitions = min(workers * partitionsPerWorker, 2**15 - 1)
+
+    # worker processes of the ProcessorManually cannot start a pool of their own
+    def usePool(self, rows):
+        return self.workers > 1 and rows >= self.minRows and not multiprocessing.current_process().daemon
+
+    # applies a function to the rows of every key partition
+    # @param frame: DataFrame with the key column
+    # @param key: column to partition by
+    # @param function: module level function (DataFrame, *args) -> DataFrame
+    # @param args: further arguments of function
+    # @return: the results of the partitions concatenated, or function(frame)
+    #          if the frame is aggregated in this process
+    def mapPartitions(self, frame, key, function, args=()):
+        if(not self.usePool(len(frame))):
+            return function(frame, *args)
+        partitions = self.partitions
+        codes = hashPartitions(frame[key], partitions)
+        # stable, so the rows keep their order within a partition
+        order = np.argsort(codes, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=partitions))])
+        sharedTables = SharedTables()
+        sharedTables.share("partitioned", frame.iloc[order].reset_index(drop=True))
+        tasks = [(start, end, function, args) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+        try:
+            with multiprocessing.Pool(processes=min(self.workers, len(tasks)),
+                                      initializer=initPartitionWorker,
+                                      initargs=(sharedTables.getDescriptors(),)) as pool:
+                results = pool.starmap(applyToPartition, tasks, chunksize=1)
+        finally:
+            sharedTables.close()
+        return pd.concat(results)
+
+    # statistics per key like metricsByDimension, computed per partition
+    # @param metrics: list of (result column, column or None, statistic)
+    # @return: DataFrame indexed by the keys, sorted
+    def aggregate(self, frame, key, metrics):
+        columns = [key] + list(dict.fromkeys([column for name, column, statistic in metrics if column is not None and column != key]))
+        result = self.mapPartitions(frame[columns], key, aggregatePartition, (key, metrics))
+        return result.sort_index()
+
+
+# partition of every row, 0 .. partitions-1; int16, for which numpy sorts
+# stable with a radix sort
+def hashPartitions(keys, partitions):
+    return (pd.util.hash_pandas_object(keys, index=False).to_numpy() % np.uint64(partitions)).astype("int16")
+
+
+# every column is selected once, so metricsByDimension sorts it only once
+# for all of its quantiles
+def aggregatePartition(frame, key, metrics):
+    columns = dict((column, frame[column]) for name, column, statistic in metrics if column is not None)
+    return metricsByDimension(frame[key], [(name, None if column is None else columns[column], statistic)
+                                           for name, column, statistic in metrics])
+
+
+# rows of all partitions in a worker process, sorted by partition
+partitionedFrame = None
+
+
+def initPartitionWorker(descriptors):
+    global partitionedFrame
+    partitionedFrame = attachTables(descriptors)["partitioned"]
+
+
+def applyToPartition(start, end, function, args):
+    return function(partitionedFrame.iloc[start:end], *args)
@@ -0,0 +1,124 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+headless, batched rendering of the report plots
+
+Statt jede Grafik sofort im report zu zeichnen, nimmt der Plotter im
+deferred Modus nur die Plot-Spezifikation (Plotter Methode und Daten) auf.
+Der OutputManager ordnet sie beim saveFig dem Namen der Grafik zu. Nachdem
+alle reports gelaufen sind, rendert der PlotRenderer die gesammelten specs
+auf einem Pool von Worker-Prozessen mit dem Agg backend. Jeder Prozess
+verwendet eine einzige Figure wieder und leert sie nach dem Speichern.
+
+Jede Grafik wird in allen konfigurierten targets gespeichert, z.B. PNG mit
+geringer Auflösung als Vorschau und SVG/PDF für den Druck (main.json "plots").
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import functools
+import multiprocessing
+import os
+
+from matplotlib import pyplot as plt
+
+
+# default: one png per plot in output/data/plots/<report>/ with matplotlib's dpi
+DEFAULT_TARGETS = [{"folder": "output/data/plots", "format": "png"}]
+
+
+# one plot: the Plotter method with its arguments and the file name
+class PlotSpec:
+
+    # @param method: name of the Plotter method, e.g. "plotLine"
+    # @param args: positional arguments of the method
+    # @param kwargs: keyword arguments of the method
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.reportId = None
+        self.figurename = None
+
+
+# collects the plot specs of all reports and renders them at once
+class PlotRenderer:
+
+    # @param plotterClass: class whose methods draw the specs (Plotter)
+    # @param targets: list of {"folder", "format", "dpi"} dicts
+    # @param workers: number of render processes, 1 renders in this process
+    def __init__(self, plotterClass, targets=None, workers=1):
+        self.plotterClass = plotterClass
+        self.targets = targets if targets is not None else DEFAULT_TARGETS
+        self.workers = workers
+        self.specs = []
+        self.pending = None
+
+    # called by the Plotter instead of drawing
+    def record(self, method, args, kwargs):
+        self.pending = PlotSpec(method, args, kwargs)
+
+    # called by the OutputManager: the last recorded plot gets its file name
+    def save(self, reportId, figurename):
+        if(self.pending is None):
+            raise ValueError("no plot recorded for " + reportId + "/" + figurename)
+        self.pending.reportId = reportId
+        self.pending.figurename = figurename
+        self.specs.append(self.pending)
+        self.pending = None
+
+    # renders all collected specs, returns list of (figurename, status)
+    def render(self):
+        tasks = [(self.plotterClass, spec, self.targets) for spec in self.specs]
+        if(self.workers > 1 and len(tasks) > 1):
+            with multiprocessing.Pool(processes=min(self.workers, len(tasks)),
+                                      initializer=initRenderWorker) as pool:
+                results = pool.map(renderPlot, tasks, chunksize=1)
+        else:
+            results = [renderPlot(task) for task in tasks]
+        self.specs = []
+        return results
+
+
+# decorator for the Plotter methods: with a renderer the call is only recorded
+def deferrable(method):
+    @functools.wraps(method)
+    def plotOrRecord(plotter, *args, **kwargs):
+        if(plotter.renderer is not None):
+            plotter.renderer.record(method.__name__, args, kwargs)
+            return
+        method(plotter, *args, **kwargs)
+    return plotOrRecord
+
+
+def initRenderWorker():
+    plt.switch_backend("Agg")
+
+
+def renderPlot(task):
+    plotterClass, spec, targets = task
+    status = "ok"
+    try:
+        getattr(plotterClass(), spec.method)(*spec.args, **spec.kwargs)
+        savePlot(plt.gcf(), spec.reportId, spec.figurename, targets)
+    except Exception as error:
+        status = "failed: " + repr(error)
+    # the figure is reused by the next plot, only the artists are dropped
+    plt.gcf().clf()
+    return (spec.reportId + "/" + spec.figurename, status)
+
+
+# saves a figure once per target as <folder>/<reportId>/<figurename>.<format>
+# @param figure: matplotlib figure
+# @param reportId: e.g. "report_1"
+# @param figurename: file name without extension
+# @param targets: list of {"folder", "format", "dpi"} dicts
+def savePlot(figure, reportId, figurename, targets):
+    for target in targets:
+        folder = os.path.join(target.get("folder", "output/data/plots"), reportId)
+        os.makedirs(folder, exist_ok=True)
+        fileFormat = target.get("format", "png")
+        figure.savefig(os.path.join(folder, figurename + "." + fileFormat),
+                       format=fileFormat, dpi=target.get("dpi", "figure"))
@@ -0,0 +1,99 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+density rendering for plots with many points
+
+plotMap und plotScatter zeichnen sonst einen Marker pro Zeile (Kunden-
+Geolocations, Pakete, Zahlungen). Ab einer Obergrenze an Punkten werden die
+Punkte stattdessen in ein festes 2D Raster gezählt und als Dichte-Grafik
+gezeichnet. Das Zählen ist vektorisiert (ein np.bincount über alle Punkte),
+die Kosten für das Zeichnen und die Dateigröße hängen nur noch von der
+Rastergröße ab, nicht mehr von der Anzahl der Punkte.
+
+Nicht-numerische Achsen (z.B. payment_type) bekommen eine Zelle pro Wert.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+from matplotlib.colors import LogNorm
+import numpy as np
+import pandas as pd
+
+
+# number of points counted into each cell of a regular 2D grid
+class DensityGrid:
+
+    # @param x: values of the x axis (Series, array or list)
+    # @param y: values of the y axis
+    # @param bins: number of cells per numeric axis
+    # @param extent: optional [xmin, xmax, ymin, ymax]; points outside are
+    #                dropped, default is the range of the data
+    def __init__(self, x, y, bins=200, extent=None):
+        xValues, self.xEdges, self.xCategories = self.toAxis(x, bins, None if extent is None else extent[0:2])
+        yValues, self.yEdges, self.yCategories = self.toAxis(y, bins, None if extent is None else extent[2:4])
+        xIndex = self.toBinIndex(xValues, self.xEdges)
+        yIndex = self.toBinIndex(yValues, self.yEdges)
+        inside = (xIndex >= 0) & (yIndex >= 0)
+        ny = len(self.yEdges) - 1
+        counts = np.bincount(xIndex[inside] * ny + yIndex[inside], minlength=(len(self.xEdges) - 1) * ny)
+        # rows are y cells, columns x cells, as expected by pcolormesh
+        self.counts = counts.reshape(len(self.xEdges) - 1, ny).T
+        self.points = int(inside.sum())
+
+    # numeric values and cell edges of one axis; categories for text axes
+    def toAxis(self, values, bins, limits):
+        values = pd.Series(values, copy=False)
+        if(pd.api.types.is_timedelta64_dtype(values.dtype)):
+            values = values / pd.Timedelta(days=1)
+        if(pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype)):
+            numbers = values.to_numpy(dtype="float64", na_value=np.nan)
+            if(limits is not None):
+                low, high = min(limits), max(limits)
+            elif(np.isfinite(numbers).any()):
+                low, high = np.nanmin(numbers), np.nanmax(numbers)
+            else:
+                low, high = 0.0, 1.0
+            if(high <= low):
+                high = low + 1.0
+            return numbers, np.linspace(low, high, bins + 1), None
+        codes, categories = pd.factorize(values, sort=True)
+        numbers = np.where(codes < 0, np.nan, codes).astype("float64")
+        return numbers, np.arange(len(categories) + 1) - 0.5, list(categories)
+
+    # cell of every value, -1 for missing values and values outside the edges
+    def toBinIndex(self, values, edges):
+        cells = len(edges) - 1
+        inside = np.isfinite(values) & (values >= edges[0]) & (values <= edges[-1])
+        index = np.full(len(values), -1, dtype="int64")
+        position = (values[inside] - edges[0]) / (edges[-1] - edges[0]) * cells
+        # the upper edge belongs to the last cell
+        index[inside] = np.minimum(position.astype("int64"), cells - 1)
+        return index
+
+    # draws the grid with a logarithmic colour scale, empty cells stay blank
+    # @param ax: matplotlib axes
+    # @param kwargs: further pcolormesh arguments, e.g. the cartopy transform
+    def draw(self, ax, **kwargs):
+        counts = np.ma.masked_equal(self.counts, 0)
+        mesh = ax.pcolormesh(self.xEdges, self.yEdges, counts,
+                             norm=LogNorm(vmin=1, vmax=max(int(self.counts.max()), 1)), **kwargs)
+        ax.figure.colorbar(mesh, ax=ax, label="points per cell")
+        if(self.xCategories is not None):
+            ax.set_xticks(range(len(self.xCategories)))
+            ax.set_xticklabels(self.xCategories)
+        if(self.yCategories is not None):
+            ax.set_yticks(range(len(self.yCategories)))
+            ax.set_yticklabels(self.yCategories)
+        return mesh
+
+
+# evenly drawn random sample of at most maxPoints points, same rows for x and y
+def samplePoints(x, y, maxPoints, seed=0):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if(len(x) <= maxPoints):
+        return x, y
+    rows = np.sort(np.random.default_rng(seed).choice(len(x), maxPoints, replace=False))
+    return x[rows], y[rows]
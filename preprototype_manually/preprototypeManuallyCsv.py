@@ -41,6 +41,22 @@ Created on Sa 18:23 27.02.2021
 import pandas as pd
 
 import json_parser
+from table_cache import TableCache
+from snapshot_store import SnapshotStore
+from table_schema import TableSchema, printMemoryReport
+from id_registry import IdRegistry
+from hash_to_int_converter import HashToIntConverter
+from shared_tables import SharedTables, attachTables
+from execution_planner import ExecutionPlanner, PlannedDataWrangler
+from plot_renderer import PlotRenderer, deferrable, savePlot, DEFAULT_TARGETS
+from point_density import DensityGrid, samplePoints
+from connection_pool import ConnectionPool
+from embedded_engine import EmbeddedOperator
+from calendar_dimension import CalendarDimension, addCalendarKeys, buildCalendar
+from sketches import HyperLogLog, TDigest
+from partial_aggregates import PartialAggregate, SpilledPartitions
+from partitioned_aggregation import PartitionedAggregator
+from dimension_metrics import getPriceDifferences
 
 import cartopy.crs as ccrs
 import cartopy
@@ -49,6 +65,9 @@ from matplotlib import pyplot as plt
 
 import time
 import datetime
+import multiprocessing
+import tempfile
+import uuid
 import numpy as np
 
 from configparser import ConfigParser
@@ -59,6 +78,8 @@ import psycopg2
  class DbOperator
  DbOperator connects to database via ../config/database.ini and 
  executes postgres statements or selects data based on ../conf/db.json
+ The connections are kept in a ConnectionPool ([pool] section of
+ database.ini) and reused across statements.
 
  @institution: TH Luebeck
  @author: Jakob Poley
@@ -68,8 +89,14 @@ import psycopg2
 class DbOperator:
 
 
-    def __init__(self):
+    # @param connect: optional function that opens a connection, e.g. a
+    #                 stand-in for tests; default is psycopg2.connect with database.ini
+    def __init__(self, connect=None):
         self.params = self.config()
+        poolParams = self.poolConfig()
+        if(connect is None):
+            connect = lambda: psycopg2.connect(**self.params)
+        self.pool = ConnectionPool(connect, int(poolParams["minconnections"]), int(poolParams["maxconnections"]))
 
 
     # setting config parameters for database connection
@@ -93,18 +120,27 @@ class DbOperator:
         return db
 
 
+    # pool sizes from the [pool] section of database.ini, defaults if missing
+    # @param filename: path to db-access config file database.ini
+    def poolConfig(self, filename='config/database.ini'):
+        pool = {"minconnections": 1, "maxconnections": 4}
+        parser = ConfigParser()
+        parser.read(filename)
+        if parser.has_section('pool'):
+            pool.update(parser.items('pool'))
+        return pool
+
+
     # selects data
     # @param query: query string
     def select(self, query):
         
-        #Connect to the PostgreSQL database server
+        # pooled connection, stays open for the next select
         
-        conn = None
+        content = None
+        conn = self.pool.getConnection()
+        broken = False
         try:
-            # connect to the PostgreSQL server
-            print('Connecting to the PostgreSQL database...')
-            conn = psycopg2.connect(**self.params)
-
             # create a cursor
             cur = conn.cursor()
 
@@ -120,10 +156,53 @@ class DbOperator:
         except (Exception, psycopg2.DatabaseError) as error:
             print(error)
         finally:
-            if conn is not None:
-                conn.close()
-                print('Database connection closed.')
-                return content
+            # end the read transaction before the connection is reused
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            self.pool.putConnection(conn, broken)
+        return content
+
+
+    # selects data in chunks of itersize rows through a server-side (named)
+    # cursor, so at most one chunk of tuples is held in memory at a time
+    # @param query: query string
+    # @param itersize: rows per chunk
+    # @return: generator of DataFrames with the column names of the query
+    def selectChunks(self, query, itersize=50000):
+        conn = self.pool.getConnection()
+        broken = False
+        try:
+            try:
+                cur = conn.cursor(name="select_" + uuid.uuid4().hex)
+                cur.itersize = itersize
+            except TypeError:
+                # DB-API stand-ins without server-side cursors
+                cur = conn.cursor()
+            cur.execute(query)
+            columns = None
+            while True:
+                rows = cur.fetchmany(itersize)
+                if(columns is None):
+                    columns = [column[0] for column in cur.description]
+                if(len(rows) == 0):
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns)
+            cur.close()
+        finally:
+            # end the read transaction before the connection is reused
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            self.pool.putConnection(conn, broken)
+
+
+    # closes the pooled connections
+    def close(self):
+        self.pool.closeAll()
+        print('Database connection closed.')
 
 
 
@@ -147,9 +226,91 @@ class StatementFactory:
             statement[table]="SELECT * FROM " + table + ";"
         return statement
 
+    # table (or view) of the embedded datasource over the csv file of db.json,
+    # typed with the declared types (FLOAT is a double like in postgres);
+    # the usual missing value strings of pandas.read_csv are NULL, so both
+    # datasources read the same values
+    # @param datamodel: parsed config/db.json
+    # @param table: name of the table
+    # @param materialize: True reads the file once into a table, False
+    #        creates a view that scans the file on every query
+    def createCreateCsvTableStatement(self, datamodel, table, materialize=False):
+        fields = datamodel["tables"][table]["fields"]
+        types = [sqlType.replace("FLOAT", "DOUBLE") for sqlType in datamodel["tables"][table]["types"]]
+        columns = ", ".join(["'" + field + "': '" + sqlType + "'" for field, sqlType in zip(fields, types)])
+        source = datamodel["tables"][table]["source"].replace("'", "''")
+        return ("CREATE OR REPLACE " + ("TABLE " if materialize else "VIEW ") + table + " AS SELECT * FROM read_csv('"
+                + source + "', header=true, nullstr=['', 'NA', 'N/A', 'NULL', 'NaN', 'nan', 'null'], columns={" + columns + "});")
+
+    # @param fields: "*" or list of columns
     def createSeletStatementByTableName(self, tablename, fields="*"):
+        if(isinstance(fields, list)):
+            fields = ", ".join(fields)
         return "SELECT " + fields +" FROM " +tablename
 
+    # builds SELECT <columns> FROM <table> [JOIN ...] [WHERE ...] [GROUP BY ...] [ORDER BY ...]
+    # so that postgres returns only the aggregated rows a DataWrangler method needs
+    # @param columns: column expressions, e.g. ["c.customer_state", "AVG(...)"]
+    # @param table: table with alias, e.g. "orders o"
+    # @param joins: join clauses, e.g. ["LEFT JOIN customers c ON c.customer_id = o.customer_id"]
+    # @param where: condition or None
+    # @param groupBy: list of group expressions or None
+    # @param orderBy: list of order expressions or None
+    def createAggregateStatement(self, columns, table, joins=[], where=None, groupBy=None, orderBy=None):
+        statement = "SELECT " + ", ".join(columns) + " FROM " + table
+        for join in joins:
+            statement = statement + " " + join
+        if(where is not None):
+            statement = statement + " WHERE " + where
+        if(groupBy is not None):
+            statement = statement + " GROUP BY " + ", ".join(groupBy)
+        if(orderBy is not None):
+            statement = statement + " ORDER BY " + ", ".join(orderBy)
+        return statement + ";"
+
+    # 1.3 - 1.5 number of distinct values of a field
+    def createCountDistinctStatement(self, table, field):
+        return self.createAggregateStatement(["COUNT(DISTINCT " + field + ") AS number"], table)
+
+    # 1.6 sum of the item prices per seller
+    def createSalesBySellerStatement(self):
+        return self.createAggregateStatement(["i.seller_id", "SUM(i.price) AS price"], "order_items i",
+                                             ["JOIN orders o ON o.order_id = i.order_id"],
+                                             groupBy=["i.seller_id"])
+
+    # 2.1 total of the item prices and total of the items of failed orders
+    # @param statuses: order states that count as successful
+    def createTotalPriceStatement(self, statuses):
+        failed = "o.order_status NOT IN ('" + "', '".join(statuses) + "')"
+        return self.createAggregateStatement(["SUM(i.price) AS total",
+                                              "SUM(CASE WHEN " + failed + " THEN i.price ELSE 0 END) AS failed"],
+                                             "order_items i", ["JOIN orders o ON o.order_id = i.order_id"])
+
+    # 3.5 mean of the delivery delay in whole days (floored) per customer state
+    def createMeanDelayPerStateStatement(self):
+        delay = "FLOOR(EXTRACT(EPOCH FROM (o.order_estimated_delivery_date - o.order_delivered_customer_date)) / 86400)"
+        return self.createAggregateStatement(["c.customer_state", "AVG(" + delay + ") AS difftime"], "orders o",
+                                             ["LEFT JOIN customers c ON c.customer_id = o.customer_id"],
+                                             groupBy=["c.customer_state"])
+
+    # 4.1 number of payments per payment type
+    def createPaymentTypeCountStatement(self):
+        return self.createAggregateStatement(["payment_type", "COUNT(*) AS number"], "payments",
+                                             groupBy=["payment_type"])
+
+    # 5.1 sum of the review scores per score
+    def createScoreSumStatement(self):
+        return self.createAggregateStatement(["review_score", "SUM(review_score) AS score"], "reviews",
+                                             where="review_score BETWEEN 1 AND 5", groupBy=["review_score"])
+
+    # 5.2 / 5.3 mean review score per seller or product of the reviewed items
+    # @param field: "seller_id" or "product_id"
+    def createMeanScoreStatement(self, field):
+        return self.createAggregateStatement(["i." + field, "AVG(r.review_score) AS review_score"], "orders o",
+                                             ["JOIN order_items i ON i.order_id = o.order_id",
+                                              "JOIN reviews r ON r.order_id = o.order_id"],
+                                             groupBy=["i." + field])
+
 
 
 # Datenzugriff. 
@@ -160,25 +321,334 @@ class DataAccessor:
     def __init__(self):
         self.main_config = json_parser.JsonParser("config/main.json").parse()
         self.db_config = json_parser.JsonParser("config/db.json").parse()
-        self.dbOperator = DbOperator()
         self.statementFactory = StatementFactory()
-        
-    def getTable(self, table):
+        self.dbOperator = self.createDbOperator()
+        self.tableCache = self.createTableCache()
+        self.snapshotStore = self.createSnapshotStore()
+        self.schemas = self.createSchemas()
+        self.idRegistry = self.createIdRegistry()
+        self.derivedTables = {}
+        self.aggregator = self.createAggregator()
+
+    # postgres DbOperator, or for "datasource": "embedded" the in-process
+    # database configured in main.json ("embedded")
+    def createDbOperator(self):
+        if(self.main_config["datasource"]=="embedded"):
+            return EmbeddedOperator(self.db_config, self.statementFactory, self.main_config.get("embedded", {}))
+        return DbOperator()
+
+    # true if the tables are read with SQL (postgres or embedded)
+    def isSqlDatasource(self):
+        return self.main_config["datasource"] in ["postgres", "embedded"]
+
+    # creates the engine for the per-seller and per-product aggregations,
+    # main.json "aggregation" -> "workers" processes for frames of at least
+    # "minRows" rows. Only a main process can start them: with "processor" ->
+    # "workers" > 1 the reports run in worker processes, which aggregate in
+    # their own process. More than 1 pays off only with several cores and
+    # millions of rows (see benchmark_partitioned_aggregation.py)
+    def createAggregator(self):
+        aggregationConfig = self.main_config.get("aggregation", {"workers": 1})
+        return PartitionedAggregator(aggregationConfig["workers"], aggregationConfig.get("minRows", 500000))
+
+    # creates the per-run table cache configured in main.json ("cache")
+    def createTableCache(self):
+        cacheConfig = self.main_config.get("cache", {"enabled": "n"})
+        if(cacheConfig["enabled"]=="y"):
+            return TableCache(cacheConfig["maxMemoryMB"] * 2**20)
+        return None
+
+    # creates the store for the columnar snapshots configured in main.json ("snapshots")
+    def createSnapshotStore(self):
+        snapshotConfig = self.main_config.get("snapshots", {"enabled": "n"})
+        if(snapshotConfig["enabled"]=="y"):
+            try:
+                return SnapshotStore(snapshotConfig["folder"])
+            except ImportError as error:
+                print(str(error) + ", reading csv files directly")
+        return None
+
+    # creates the dtypes of every table from the types declared in db.json.
+    # main.json "dtypes" -> "enabled": "n" lets pandas guess the dtypes again
+    def createSchemas(self):
+        dtypeConfig = self.main_config.get("dtypes", {"enabled": "n"})
+        if(dtypeConfig["enabled"]!="y"):
+            return None
+        schemas = {}
+        for table in self.db_config["tables"]:
+            schemas[table] = TableSchema(self.db_config["tables"][table], dtypeConfig["categoricalMaxUnique"])
+        return schemas
+
+    # creates the registry of int32 surrogate keys for the hex id columns
+    # configured in main.json ("surrogateKeys")
+    def createIdRegistry(self):
+        keyConfig = self.main_config.get("surrogateKeys", {"enabled": "n"})
+        if(keyConfig["enabled"]=="y"):
+            return IdRegistry(keyConfig["folder"], keyConfig["columns"])
+        return None
+
+    # ingest stage: builds the id registry and converts all csv files into
+    # snapshots ahead of the reports. main.json "dtypes" -> "report": "y"
+    # prints how many bytes the declared dtypes save (reads every csv file twice)
+    def ingest(self):
+        if(self.idRegistry is not None and self.idRegistry.isEmpty()):
+            self.idRegistry.build(self.db_config)
+        if(self.snapshotStore is not None):
+            for table in self.db_config["tables"]:
+                source = self.db_config["tables"][table]["source"]
+                self.snapshotStore.ingest(table, source, self.csvReader(table), self.getSchemaKey(table))
+        if(self.main_config.get("dtypes", {}).get("report", "n")=="y"):
+            self.printDtypeMemoryReport()
+
+    # prints how many bytes the declared dtypes save per table
+    def printDtypeMemoryReport(self):
+        if(self.schemas is not None):
+            printMemoryReport(self.db_config, self.schemas)
+
+    # returns a function which reads the csv file of a table with the
+    # declared dtypes and the id columns replaced by their surrogate keys.
+    # New ids are saved before the snapshot with their codes is written, so an
+    # interrupted load never leaves a snapshot with unsaved codes behind.
+    # @param columns: optional list of columns to read (usecols)
+    def csvReader(self, table, columns=None):
+        def readCsv(source):
+            if(self.schemas is None):
+                df = pd.read_csv(source, usecols=columns)
+            else:
+                df = self.schemas[table].readCsv(source, columns)
+            df = self.encodeIds(df)
+            self.saveIds()
+            return df
+        return readCsv
+
+    # true if DataWrangler methods let the database aggregate instead of
+    # loading whole tables, main.json "postgres" -> "pushdown" (also used for
+    # the embedded datasource)
+    def usePushdown(self):
+        return self.isSqlDatasource() and self.main_config.get("postgres", {}).get("pushdown", "n")=="y"
+
+    # true if the pushed-down methods read the rollups refreshed by the
+    # ProgramController (program.json "rollups"), main.json "postgres" -> "rollups"
+    def useRollups(self):
+        return self.main_config["datasource"]=="postgres" and self.usePushdown() and self.main_config.get("postgres", {}).get("rollups", "n")=="y"
+
+    # result of an aggregating select as DataFrame, hex ids are encoded like
+    # in the tables
+    # @param query: query string, e.g. from StatementFactory.createAggregateStatement
+    def selectAggregate(self, query):
+        chunks = list(self.dbOperator.selectChunks(query, self.getItersize()))
+        if(len(chunks) == 0):
+            return pd.DataFrame()
+        aggregate = self.encodeIds(pd.concat(chunks, ignore_index=True))
+        self.saveIds()
+        return aggregate
+
+    # rows per chunk when reading from postgres, main.json "postgres" -> "itersize"
+    def getItersize(self):
+        return self.main_config.get("postgres", {}).get("itersize", 50000)
+
+    # true if distinct counts and distributions are estimated with mergeable
+    # sketches instead of computed exactly, main.json "approximate" -> "enabled"
+    def useApproximate(self):
+        return self.main_config.get("approximate", {}).get("enabled", "n")=="y"
+
+    # distinct count sketch, main.json "approximate" -> "precision"
+    def createHyperLogLog(self):
+        return HyperLogLog(self.main_config.get("approximate", {}).get("precision", 14))
+
+    # quantile sketch, main.json "approximate" -> "compression"
+    def createTDigest(self):
+        return TDigest(self.main_config.get("approximate", {}).get("compression", 200))
+
+    # true if the DataWrangler reads the large fact tables chunk by chunk and
+    # reduces them to partial aggregates, main.json "streaming" -> "enabled"
+    def useStreaming(self):
+        return self.main_config.get("streaming", {}).get("enabled", "n")=="y"
+
+    # rows per chunk of getTableChunks, main.json "streaming" -> "chunkRows"
+    def getChunkRows(self):
+        return self.main_config.get("streaming", {}).get("chunkRows", 100000)
+
+    # number of partition files of the joins in the streaming mode,
+    # main.json "streaming" -> "partitions"
+    def getStreamingPartitions(self):
+        return self.main_config.get("streaming", {}).get("partitions", 16)
+
+    # reads columns of a table chunk by chunk without keeping the whole table,
+    # e.g. to feed sketches or partial aggregates. A table already in the
+    # cache is handed out as one chunk, otherwise the csv file or the select
+    # is read in chunks of getChunkRows() rows (typed and id-encoded, the
+    # VARCHAR columns without categories)
+    # @param columns: list of columns
+    # @param encode: False keeps the hex ids, e.g. for sketches, so that the
+    #                IdRegistry does not have to hold every id of the table
+    def getTableChunks(self, table, columns, encode=True):
+        encoded = self.idRegistry is not None and any(column in self.idRegistry.columns for column in columns)
+        if(self.tableCache is not None and (encode or not encoded)):
+            cachedTable = self.tableCache.get(table, columns)
+            if(cachedTable is not None):
+                yield cachedTable
+                return
+        chunkRows = self.getChunkRows()
+        if(self.main_config["datasource"]=="csv"):
+            source = self.db_config["tables"][table]["source"]
+            if(self.schemas is None):
+                chunks = pd.read_csv(source, usecols=columns, chunksize=chunkRows)
+            else:
+                chunks = self.schemas[table].readCsvChunks(source, columns, chunkRows)
+        elif(self.isSqlDatasource()):
+            chunks = self.dbOperator.selectChunks(self.statementFactory.createSeletStatementByTableName(table, columns), chunkRows)
+        else:
+            print("data source must be either 'csv', 'postgres' or 'embedded'")
+            return
+        for chunk in chunks:
+            if(self.schemas is not None and self.isSqlDatasource()):
+                chunk = self.schemas[table].applyTypes(chunk, categoricals=False)
+            yield self.encodeIds(chunk) if encode else chunk
+        self.saveIds()
+
+    # persists the ids the IdRegistry got while loading, once per load
+    def saveIds(self):
+        if(self.idRegistry is not None):
+            self.idRegistry.save()
+
+    def encodeIds(self, df):
+        if(self.idRegistry is None):
+            return df
+        return self.idRegistry.encodeTable(df)
+
+    # replaces the hex ids in the index of a result by their surrogate keys,
+    # e.g. of a streamed result that is grouped by the hex ids
+    # @param result: Series or DataFrame indexed by hex ids
+    # @param column: id column, e.g. "seller_id"
+    def encodeIndex(self, result, column):
+        if(self.idRegistry is None):
+            return result
+        result.index = pd.Index(self.idRegistry.encode(column, result.index.to_series()).to_numpy(), name=result.index.name)
+        self.saveIds()
+        return result.sort_index()
+
+    # translates surrogate keys back into the hex ids
+    # @param column: id column, e.g. "seller_id"
+    # @param codes: surrogate keys, e.g. the index of a groupby result
+    def decodeIds(self, column, codes):
+        if(self.idRegistry is None):
+            return codes
+        return self.idRegistry.decode(column, codes)
+
+    def getSchemaKey(self, table):
+        schemaKey = ""
+        if(self.schemas is not None):
+            schemaKey = schemaKey + self.schemas[table].getKey()
+        if(self.idRegistry is not None):
+            schemaKey = schemaKey + self.idRegistry.getKey()
+        return schemaKey
+
+    # returns a table. If the cache is enabled, every table is only loaded
+    # once per run and the caller gets a copy-on-write view of it
+    # @param columns: optional list of columns; only these are read from the
+    #                 csv file, snapshot or postgres. With the cache a request
+    #                 is served from a cached frame with more columns, a
+    #                 missing column widens the cached frame.
+    def getTable(self, table, columns=None):
+        if(self.tableCache is None):
+            return self.loadTable(table, columns)
+        fields = self.db_config["tables"][table]["fields"]
+        cachedTable = self.tableCache.get(table, fields if columns is None else columns)
+        if(cachedTable is not None):
+            return cachedTable
+        loadColumns = None
+        if(columns is not None):
+            cachedColumns = self.tableCache.getColumns(table) or []
+            loadColumns = [field for field in fields if field in columns or field in cachedColumns]
+            if(len(loadColumns) == len(fields)):
+                loadColumns = None
+        loadedTable = self.loadTable(table, loadColumns)
+        if(loadedTable is None):
+            return None
+        loadedTable = self.tableCache.put(table, loadedTable)
+        if(columns is not None):
+            return loadedTable[columns]
+        return loadedTable
+
+    # returns a table derived from other tables, e.g. the order fact table of
+    # the DataWrangler. It is built once per data version: kept for the rest
+    # of the run and, with snapshots enabled, persisted until one of its
+    # source tables changes.
+    # @param name: name of the derived table
+    # @param tables: names of the tables it is built from
+    # @param builder: function that builds the DataFrame
+    # @param version: has to be increased whenever the builder changes
+    def getDerivedTable(self, name, tables, builder, version=1):
+        if(self.tableCache is not None):
+            cachedTable = self.tableCache.get(name)
+            if(cachedTable is not None):
+                return cachedTable
+        elif(name in self.derivedTables):
+            return self.derivedTables[name].copy()
+        if(self.snapshotStore is not None and self.main_config["datasource"]=="csv"):
+            sources = [self.db_config["tables"][table]["source"] for table in tables]
+            schemaKey = str(version) + "".join([self.getSchemaKey(table) for table in tables])
+            derivedTable = self.snapshotStore.getDerivedTable(name, sources, builder, schemaKey)
+        else:
+            derivedTable = builder()
+        if(self.tableCache is not None):
+            return self.tableCache.put(name, derivedTable)
+        self.derivedTables[name] = derivedTable
+        return derivedTable.copy()
+
+    # returns all tables of db.json, e.g. to share them with worker processes
+    def getAllTables(self):
+        tables = {}
+        for table in self.db_config["tables"]:
+            tables[table] = self.getTable(table)
+        return tables
+
+    # puts already loaded tables (and derived tables) into the cache, so they
+    # are not read again. Without a configured cache an unbounded one is used.
+    # @param tables: dict table name -> DataFrame
+    def preloadTables(self, tables):
+        if(self.tableCache is None):
+            self.tableCache = TableCache(float("inf"))
+        for table, df in tables.items():
+            self.tableCache.put(table, df)
+
+    def printCacheStatistics(self):
+        if(self.tableCache is not None):
+            self.tableCache.printStatistics()
+
+    # @param columns: optional list of columns, default all columns
+    def loadTable(self, table, columns=None):
+        df = self.readTable(table, columns)
+        self.saveIds()
+        return df
+
+    def readTable(self, table, columns=None):
         if(self.main_config["datasource"]=="csv"):
             print("getting Data fom csv-file")
-            return pd.read_csv(self.db_config["tables"][table]["source"])
-        elif(self.main_config["datasource"]=="postgres"):
-            print("getting Data fom postges")
-
-            selectStatements = self.statementFactory.createSeletStatementByTableName(table)
-            listFromDb = self.dbOperator.select(selectStatements)
-            df = pd.DataFrame(listFromDb)
-            for i, column in enumerate(self.db_config["tables"][table]["fields"]):
-                df = df.rename(columns={i: column})
-            
+            source = self.db_config["tables"][table]["source"]
+            if(self.snapshotStore is not None):
+                return self.snapshotStore.getTable(table, source, self.csvReader(table), self.getSchemaKey(table), columns)
+            return self.csvReader(table, columns)(source)
+        elif(self.isSqlDatasource()):
+            print("getting Data fom " + self.main_config["datasource"])
+
+            selectStatements = self.statementFactory.createSeletStatementByTableName(table, "*" if columns is None else columns)
+            # every chunk is typed and id-encoded right away, only the compact
+            # chunks are kept; categories need all rows and are set at the end
+            chunks = []
+            for chunk in self.dbOperator.selectChunks(selectStatements, self.getItersize()):
+                if(self.schemas is not None):
+                    chunk = self.schemas[table].applyTypes(chunk, categoricals=False)
+                chunks.append(self.encodeIds(chunk))
+            if(len(chunks) == 0):
+                return pd.DataFrame(columns=self.db_config["tables"][table]["fields"] if columns is None else columns)
+            df = pd.concat(chunks, ignore_index=True)
+            if(self.schemas is not None):
+                df = self.schemas[table].applyCategoricals(df)
             return df
         else:
-            print("data source must be either 'csv' or 'postgres'")
+            print("data source must be either 'csv', 'postgres' or 'embedded'")
 
 
 
@@ -189,6 +659,140 @@ class DataWrangler:
     
     def renameTable(self, table, oldfieldname, newfieldname):
         return table.rename({oldfieldname, newfieldname})
+
+    # pushdown (main.json "postgres" -> "pushdown"): the methods below that
+    # only need a few aggregated rows let postgres compute them with SQL from
+    # the StatementFactory; otherwise they aggregate the tables in pandas
+    def statementFactory(self):
+        return self.dataAccessor.statementFactory
+
+    # @param query: aggregating statement
+    # @param rollup: rollup with the same result, read instead if rollups are enabled
+    # @param columns: columns of the rollup
+    def selectAggregate(self, query, rollup=None, columns=None):
+        if(rollup is not None and self.dataAccessor.useRollups()):
+            query = self.statementFactory().createAggregateStatement(columns, rollup)
+        return self.dataAccessor.selectAggregate(query)
+
+    # statistic of a metric per value of a dimension in one pass over the
+    # group codes, the groups are taken from the data. Large frames are hash
+    # partitioned by the dimension and aggregated on several processes, see
+    # DataAccessor.createAggregator
+    # e.g. getMetricByDimension(fact, "customer_state", "difftime", "p90")
+    # @param frame: DataFrame with the dimension and metric columns
+    # @param dimension: column to group by
+    # @param metric: column to aggregate, None counts the rows
+    # @param statistic: "count", "sum", "mean", "min", "max", "median" or "p<percent>"
+    def getMetricByDimension(self, frame, dimension, metric=None, statistic="mean"):
+        name = statistic if metric is None else metric
+        return self.getMetricsByDimension(frame, dimension, [(name, metric, statistic)])[name]
+
+    # several statistics per value of a dimension
+    # @param metrics: list of (result column, column or None, statistic)
+    # @return: DataFrame indexed by the values of the dimension
+    def getMetricsByDimension(self, frame, dimension, metrics):
+        return self.dataAccessor.aggregator.aggregate(frame, dimension, metrics)
+
+    # approximate mode (main.json "approximate"): the sketches are filled
+    # chunk by chunk, see DataAccessor.getTableChunks, and never need the
+    # whole column in memory. The hex ids are counted as they are, missing
+    # ids are left out.
+    # @return: estimated number of distinct values of a column
+    def estimateDistinct(self, table, column):
+        sketch = self.dataAccessor.createHyperLogLog()
+        for chunk in self.dataAccessor.getTableChunks(table, [column], encode=False):
+            sketch.add(chunk[column])
+        return sketch.count()
+
+    # streaming mode (main.json "streaming"): instead of the order fact table
+    # the large tables are read chunk by chunk and reduced to partial
+    # aggregates per key, see partial_aggregates.py. The results equal the
+    # in-memory ones. Neither the table cache nor the IdRegistry get the
+    # streamed rows, results by an id are encoded at the end (encodeIndex).
+    # @param prepare: optional function chunk -> DataFrame with the dimension
+    #                 and metric columns
+    # @return: PartialAggregate of the whole table
+    def streamMetricByDimension(self, table, columns, dimension, metric=None, prepare=None):
+        aggregate = PartialAggregate()
+        for chunk in self.dataAccessor.getTableChunks(table, columns, encode=False):
+            if(prepare is not None):
+                chunk = prepare(chunk)
+            aggregate.add(chunk[dimension], None if metric is None else chunk[metric])
+        return aggregate
+
+    # Grace hash join of the streaming mode: the tables are read chunk by
+    # chunk and spilled by the hash of key into getStreamingPartitions()
+    # files each, then handed out partition by partition. All rows of a key
+    # are in the same partition, so joins and distinct counts within a
+    # partition are exact; at most one partition of every table is in memory.
+    # @param tables: list of (table, columns), the columns contain key
+    # @return: generator of one list of DataFrames (one per table) per partition
+    def streamPartitions(self, key, tables):
+        partitions = self.dataAccessor.getStreamingPartitions()
+        with tempfile.TemporaryDirectory(prefix="streaming_") as folder:
+            spilledTables = []
+            for table, columns in tables:
+                spilled = SpilledPartitions(folder, table, partitions)
+                for chunk in self.dataAccessor.getTableChunks(table, columns, encode=False):
+                    spilled.add(chunk, key)
+                spilledTables.append(spilled)
+            for partition in range(partitions):
+                yield [spilled.read(partition) for spilled in spilledTables]
+
+    ############# order fact table ###############
+
+    # denormalized order fact table:
+    # orders left join customers (state) left join order_items left join reviews
+    # with parsed timestamps, difftime (estimated - delivered), deliverytime
+    # (delivered - purchase) and the calendar fields of the purchase.
+    # The flags select the rows of the underlying joins:
+    #   order_row  -> one row per order
+    #   item_row   -> one row per row of orders x order_items
+    #   review_row -> one row per row of orders x reviews
+    #   has_item / has_review -> the order has an item / a review in this row
+    # Built once per data version, see DataAccessor.getDerivedTable
+    def getOrderFact(self):
+        return self.dataAccessor.getDerivedTable("order_fact", ["orders", "order_items", "reviews", "customers"], self.buildOrderFact)
+
+    def buildOrderFact(self):
+        orders = self.dataAccessor.getTable("orders")
+        for column in ["order_purchase_timestamp", "order_approved_at", "order_delivered_carrier_date", "order_delivered_customer_date", "order_estimated_delivery_date"]:
+            orders[column] = pd.to_datetime(orders[column])
+        customers = self.dataAccessor.getTable("customers", ["customer_id", "customer_state"])
+        order_items = self.dataAccessor.getTable("order_items", ["order_id", "order_item_id", "product_id", "seller_id", "price", "freight_value"])
+        reviews = self.dataAccessor.getTable("reviews", ["order_id", "review_id", "review_score"])
+
+        fact = orders.merge(customers, how="left", on="customer_id")
+        fact = fact.merge(order_items, how="left", on="order_id")
+        fact = fact.merge(reviews, how="left", on="order_id")
+        # surrogate keys stay int32, orders without items get the missing id -1
+        for column in ["product_id", "seller_id"]:
+            if(pd.api.types.is_integer_dtype(order_items[column])):
+                fact[column] = fact[column].fillna(-1).astype(order_items[column].dtype)
+
+        fact["has_item"] = fact["order_item_id"].notna()
+        fact["has_review"] = fact["review_id"].notna()
+        fact["order_row"] = ~fact.duplicated("order_id")
+        fact["item_row"] = ~fact.duplicated(["order_id", "order_item_id"])
+        fact["review_row"] = ~fact.duplicated(["order_id", "review_id"])
+
+        fact["difftime"] = fact["order_estimated_delivery_date"] - fact["order_delivered_customer_date"]
+        fact["deliverytime"] = fact["order_delivered_customer_date"] - fact["order_purchase_timestamp"]
+        return addCalendarKeys(fact, "order_purchase_timestamp", "_order")
+
+    # order items (with their order) of the order fact table
+    def getOrderItemFact(self):
+        fact = self.getOrderFact()
+        return fact[fact["item_row"] & fact["has_item"]]
+
+    # calendar of the purchase dates of the order items (reports 1.3 and 2.2)
+    # with the number of purchase days per day of month, weekday, month ...
+    def getPurchaseCalendar(self):
+        calendar = self.dataAccessor.getDerivedTable("purchase_calendar", ["orders", "order_items", "reviews", "customers"], self.buildPurchaseCalendar)
+        return CalendarDimension(calendar)
+
+    def buildPurchaseCalendar(self):
+        return buildCalendar(self.getOrderItemFact()["order_purchase_timestamp"])
     
     ############# methods for report 1 - Market Analysis ###############
     
@@ -207,52 +811,63 @@ class DataWrangler:
     # 1.1 Plot price distribution
     # --> insight: Einordnung Güter/Preise                       
     def getOrderPriceDistribution(self):
-        return self.dataAccessor.getTable("order_items")["price"]
+        return self.getOrderItemFact()["price"]
     
     # 1.2 orders per day/month/season/product  
     #  --> insight: Nachfrageverteilung innerhalb des Jahres   
     # @author: Robin Schumacher                         
     def getGroupOrdernumbersByTimePeriod(self):
-        orders_times = self.dataAccessor.getTable("orders")[["order_id", "order_purchase_timestamp"]]
-        product_id = self.dataAccessor.getTable("order_items")[["order_id", "product_id"]]
-        orders_times["order_purchase_timestamp"] = pd.to_datetime(orders_times["order_purchase_timestamp"])
-        orders_times["Day_order"] = orders_times["order_purchase_timestamp"].dt.day
-        orders_times["Month_order"] = orders_times["order_purchase_timestamp"].dt.month
-        orders_times["Year_order"] = orders_times["order_purchase_timestamp"].dt.year
-        orders_times["Dayofweek_order"] = orders_times["order_purchase_timestamp"].dt.dayofweek
-        seasons = [1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 1]
-        month_to_season = dict(zip(range(1,13), seasons))
-        orders_times["Season_order"] = orders_times["order_purchase_timestamp"].dt.month.map(month_to_season) #Seasons: Spring = 2, Summer = 3, Autumn = 4, Winter = 1
-        orders_times = orders_times.sort_values(by = "order_purchase_timestamp")
-        merge = pd.merge(left = orders_times, right = product_id, how='left', on='order_id').dropna()
-        return merge
+        orders_times = self.getOrderItemFact()[["order_id", "order_purchase_timestamp", "Day_order", "Month_order", "Year_order", "Dayofweek_order", "Season_order", "product_id"]]
+        return orders_times.sort_values(by = "order_purchase_timestamp", kind = "stable")
         
     # 1.3 compute number of sellers -> Textfile
     # --> Angebotsgröße                           
     def getNumberSellers(self):
-        sellers = self.dataAccessor.getTable("sellers")
+        if(self.dataAccessor.useApproximate()):
+            return self.estimateDistinct("sellers", "seller_id")
+        if(self.dataAccessor.usePushdown()):
+            return int(self.selectAggregate(self.statementFactory().createCountDistinctStatement("sellers", "seller_id")).iloc[0, 0])
+        sellers = self.dataAccessor.getTable("sellers", ["seller_id"])
         return len(sellers["seller_id"].unique())  
 
     # 1.4 compute number of customers -> Textfile
     # --> Nachfragegröße                    
     def getNumberOfCustomers(self):
-        customers = self.dataAccessor.getTable("customers")
+        if(self.dataAccessor.useApproximate()):
+            return self.estimateDistinct("customers", "customer_id")
+        if(self.dataAccessor.usePushdown()):
+            return int(self.selectAggregate(self.statementFactory().createCountDistinctStatement("customers", "customer_id")).iloc[0, 0])
+        customers = self.dataAccessor.getTable("customers", ["customer_id"])
         return len(customers["customer_id"].unique())
 
     # 1.5 Compute number of orders -> Textfile
     # --> Nachfragegröße                          
     def getNumberOfOrders(self):
-        orders = self.dataAccessor.getTable("orders")
-        return len(orders["order_id"].unique())
+        if(self.dataAccessor.useApproximate()):
+            return self.estimateDistinct("orders", "order_id")
+        if(self.dataAccessor.usePushdown()):
+            return int(self.selectAggregate(self.statementFactory().createCountDistinctStatement("orders", "order_id")).iloc[0, 0])
+        if(self.dataAccessor.useStreaming()):
+            return sum([len(orders.drop_duplicates("order_id")) for orders, in self.streamPartitions("order_id", [("orders", ["order_id"])])])
+        fact = self.getOrderFact()
+        return int(fact["order_row"].sum())
     
     # 1.6 Compute number of Customers by sellers
     # --> Verkäufer nach "Anteil im Markt"
     # author: Ben Alexy             
     def getSalesBySeller(self):
-        sellers = self.dataAccessor.getTable("sellers")
-        orderitems = self.dataAccessor.getTable("order_items")
-        orderitemssellersmerged = orderitems.merge(sellers, on = "seller_id", how="left")
-        return orderitemssellersmerged.groupby(by = "seller_id").sum()["price"]
+        if(self.dataAccessor.usePushdown()):
+            sales = self.selectAggregate(self.statementFactory().createSalesBySellerStatement(),
+                                         "rollup_sales_per_seller", ["seller_id", "price"])
+            return sales.set_index("seller_id")["price"].sort_index()
+        if(self.dataAccessor.useStreaming()):
+            # items of orders which are not in orders are not in the fact table
+            sales = PartialAggregate()
+            for items, orders in self.streamPartitions("order_id", [("order_items", ["order_id", "seller_id", "price"]), ("orders", ["order_id"])]):
+                items = items[items["order_id"].isin(orders["order_id"])]
+                sales.add(items["seller_id"], items["price"])
+            return self.dataAccessor.encodeIndex(sales.getMetric("sum", "price"), "seller_id")
+        return self.getMetricByDimension(self.getOrderItemFact(), "seller_id", "price", "sum")
 
     
     # 1.7 Compute number of orders
@@ -260,30 +875,26 @@ class DataWrangler:
     # author: Ben Alexy                        
     def getSellersVersusProductCatogory(self):
         #zunächst die Relationen holen
-        order_items = self.dataAccessor.getTable("order_items")
-        order_category = self.dataAccessor.getTable("products")
+        order_items = self.getOrderItemFact()[["seller_id", "product_id"]]
+        order_category = self.dataAccessor.getTable("products", ["product_id", "product_category_name"])
         #dann die Relationen joinen über product_id
         order_items_order_category_merged = order_items.merge(order_category, on="product_id", how="left" )
-        #und dann das Dataframe gruppieren nach der seller_id und dort pro seller_id die Produktkategorien zählen lassen
-        return order_items_order_category_merged.groupby(by = "seller_id").count()["product_category_name"]
+        #und dann pro seller_id die Produktkategorien zählen (die Zeilen mit Kategorie)
+        order_items_order_category_merged["has_category"] = order_items_order_category_merged["product_category_name"].notna()
+        categories = self.getMetricsByDimension(order_items_order_category_merged, "seller_id", [("product_category_name", "has_category", "sum")])
+        return categories["product_category_name"].astype("int64")
 
     # 1.8 Compute sellers versus product price
     # --> insights: welche sellers verkaufen besonders hochpreisig? 
     #               Wie ist der Vergleich bei gleichen Produkten  
     #               und unterschiedlichen Verkäufern?    
     # @author: Robin Schumacher                   
+    # in two steps: the price differences per product (partitioned by
+    # product_id), then their mean per seller (partitioned by seller_id)
     def getSellersVersusProductPrices(self):
-        product = self.dataAccessor.getTable("order_items")
-        dupes_without_seller = product.drop_duplicates(subset = ["seller_id", "product_id"], keep = "first").sort_values(by = "product_id")
-        only_dupes = dupes_without_seller[dupes_without_seller.duplicated(["product_id"], keep = False)].sort_values(by = "product_id")
-        average_price = only_dupes.groupby('product_id', as_index= False).mean().drop(columns=['freight_value', 'order_item_id']).\
-          rename(columns={"price":"average_price"})
-        merge = pd.merge(left = only_dupes, right = average_price, how='left', on = ["product_id"])
-        merge["price_difference"] = ((merge["price"] - merge["average_price"])/merge["average_price"])
-        merge = merge.sort_values(by = "price_difference")
-        merge = merge.drop(columns=['order_id', 'order_item_id', 'product_id', 'price', 'freight_value', 'average_price', 'shipping_limit_date', 'order_id'])
-        merge = merge.groupby(by ='seller_id').mean()
-        return merge
+        product = self.dataAccessor.getTable("order_items", ["product_id", "seller_id", "price"])
+        merge = self.dataAccessor.aggregator.mapPartitions(product, "product_id", getPriceDifferences)
+        return self.getMetricsByDimension(merge, "seller_id", [("price_difference", "price_difference", "mean")])
 
 
     ############# methods for report 2 - Business Development ###############
@@ -292,14 +903,28 @@ class DataWrangler:
     # --> insight: Wie groß ist der Gesamtumsatz? Firmeneinordnung etc.
     # @author: Robin Schumacher
     def getTotalPrice(self):
-        price = self.dataAccessor.getTable("order_items")[["order_id", "price"]]
+        successful = ["delivered", "invoiced", "shipped", "processing"]
+        if(self.dataAccessor.usePushdown()):
+            totals = self.selectAggregate(self.statementFactory().createTotalPriceStatement(successful))
+            totalsales = round(float(totals["total"].iloc[0]), 2)
+            failed_sum = float(totals["failed"].iloc[0])
+            return [totalsales, failed_sum, totalsales - failed_sum]
+        if(self.dataAccessor.useStreaming()):
+            sales = PartialAggregate()
+            for items, orders in self.streamPartitions("order_id", [("order_items", ["order_id", "price"]), ("orders", ["order_id", "order_status"])]):
+                status = orders.drop_duplicates("order_id").set_index("order_id")["order_status"]
+                items = items[items["order_id"].isin(status.index)]
+                order_status = items["order_id"].map(status)
+                sales.add(~order_status.isin(successful) & order_status.notna(), items["price"])
+            sales = sales.getMetric("sum")
+            totalsales = round(sales.sum(), 2)
+            failed_sum = sales.get(True, 0.0)
+            return [totalsales, failed_sum, totalsales - failed_sum]
+        price = self.getOrderItemFact()[["order_status", "price"]]
         totalsales = price["price"].sum()
         totalsales = round(totalsales, 2)
-        order = self.dataAccessor.getTable("orders")[["order_id", "order_status"]]
-        cancelled_order = order[(order.order_status != "delivered") & (order.order_status != "invoiced") & (order.order_status != "shipped") & (order.order_status != "processing")]
-        failed_sum = pd.merge(left = price, right = cancelled_order, how='left', on = ["order_id"])
-        failed_sum = failed_sum.dropna()
-        failed_sum = failed_sum["price"].sum()
+        cancelled_order = price[~price["order_status"].isin(successful) & price["order_status"].notna()]
+        failed_sum = cancelled_order["price"].sum()
         difference = totalsales - failed_sum
         merged = [totalsales, failed_sum, difference]
         return merged
@@ -308,19 +933,8 @@ class DataWrangler:
     # --> insight: Budgets, Planung, Buchhaltung, Strategieentwicklung etc.
     # @author: Robin Schumacher
     def getMergeOrderPriceOrderOrderedDelivered(self):
-        orders_times = self.dataAccessor.getTable("orders")[["order_id", "order_purchase_timestamp"]]
-        product_id = self.dataAccessor.getTable("order_items")[["order_id", "product_id", "price"]]
-        orders_times["order_purchase_timestamp"] = pd.to_datetime(orders_times["order_purchase_timestamp"])
-        orders_times['Day_order'] = orders_times["order_purchase_timestamp"].dt.day
-        orders_times["Dayofweek_order"] = orders_times["order_purchase_timestamp"].dt.dayofweek
-        orders_times['Month_order'] = orders_times["order_purchase_timestamp"].dt.month
-        orders_times = orders_times.sort_values(by = "order_purchase_timestamp")
-        orders_times['Year_order'] = orders_times["order_purchase_timestamp"].dt.year
-        seasons = [1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 1]
-        month_to_season = dict(zip(range(1,13), seasons))
-        orders_times['Season_order'] = orders_times['order_purchase_timestamp'].dt.month.map(month_to_season) #Seasons: Spring = 2, Summer = 3, Autumn = 4, Winter = 1
-        merge = pd.merge(left = orders_times, right = product_id, how='left', on='order_id').dropna()
-        return merge
+        orders_times = self.getOrderItemFact()[["order_id", "order_purchase_timestamp", "Day_order", "Dayofweek_order", "Month_order", "Year_order", "Season_order", "product_id", "price"]]
+        return orders_times.sort_values(by = "order_purchase_timestamp", kind = "stable")
 
    
     ############# methods for report 3 - Supply Chain ###############
@@ -329,7 +943,8 @@ class DataWrangler:
     # --> insight: wie ist die Qualität des Gesamt Order Status einzuschätzen?
     # @author: Hendrik Garken
     def getOrderStatusDistribution(self):
-        order = self.dataAccessor.getTable("orders")
+        fact = self.getOrderFact()
+        order = fact.loc[fact["order_row"], self.dataAccessor.db_config["tables"]["orders"]["fields"]]
         order_without_delivered = order[order["order_status"]!="delivered"]
         return order_without_delivered    
       
@@ -337,18 +952,24 @@ class DataWrangler:
     # --> insight: Welche Verkäufer sind besonder schlecht beim Zustellen?
     # @author: Hendrik Garken
 
+    # seller punctuality scorecard, one row per seller (index seller_id):
+    #   mean_delay_hours, median_delay_hours, p95_delay_hours -> delivered
+    #       minus estimated delivery date in hours, negative = early
+    #   late_ratio -> share of the delivered orders that arrived late
+    #   orders     -> number of orders with items of the seller
+    # Every order of a seller counts once, however many of its items it has.
     def getSellerWithBadOrderStatus(self):
-        order_items = self.dataAccessor.getTable("order_items")
-        orders = self.dataAccessor.getTable("orders")
-        sellerpunctuality = orders.merge(order_items, on="order_id", how="left")
-        sellerpunctuality["difftime"] =  pd.to_datetime(sellerpunctuality["order_estimated_delivery_date"]) \
-            - pd.to_datetime(sellerpunctuality["order_delivered_customer_date"])
-                
-        sellerpunctuality_group = sellerpunctuality.groupby(by="seller_id")["difftime"].groups
-        values = []
-        for key in sellerpunctuality_group:
-             values.append(np.mean(sellerpunctuality_group[key])/3600)
-        return values
+        fact = self.getOrderFact()
+        sellerpunctuality = fact.loc[fact["item_row"] & fact["has_item"], ["seller_id", "order_id", "difftime"]]
+        sellerpunctuality = sellerpunctuality.drop_duplicates(["seller_id", "order_id"])
+        delay = -sellerpunctuality["difftime"] / pd.Timedelta(hours=1)
+        late = (delay > 0).astype("float64").where(delay.notna())
+        sellerpunctuality = pd.DataFrame({"seller_id": sellerpunctuality["seller_id"], "delay": delay, "late": late})
+        return self.getMetricsByDimension(sellerpunctuality, "seller_id", [("mean_delay_hours", "delay", "mean"),
+                                                                           ("median_delay_hours", "delay", "median"),
+                                                                           ("p95_delay_hours", "delay", "p95"),
+                                                                           ("late_ratio", "late", "mean"),
+                                                                           ("orders", None, "count")])
             
            
           
@@ -356,11 +977,9 @@ class DataWrangler:
     # -->  insight: wie sieht die Gesamtlage der Vorhersage aus
     # @author: Robin Schumacher
     def getAmountOfWrongDeliveryPredictions(self):
-        sellerpunctuality= self.dataAccessor.getTable("orders")[["order_status", "order_estimated_delivery_date", "order_delivered_customer_date"]]
-        sellerpunctuality = sellerpunctuality.loc[sellerpunctuality["order_status"] == "delivered"]
-        sellerpunctuality["difftime"] =  pd.to_datetime(sellerpunctuality["order_estimated_delivery_date"]) \
-            - pd.to_datetime(sellerpunctuality["order_delivered_customer_date"])
-        sellerpunctuality["difftime"] = sellerpunctuality["difftime"].astype('timedelta64[D]')
+        fact = self.getOrderFact()
+        sellerpunctuality = fact.loc[fact["order_row"] & (fact["order_status"] == "delivered"), ["difftime"]]
+        sellerpunctuality["difftime"] = np.floor(sellerpunctuality["difftime"] / pd.Timedelta(days=1))
         negative = (sellerpunctuality["difftime"] < 0).sum()
         zero = (sellerpunctuality["difftime"] == 0).sum() 
         one_two = ((sellerpunctuality["difftime"] == 2).sum()) + ((sellerpunctuality["difftime"] == 1).sum()) 
@@ -376,72 +995,77 @@ class DataWrangler:
     # --> insight: inwiefern hat die Größe des Pakets einen Einfluss auf die Zulieferzeit?
     # @author: Jakob Poley
     def getInfluenceOfPaketSizeOnDeliveryTime(self):
-        products = self.dataAccessor.getTable("products")
+        products = self.dataAccessor.getTable("products", ["product_id", "product_length_cm", "product_height_cm", "product_width_cm"])
         products["volume_l"] =  products["product_length_cm"] * products["product_height_cm"] * products["product_width_cm"] * (1/1000)
-        products = products.drop(columns=["product_category_name" , "product_name_lenght" , "product_description_lenght" , "product_photos_qty", "product_weight_g" , "product_length_cm" , "product_height_cm" , "product_width_cm"])
-        
-        orderItems = self.dataAccessor.getTable("order_items")
-        orderItems = orderItems.drop(columns=["seller_id" , "shipping_limit_date" , "price" , "freight_value", "order_item_id"])
+        products = products[["product_id", "volume_l"]]
 
-        orders = self.dataAccessor.getTable("orders")
-        orders["deliverytime"] =  pd.to_datetime(orders["order_delivered_customer_date"]) \
-            - pd.to_datetime(orders["order_purchase_timestamp"])
-        orders["deliverytime"] = orders["deliverytime"].astype('timedelta64[D]')
-        orders = orders.drop(columns=["customer_id" , "order_status" , "order_approved_at" , "order_delivered_carrier_date"])
+        orders = self.getOrderItemFact()[["product_id", "order_id", "order_purchase_timestamp", "order_delivered_customer_date", "order_estimated_delivery_date", "deliverytime"]]
+        orders["deliverytime"] = np.floor(orders["deliverytime"] / pd.Timedelta(days=1))
         
-        p_oi_merge = pd.merge(products, orderItems, how='left', on='product_id')
-        p_oi_o_merge = pd.merge(p_oi_merge, orders, how='left', on='order_id')
+        p_oi_o_merge = pd.merge(products, orders, how='left', on='product_id')
         return p_oi_o_merge
         
     # 3.5 delivery data delay versus geo data 
     # --> insight: in welchen Zulieferorten ist die Zustellung besonders schlecht? -> Optimierungsbedarf
     # @author: Jakob Poley
+    # returns the mean delay in whole days per customer state of the data
     def getDeliveryDateDelayVersusGeoLocation(self):
-        customers = self.dataAccessor.getTable("customers")
-        orders = self.dataAccessor.getTable("orders")
-
-        merge_orders_on_customers = pd.merge(orders, customers, how='left', on='customer_id')
-        merge_orders_on_customers["difftime"] =  pd.to_datetime(merge_orders_on_customers["order_estimated_delivery_date"]) \
-            - pd.to_datetime(merge_orders_on_customers["order_delivered_customer_date"])
-
-        merge_orders_on_customers["difftime"] = merge_orders_on_customers["difftime"].astype('timedelta64[D]')
-        statenames = ["AC","AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG", "PA", "PB", "PR", "PE", "PI", "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO"] 
-        mean_difftime_per_state = []
-        for state in statenames:
-            state = merge_orders_on_customers.loc[merge_orders_on_customers["customer_state"]== state]
-            state = state["difftime"].mean()
-            mean_difftime_per_state.append(state)
-        return mean_difftime_per_state
+        if(self.dataAccessor.usePushdown()):
+            delay = self.selectAggregate(self.statementFactory().createMeanDelayPerStateStatement(),
+                                         "rollup_delay_per_state", ["customer_state", "difftime"])
+            delay = delay[delay["customer_state"].notna()]
+            return delay.set_index("customer_state")["difftime"].astype("float64").sort_index()
+        if(self.dataAccessor.useStreaming()):
+            delay = PartialAggregate()
+            for orders, customers in self.streamPartitions("customer_id", [("orders", ["customer_id", "order_estimated_delivery_date", "order_delivered_customer_date"]),
+                                                                           ("customers", ["customer_id", "customer_state"])]):
+                states = customers.drop_duplicates("customer_id").set_index("customer_id")["customer_state"]
+                difftime = pd.to_datetime(orders["order_estimated_delivery_date"]) - pd.to_datetime(orders["order_delivered_customer_date"])
+                delay.add(orders["customer_id"].map(states).rename("customer_state"), np.floor(difftime / pd.Timedelta(days=1)))
+            return delay.getMetric("mean", "difftime")
+        fact = self.getOrderFact()
+        merge_orders_on_customers = fact.loc[fact["order_row"], ["customer_state", "difftime"]]
+
+        merge_orders_on_customers["difftime"] = np.floor(merge_orders_on_customers["difftime"] / pd.Timedelta(days=1))
+        return self.getMetricByDimension(merge_orders_on_customers, "customer_state", "difftime", "mean")
 
     ############ methods for report 4 - Customer Behaviour  ###############
     
     # 4.1 most used payments  
     # --> insight: Welche Bezahlart ist am beliebtesten
     # @author: Robin Schumacher
+    # returns the number of payments per payment type of the data
     def getNumberOfPaymenttypes(self):
-        payment_type = self.dataAccessor.getTable("payments")["payment_type"]
-        boleto = payment_type[payment_type == "boleto"].count()
-        credit_card = payment_type[payment_type == "credit_card"].count()
-        debit_card = payment_type[payment_type == "debit_card"].count()
-        not_defined = payment_type[payment_type == "not_definied"].count()
-        voucher = payment_type[payment_type == "voucher"].count()
-        merged = [boleto, credit_card, debit_card, not_defined, voucher]
-        return merged
+        if(self.dataAccessor.usePushdown()):
+            counts = self.selectAggregate(self.statementFactory().createPaymentTypeCountStatement(),
+                                          "rollup_payment_types", ["payment_type", "number"])
+            return counts.set_index("payment_type")["number"].rename("count").sort_index()
+        if(self.dataAccessor.useStreaming()):
+            return self.streamMetricByDimension("payments", ["payment_type"], "payment_type").getMetric("count")
+        payments = self.dataAccessor.getTable("payments", ["payment_type"])
+        return self.getMetricByDimension(payments, "payment_type", statistic="count")
     
     # 4.2. review answer speed
     # --> insight: wie schnell kann mit review Antworten gerechnet werden?
     # @author: Robin Schumacher
+    # in the approximate mode a TDigest of the answer speeds in hours
     def getReviewAnswerSpeed(self):
-        answer_time = self.dataAccessor.getTable("reviews")[["review_creation_date", "review_answer_timestamp"]]
+        if(self.dataAccessor.useApproximate()):
+            sketch = self.dataAccessor.createTDigest()
+            for chunk in self.dataAccessor.getTableChunks("reviews", ["review_creation_date", "review_answer_timestamp"]):
+                answer_speed = pd.to_datetime(chunk["review_answer_timestamp"]) - pd.to_datetime(chunk["review_creation_date"])
+                sketch.add(np.floor(answer_speed / pd.Timedelta(hours=1)))
+            return sketch
+        answer_time = self.dataAccessor.getTable("reviews", ["review_creation_date", "review_answer_timestamp"])
         answer_time["review_answer_speed"] = pd.to_datetime(answer_time["review_answer_timestamp"]) - pd.to_datetime(answer_time["review_creation_date"])
-        answer_time = answer_time["review_answer_speed"].astype('timedelta64[h]')
+        answer_time = np.floor(answer_time["review_answer_speed"] / pd.Timedelta(hours=1))
         return answer_time
     
     # 4.3 PaymenttypeüberPreis   
     # --> insight: Welche Bezahlart wird bei welchem Einkaufswert am häufigsten genutzt
     # @author: Robin Schumacher
     def getPaymenttypeüberPreis(self):
-        payment_type = self.dataAccessor.getTable("payments")[["payment_type", "payment_value"]]
+        payment_type = self.dataAccessor.getTable("payments", ["payment_type", "payment_value"])
         return payment_type
 
     
@@ -450,68 +1074,111 @@ class DataWrangler:
     # 5.1. score distribution 
     # - insight: wie ist die Gesamtzufriedenheit einzuschätzen?
     # @author: Robin Schumacher
+    # returns the sum of the review scores per score
     def getGeneralCustomerSatisfaction(self):
-        order_reviews = self.dataAccessor.getTable("reviews")["review_score"]
-        one = order_reviews[order_reviews == 1].sum()
-        two = order_reviews[order_reviews == 2].sum()
-        three = order_reviews[order_reviews == 3].sum()
-        four = order_reviews[order_reviews == 4].sum()
-        five = order_reviews[order_reviews == 5].sum()
-        merged = [one, two, three, four, five]      
-        return merged
+        if(self.dataAccessor.usePushdown()):
+            scores = self.selectAggregate(self.statementFactory().createScoreSumStatement(),
+                                          "rollup_score_counts", ["review_score", "score"])
+            return scores.set_index("review_score")["score"].rename("review_score").sort_index()
+        if(self.dataAccessor.useStreaming()):
+            return self.streamMetricByDimension("reviews", ["review_score"], "review_score", "review_score").getMetric("sum", "review_score")
+        reviews = self.dataAccessor.getTable("reviews", ["review_score"])
+        return self.getMetricByDimension(reviews, "review_score", "review_score", "sum")
     
     # 5.2. Score versus seller 
     # - insight: bei welchen Verkäufern sind Kunden besonders unzufrieden?
     # @author: Robin Schumacher
     def getReviewScoreVersusSeller(self):
-        order_reviews = self.dataAccessor.getTable("reviews")[["order_id", "review_score"]]
-        seller_id = self.dataAccessor.getTable("order_items")[["order_id", "seller_id"]]
-        merge = pd.merge(left = seller_id, right = order_reviews, how='left', on = ["order_id"]).drop(columns= ["order_id"]).dropna()
-        merge = merge.groupby(by = "seller_id").mean("review_score")
-        return merge
+        if(self.dataAccessor.usePushdown()):
+            return self.selectMeanScore("seller_id")
+        fact = self.getOrderFact()
+        merge = fact.loc[fact["has_item"] & fact["has_review"], ["seller_id", "review_score"]]
+        return self.getMetricByDimension(merge, "seller_id", "review_score", "mean").to_frame()
     
     # 5.3. Score versus product
     # - insight: bei welchen Produkten` sind Kunden besonders unzufrieden?
     # - erstellung: robin
     def getReviewScoreVersusProduct(self):
-        order_reviews = self.dataAccessor.getTable("reviews")[["order_id", "review_score"]]
-        product_id = self.dataAccessor.getTable("order_items")[["order_id", "product_id"]]
-        merge = pd.merge(left = product_id, right = order_reviews, how='left', on = ["order_id"]).drop(columns= ["order_id"]).dropna()
-        merge = merge.groupby(by = "product_id").mean("review_score")
-        return merge
+        if(self.dataAccessor.usePushdown()):
+            return self.selectMeanScore("product_id")
+        fact = self.getOrderFact()
+        merge = fact.loc[fact["has_item"] & fact["has_review"], ["product_id", "review_score"]]
+        return self.getMetricByDimension(merge, "product_id", "review_score", "mean").to_frame()
     
+    def selectMeanScore(self, field):
+        merge = self.selectAggregate(self.statementFactory().createMeanScoreStatement(field),
+                                     "rollup_score_per_" + field.split("_")[0], [field, "review_score"])
+        merge["review_score"] = merge["review_score"].astype("float64")
+        return merge.set_index(field).sort_index()
+
     # 5.4. Score versus delivery time
     # - insight: wie stark ist die delivery time  auf die customer satisfaction
     # @author: Robin Schumacher
     def getReviewVersusVersusDeliveryTime(self):
-        order_reviews = self.dataAccessor.getTable("reviews")[["order_id", "review_score"]]
-        delivery_time = self.dataAccessor.getTable("orders")[["order_id", "order_status", "order_purchase_timestamp", "order_delivered_customer_date"]]
-        delivery_time = delivery_time[delivery_time.order_status == "delivered"].drop(columns= ["order_status"])
-        delivery_time["difftime"] = (pd.to_datetime(delivery_time["order_delivered_customer_date"]).dt.date - pd.to_datetime(delivery_time["order_purchase_timestamp"]).dt.date)
-        delivery_time["difftime"] = delivery_time["difftime"].astype('timedelta64[D]')
-        merge = pd.merge(left = delivery_time, right = order_reviews, how='left', on = ["order_id"]).drop(columns= ["order_id"]).dropna()
-        merge = merge.groupby(by = "difftime").mean("review_score")
+        fact = self.getOrderFact()
+        delivery_time = fact.loc[fact["review_row"] & fact["has_review"] & (fact["order_status"] == "delivered"), ["order_purchase_timestamp", "order_delivered_customer_date", "review_score"]]
+        delivery_time["difftime"] = delivery_time["order_delivered_customer_date"].dt.normalize() - delivery_time["order_purchase_timestamp"].dt.normalize()
+        delivery_time["difftime"] = np.floor(delivery_time["difftime"] / pd.Timedelta(days=1))
+        merge = delivery_time[["difftime", "review_score"]].dropna()
+        merge = merge.groupby(by = "difftime").mean()
         return merge
 
 
 class Plotter:
     
-    def __init__(self):
-        pass
+    # @param renderer: optional PlotRenderer, the plots are then only recorded
+    #                  and rendered in a batch after all reports have run
+    # @param maxPoints: plotMap and plotScatter draw at most this many markers,
+    #                   None draws all points
+    # @param density: "y" draws larger datasets as density grid, "n" draws a
+    #                 random sample of maxPoints points
+    # @param densityBins: cells per axis of the density grid
+    # @param targets: formats and dpi in which the OutputManager saves every
+    #                 plot, default DEFAULT_TARGETS
+    def __init__(self, renderer=None, maxPoints=None, density="y", densityBins=200, targets=None):
+        self.renderer = renderer
+        self.maxPoints = maxPoints
+        self.density = density
+        self.densityBins = densityBins
+        self.targets = targets if targets is not None else DEFAULT_TARGETS
+
+    # all plots draw into the same figure, which is cleared instead of opening
+    # a new figure per plot
+    def newFigure(self, figsize=None):
+        fig = plt.figure(num="plotter", clear=True)
+        fig.set_size_inches(figsize if figsize is not None else plt.rcParams["figure.figsize"])
+        return fig
     
+    # true if the points are drawn as density grid instead of markers
+    def useDensity(self, points):
+        return self.maxPoints is not None and points > self.maxPoints and self.density == "y"
+
     def plotMap(self, extend, title1, title2, datalon, datalat):
-        fig, ax = plt.subplots(subplot_kw={"projection":ccrs.PlateCarree()}, figsize=(20,15))
-        ax = plt.axes(projection=ccrs.PlateCarree())
+        if(self.useDensity(len(datalon))):
+            self.drawMap(extend, title1, title2, grid=DensityGrid(datalon, datalat, self.densityBins, extend))
+            return
+        if(self.maxPoints is not None):
+            datalon, datalat = samplePoints(datalon, datalat, self.maxPoints)
+        self.drawMap(extend, title1, title2, datalon, datalat)
+
+    @deferrable
+    def drawMap(self, extend, title1, title2, datalon=None, datalat=None, grid=None):
+        fig = self.newFigure((20,15))
+        ax = fig.add_subplot(projection=ccrs.PlateCarree())
         ax.set_extent(extend, ccrs.PlateCarree())
         ax.coastlines(resolution='110m')
         ax.add_feature(cartopy.feature.BORDERS)
         ax.add_feature(cartopy.feature.RIVERS)
-        plt.scatter(datalon, datalat, s=1)
+        if(grid is not None):
+            grid.draw(ax, transform=ccrs.PlateCarree())
+        else:
+            plt.scatter(datalon, datalat, s=1)
         ax.set_title(title2, fontsize=30)
         fig.suptitle(title1, fontsize=40)
 
+    @deferrable
     def plotLine(self, data, xleft, xright, xlabel, ylabel, title):
-        plt.figure(figsize=(20,15))
+        self.newFigure((20,15))
         plt.plot(data)
         plt.xlim(xleft,xright)
         plt.title(title, fontsize=40)
@@ -522,79 +1189,116 @@ class Plotter:
 
         # @author: Robin Schumacher  
     def plotScatter(self, y, x, xlabel, ylabel, title):
-        plt.figure(figsize=(20,15))
+        if(self.useDensity(len(x))):
+            self.plotDensity(DensityGrid(y, x, self.densityBins), xlabel, ylabel, title)
+            return
+        if(self.maxPoints is not None):
+            y, x = samplePoints(y, x, self.maxPoints)
+        self.drawScatter(y, x, xlabel, ylabel, title)
+
+    @deferrable
+    def drawScatter(self, y, x, xlabel, ylabel, title):
+        self.newFigure((20,15))
         plt.scatter(y, x)
         plt.title(title, fontsize=40)
         plt.gca().set_xlabel(xlabel, fontsize=30)
         plt.gca().set_ylabel(ylabel, fontsize=30)
         plt.gca().tick_params(labelsize=30)
 
+    # @param grid: DensityGrid of the points
+    @deferrable
+    def plotDensity(self, grid, xlabel, ylabel, title):
+        self.newFigure((20,15))
+        grid.draw(plt.gca())
+        plt.title(title, fontsize=40)
+        plt.gca().set_xlabel(xlabel, fontsize=30)
+        plt.gca().set_ylabel(ylabel, fontsize=30)
+        plt.gca().tick_params(labelsize=30)
+
+    # @param data: values or a TDigest of the values (approximate mode)
+    @deferrable
     def plotHistInRange(self, data, bins, xleft, xright, xlabel, title):
-        plt.figure(figsize=(20,15))
-        plt.hist(data, bins=bins)
+        self.newFigure((20,15))
+        if(isinstance(data, TDigest)):
+            counts, edges = data.histogram(bins)
+            plt.hist(edges[:-1], bins=edges, weights=counts)
+        else:
+            plt.hist(data, bins=bins)
         plt.xlim(xleft,xright)
         plt.title(title, fontsize=40)
         plt.gca().set_xlabel(xlabel, fontsize=30)
         plt.gca().set_ylabel("Amount (A.U.)", fontsize=30)
         plt.gca().tick_params(labelsize=30)
         
+    @deferrable
     def plotBar(self, data, height, xlabel, title):
-        plt.figure(figsize=(20,15))
+        self.newFigure((20,15))
         plt.bar(data, height=height)
         plt.title(title, fontsize=40)
         plt.gca().set_xlabel(xlabel, fontsize=30)
         plt.gca().set_ylabel("Amount (A.U.)", fontsize=30)
         plt.gca().tick_params(labelsize=30)
         
+    @deferrable
     def plotPie(self, labels, sizes, explore, title):
-        plt.figure(figsize=(20,15))
-        plt.gca().pie(sizes, explode=explore, labels=labels, autopct='%1.1f%%', shadow=True, startangle=90, textprops={"fontsize":30})
+        self.newFigure((20,15))
+        pie = plt.gca().pie(sizes, explode=explore, labels=labels, autopct='%1.1f%%', shadow=True, startangle=90, textprops={"fontsize":30})
         plt.title(title, fontsize=40)
         plt.legend(pie[0],labels, bbox_to_anchor=(1,0.5), loc="center right", fontsize=10, bbox_transform=plt.gcf().transFigure)
         plt.gca().tick_params(labelsize=30)
-        fig.suptitle(title, fontsize=40)
 
         
+    @deferrable
     def plotHist(self, data, bins, title):
-        plt.figure()
+        self.newFigure()
         plt.hist(data, bins=bins)
         plt.title(title)
         
-    def plotBoxplot(self, data, xlabel, ylabel, title):
-        plt.figure()
+    # @param data: values or list of value lists, one box each
+    # @param labels: optional names of the boxes
+    @deferrable
+    def plotBoxplot(self, data, xlabel, ylabel, title, labels=None):
+        self.newFigure()
         plt.gca().set_xlabel(xlabel)
         plt.gca().set_ylabel(ylabel)
         plt.title(title)
         plt.boxplot(data)
+        if(labels is not None):
+            plt.gca().set_xticklabels(labels)
         
          
         
 class OutputManager:
-    def __init__(self, reportId):
+    # @param reportId: e.g. "report_1", subfolder of the plots
+    # @param plotter: Plotter of the report; if it has a renderer, saveFig
+    #                 only names the recorded plot, otherwise every plot is
+    #                 saved in the targets of the plotter
+    def __init__(self, reportId, plotter=None):
+        self.reportId = reportId
+        self.plotter = plotter
         self.outputfolderPlot = "output/data/plots/" + reportId
         self.outputfolderText = "output/data/text/" + reportId
-        self.dataAccessor = DataAccessor()
+        self.targets = plotter.targets if plotter is not None else DEFAULT_TARGETS
+
     def saveFig(self, figurename):
+        if(self.plotter is not None and self.plotter.renderer is not None):
+            self.plotter.renderer.save(self.reportId, figurename)
+            return
         figure=plt.gcf()
-        figure.savefig(self.outputfolderPlot + "/" + figurename + ".png")
-        
-class HashToIntConverter:
-    def __init__(self, hashvalues):
-        self.hashvalues = hashvalues
-    def getDict(self):
-        hashvalues = self.hashvalues
-        result={}
-        for index, hashvalue in enumerate(hashvalues):
-            result[hashvalue] = index
-        return result
-    def convert(self, data):
-        dicttemp = self.getDict()
-        indexlist = []
-        for index in data.index:
-            indexlist.append(dicttemp[index])
-        data.index = indexlist
-        return data
-
+        savePlot(figure, self.reportId, figurename, self.targets)
+        # only the artists are dropped, the figure is reused by the next plot
+        figure.clf()
+
+
+# Plotter with the point limits and the targets ("targets": formats and dpi
+# in which every plot is saved) of main.json "plots"
+# @param main_config: parsed config/main.json
+# @param renderer: optional PlotRenderer
+def createPlotter(main_config, renderer=None):
+    plotConfig = main_config.get("plots", {})
+    return Plotter(renderer, plotConfig.get("maxPoints"), plotConfig.get("density", "y"), plotConfig.get("densityBins", 200),
+                   plotConfig.get("targets"))
+        
 
 
 class Report_1_Market_Analysis:
@@ -602,7 +1306,7 @@ class Report_1_Market_Analysis:
     def __init__(self, dataWrangler, plotter):
         self.dataWrangler = dataWrangler
         self.plotter = plotter
-        self.outputManager = OutputManager("report_1")
+        self.outputManager = OutputManager("report_1", plotter)
         self.name = "Report 1 Market Analysis"
         
     def execute(self):
@@ -625,27 +1329,23 @@ class Report_1_Market_Analysis:
         #  --> insight: Nachfrageverteilung innerhalb des Jahres  
         # @author: Robin Schumacher                         
         order_time = self.dataWrangler.getGroupOrdernumbersByTimePeriod() 
+        # number of purchase days per day/dayofweek/month
+        calendar = self.dataWrangler.getPurchaseCalendar()
 
         orders_day = order_time.groupby(by ='Day_order').count().drop(columns=['Season_order', 'Year_order', 'order_purchase_timestamp', 'product_id', 'Month_order', "Dayofweek_order"]).rename(columns={"order_id":"count_day"})
-        divider = pd.to_datetime(order_time["order_purchase_timestamp"]).dt.date.drop_duplicates(keep = "first")
-        divider = pd.to_datetime(divider).dt.day
-        divider = divider.groupby(by = divider).count()
+        divider = calendar.getDayCounts("Day")
         orders_day["count_day"] = orders_day["count_day"] / divider
         self.plotter.plotLine(orders_day, 1, 31, "Day of Month", "Count", "Average Orders per Dayofmonth")
         self.outputManager.saveFig("1.3 Orders per Dayofmonth")
 
         orders_dayofweek = order_time.groupby(by = "Dayofweek_order").count().drop(columns=['Season_order', 'Year_order', 'order_purchase_timestamp', 'product_id', 'Month_order', "Day_order"]).rename(columns={"order_id":"count_dayofweek"})
-        divider = pd.to_datetime(order_time["order_purchase_timestamp"]).dt.date.drop_duplicates(keep = "first")
-        divider = pd.to_datetime(divider).dt.dayofweek
-        divider = divider.groupby(by = divider).count()
+        divider = calendar.getDayCounts("Dayofweek")
         orders_dayofweek["count_dayofweek"] = orders_dayofweek["count_dayofweek"] / divider
         self.plotter.plotLine(orders_dayofweek, 0, 6, "Dayofweek", "Count", "Average Orders per Dayofweek")
         self.outputManager.saveFig("1.3 Orders per Dayofweek")
 
         orders_month = order_time.groupby(by ='Month_order').count().drop(columns=['Season_order', 'Year_order', 'order_purchase_timestamp', 'product_id', 'Day_order', "Dayofweek_order"]).rename(columns={"order_id":"count_month"})
-        divider = pd.to_datetime(order_time["order_purchase_timestamp"]).dt.date.drop_duplicates(keep = "first")
-        divider = pd.to_datetime(divider).dt.month
-        divider = divider.groupby(by = divider).count()
+        divider = calendar.getDayCounts("Month")
         orders_dayofweek["count_month"] = orders_month["count_month"] / divider
         self.plotter.plotLine(orders_month, 1, 12, "Month", "Count", "Average Orders per Month")
         self.outputManager.saveFig("1.3 Orders per Month")
@@ -721,7 +1421,7 @@ class Report_2_Business_Development:
     def __init__(self, dataWrangler, plotter):
         self.dataWrangler = dataWrangler
         self.plotter = plotter
-        self.outputManager = OutputManager("report_2")
+        self.outputManager = OutputManager("report_2", plotter)
         self.name = "Report 2 Buiness Development"
         
     def execute(self):
@@ -738,45 +1438,40 @@ class Report_2_Business_Development:
         # --> insight: Budgets, Planung, Buchhaltung, Strategieentwicklung etc.
         # @author: Robin Schumacher
         order_time = self.dataWrangler.getMergeOrderPriceOrderOrderedDelivered()
+        calendar = self.dataWrangler.getPurchaseCalendar()
 
-        sales_day = order_time.groupby(by ='Day_order').sum("price").drop(columns=['Season_order', 'Year_order', 'Month_order', "Dayofweek_order"])
-        divider = pd.to_datetime(order_time["order_purchase_timestamp"]).dt.date.drop_duplicates(keep = "first")
-        divider = pd.to_datetime(divider).dt.day
-        divider = divider.groupby(by = divider).count()
+        sales_day = order_time.groupby(by ='Day_order')[["price"]].sum()
+        divider = calendar.getDayCounts("Day")
         sales_day["price"] = sales_day["price"] / divider
         self.plotter.plotLine(sales_day, 1, 31, "Dayofmonth", "Average Turnover (Real)", "Sales per Dayofmonth")
         self.outputManager.saveFig("2.2 Sales per Dayofmonth")
 
-        sales_dayofweek = order_time.groupby(by = "Dayofweek_order").sum("price").drop(columns=['Season_order', 'Year_order', 'Month_order', "Day_order"])
-        divider = pd.to_datetime(order_time["order_purchase_timestamp"]).dt.date.drop_duplicates(keep = "first")
-        divider = pd.to_datetime(divider).dt.dayofweek
-        divider = divider.groupby(by = divider).count()
+        sales_dayofweek = order_time.groupby(by = "Dayofweek_order")[["price"]].sum()
+        divider = calendar.getDayCounts("Dayofweek")
         sales_dayofweek["price"] = sales_dayofweek["price"] / divider
         self.plotter.plotLine(sales_dayofweek, 0, 6, "Dayofweek", "Average Turnover (Real)", "Sales per Dayofweek")
         self.outputManager.saveFig("2.2 Sales per Dayofweek")
 
-        sales_month = order_time.groupby(by ='Month_order').sum("price").drop(columns=['Season_order', 'Year_order', 'Dayofweek_order', "Day_order"])
-        divider = pd.to_datetime(order_time["order_purchase_timestamp"]).dt.date.drop_duplicates(keep = "first")
-        divider = pd.to_datetime(divider).dt.month
-        divider = divider.groupby(by = divider).count()
+        sales_month = order_time.groupby(by ='Month_order')[["price"]].sum()
+        divider = calendar.getDayCounts("Month")
         sales_dayofweek["price"] = sales_month["price"] / divider
         self.plotter.plotLine(sales_month, 1, 12, "Month", "Average Turnover (m. Real)", "Sales per Month")
         self.outputManager.saveFig("2.2 Sales per Month")
 
-        sales_season = order_time.groupby(by ='Season_order').sum("price").drop(columns=['Dayofweek_order', 'Year_order', 'Month_order', "Day_order"])
+        sales_season = order_time.groupby(by ='Season_order')[["price"]].sum()
         #number of seasons to divide
         divider = [4,2,2,3]
         sales_season["price"] = (sales_season["price"] / divider)
         self.plotter.plotLine(sales_season, 1, 4, "Season", "Average Turnover (m. Real)",  "Sales per Season")
         self.outputManager.saveFig("2.2 Sales per Season")
 
-        sales_year = order_time.groupby(by ='Year_order').sum("price").drop(columns=['Season_order', 'Dayofweek_order', 'Month_order', "Day_order"])
+        sales_year = order_time.groupby(by ='Year_order')[["price"]].sum()
         self.plotter.plotLine(sales_year, 2016, 2018, "Year", "Turnover (m. Real)", "Sales per Year")
         self.outputManager.saveFig("2.2 Sales per Year")
         
-        sales_product = order_time.groupby(by ='product_id').sum("price").drop(columns=['Season_order', 'Year_order', 'Month_order', "Day_order", "Dayofweek_order"])
+        sales_product = order_time.groupby(by ='product_id')[["price"]].sum()
         hashToIntConverter = HashToIntConverter(sales_product.index)
-        orders_product = hashToIntConverter.convert(sales_product)
+        sales_product = hashToIntConverter.convert(sales_product)
         self.plotter.plotLine(sales_product, 0, 1000, "Product", "Turnover (Real)",  "Sales per Product")
         self.outputManager.saveFig("2.2 Sales per Product")
         
@@ -790,7 +1485,7 @@ class Report_3_Supply_Chain:
     def __init__(self, dataWrangler, plotter):
         self.dataWrangler = dataWrangler
         self.plotter = plotter
-        self.outputManager = OutputManager("report_3")
+        self.outputManager = OutputManager("report_3", plotter)
         self.name = "Report 3 Supply Chain"
         
     def execute(self):        
@@ -798,20 +1493,22 @@ class Report_3_Supply_Chain:
         # --> insight: wie ist die Qualität des Gesamt Order Status einzuschätzen?
         # @author: Hendrik Garken           
         data = self.dataWrangler.getOrderStatusDistribution()
-        groups = data.groupby(by = "order_status").groups
+        groups = data.groupby(by = "order_status", observed=True).groups
         labels = []
         amounts = []
         for k,g in groups.items():
             labels.append(k)
             amounts.append(len(list(g)))
-        plt.pie(amounts, labels=labels)
+        self.plotter.plotPie(labels, amounts, None, "Order Status distribution")
         self.outputManager.saveFig("3.1 Order Status destribution")
         
         # 3.2 sellerid versus bad status
         # --> insight: Welche Verkäufer sind besonder schlecht beim Zustellen?
         # @author: Hendrik Garken      
         seller_bad_status = self.dataWrangler.getSellerWithBadOrderStatus()
-        self.plotter.plotBoxplot(seller_bad_status, "sellers", "time difference in hours", "3.2 Sellers with bad order status")
+        delays = ["mean_delay_hours", "median_delay_hours", "p95_delay_hours"]
+        self.plotter.plotBoxplot([seller_bad_status[column].dropna().to_numpy() for column in delays], "sellers",
+                                 "delay in hours (negative = early)", "3.2 Sellers with bad order status", ["mean", "median", "p95"])
         self.outputManager.saveFig("3.2 boxplot")
                
         # 3.3 amount of delivery delay much worse than expected (barplot)
@@ -832,8 +1529,7 @@ class Report_3_Supply_Chain:
         # --> insight: in welchen Zulieferorten ist die Zustellung besonders schlecht? -> Optimierungsbedarf
         # @author: Jakob Poley
         meanDelaeyPerState = self.dataWrangler.getDeliveryDateDelayVersusGeoLocation()
-        statenames = ["AC","AL", "AP", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MT", "MS", "MG", "PA", "PB", "PR", "PE", "PI", "RJ", "RN", "RS", "RO", "RR", "SC", "SP", "SE", "TO"] 
-        self.plotter.plotBar(statenames, meanDelaeyPerState, "",  "Mean Delay Per State")
+        self.plotter.plotBar(list(meanDelaeyPerState.index), meanDelaeyPerState.tolist(), "",  "Mean Delay Per State")
         self.outputManager.saveFig("3.5 Mean Delay per State")
         
     def printName(self):
@@ -845,7 +1541,7 @@ class Report_4_Customer_Behaviour:
     def __init__(self, dataWrangler, plotter):
         self.dataWrangler = dataWrangler
         self.plotter = plotter
-        self.outputManager = OutputManager("report_4")
+        self.outputManager = OutputManager("report_4", plotter)
         self.name = "Report 4 Customer Behaviour"
         
     def execute(self):
@@ -853,7 +1549,7 @@ class Report_4_Customer_Behaviour:
         # --> insight: Welche Bzahlart ist am beliebtesten
         # @author: Robin Schumacher
         payment = self.dataWrangler.getNumberOfPaymenttypes()
-        self.plotter.plotBar(["boleto", "credit_card", "debit_card", "not_defined", "voucher"], payment, "Count",  "Usage of Paymenttypes")
+        self.plotter.plotBar(list(payment.index), payment.tolist(), "Count",  "Usage of Paymenttypes")
         self.outputManager.saveFig("4.1 Most used Paymenttypes")
 
         # 4.2. ReviewAnswerSpeed (hist)
@@ -882,7 +1578,7 @@ class Report_5_Customer_Satisfaction:
     def __init__(self, dataWrangler, plotter):
         self.dataWrangler = dataWrangler
         self.plotter = plotter
-        self.outputManager = OutputManager("report_5")
+        self.outputManager = OutputManager("report_5", plotter)
         self.name = "Report 5 Customer Satisfaction"
         
     def execute(self):    
@@ -890,7 +1586,7 @@ class Report_5_Customer_Satisfaction:
         # - insight: wie ist die Gesamtzufriedenheit einzuschätzen?
         # @author: Robin Schumacher
         score_distribution = self.dataWrangler.getGeneralCustomerSatisfaction()
-        self.plotter.plotBar(["1", "2", "3", "4", "5"], score_distribution, "Review Score",  "Count of Score at Reviews")
+        self.plotter.plotBar([str(score) for score in score_distribution.index], score_distribution.tolist(), "Review Score",  "Count of Score at Reviews")
         self.outputManager.saveFig("5.1 Score Distribution")
         
         # 5.2. Score versus seller (line) 
@@ -907,7 +1603,7 @@ class Report_5_Customer_Satisfaction:
         # @author: Robin Schumacher
         product_score = self.dataWrangler.getReviewScoreVersusProduct()
         hashToIntConverter = HashToIntConverter(product_score.index)
-        seller_score = hashToIntConverter.convert(product_score)
+        product_score = hashToIntConverter.convert(product_score)
         self.plotter.plotLine(product_score, 0, 100, "Product ID", "Review Score", "Score per Product")
         self.outputManager.saveFig("5.3 Score versus Product")
        
@@ -924,24 +1620,145 @@ class Report_5_Customer_Satisfaction:
         
         
 class ProcessorManually:
-    def __init__(self, reportlist):
+    # @param reportlist: reports to execute
+    # @param workers: number of worker processes, 1 executes the reports one after another
+    # @param planner: optional ExecutionPlanner which computes the data of all
+    #                 reports in one DAG (with workers threads) before plotting
+    # @param renderer: optional PlotRenderer of the reports' Plotters, renders
+    #                  the recorded plots after all reports have run
+    def __init__(self, reportlist, workers=1, planner=None, renderer=None):
         self.reportlist = reportlist
+        self.workers = workers
+        self.planner = planner
+        self.renderer = renderer
 
     def execute(self):
-       
+        start = time.perf_counter()
+        if(self.planner is not None):
+            walltimes = self.executePlanned()
+        elif(self.workers > 1 and len(self.reportlist) > 1):
+            walltimes = self.executeParallel()
+        else:
+            walltimes = self.executeSequential()
+        if(self.renderer is not None):
+            walltimes.append(self.executeRender())
+        self.printWalltimes(walltimes, time.perf_counter() - start)
+
+    # a failing report is recorded with its error, the others still run
+    def executeSequential(self):
+        return [executeReport(report) for report in self.reportlist]
+
+    # computes the data of all reports with the ExecutionPlanner, shared steps
+    # only once and independent steps in parallel. The reports then only plot;
+    # steps that failed in the plan are computed again by the report itself,
+    # so their error shows up in the status of the report.
+    def executePlanned(self):
+        self.planner.buildPlan([report.name for report in self.reportlist])
+        self.planner.printPlan()
+        self.planner.execute(self.workers)
         for report in self.reportlist:
-            report.printName()
-            report.execute()
-        
-            
+            report.dataWrangler = PlannedDataWrangler(report.dataWrangler, self.planner.getResults(report.name))
+        walltimes = self.executeSequential()
+        for node, seconds in sorted(self.planner.walltimes.items(), key=lambda item: item[1], reverse=True):
+            walltimes.append((node, seconds, "plan" if node not in self.planner.errors else "plan, " + self.planner.errors[node]))
+        for node in sorted(set(self.planner.errors) - set(self.planner.walltimes)):
+            walltimes.append((node, 0.0, "plan, " + self.planner.errors[node]))
+        return walltimes
+
+    # runs the reports on a process pool. The DataAccessor of the first report
+    # loads the tables and the order fact table once, the workers get them
+    # through shared memory and render with the non-interactive Agg backend.
+    def executeParallel(self):
+        dataAccessor = self.reportlist[0].dataWrangler.dataAccessor
+        tables = dataAccessor.getAllTables()
+        tables["order_fact"] = DataWrangler(dataAccessor).getOrderFact()
+        sharedTables = SharedTables()
+        for table, df in tables.items():
+            sharedTables.share(table, df)
+        try:
+            with multiprocessing.Pool(processes=min(self.workers, len(self.reportlist)),
+                                      initializer=initReportWorker,
+                                      initargs=(sharedTables.getDescriptors(),)) as pool:
+                walltimes = pool.map(executeReportInWorker, [type(report) for report in self.reportlist], chunksize=1)
+        finally:
+            sharedTables.close()
+        return walltimes
+
+    # renders the plots the reports have recorded, in a batch on the render workers
+    def executeRender(self):
+        start = time.perf_counter()
+        results = self.renderer.render()
+        failed = [(figurename, status) for figurename, status in results if status != "ok"]
+        for figurename, status in failed:
+            print(figurename + " " + status)
+        status = "render" if len(failed) == 0 else "render, " + str(len(failed)) + " failed"
+        return ("rendering " + str(len(results)) + " plots", time.perf_counter() - start, status)
+
+    def printWalltimes(self, walltimes, total):
+        print("+++++ wall time per report ++++")
+        for name, seconds, status in walltimes:
+            print("{:<45} {:>8.1f} s   {}".format(name, seconds, status))
+        reportSeconds = [seconds for name, seconds, status in walltimes
+                         if not (status.startswith("plan") or status.startswith("render"))]
+        print("{:<45} {:>8.1f} s".format("sum of reports", sum(reportSeconds)))
+        print("{:<45} {:>8.1f} s   ({} workers)".format("total", total, self.workers))
+
+
+# DataAccessor of a worker process of the ProcessorManually
+workerDataAccessor = None
+
+
+def initReportWorker(descriptors):
+    global workerDataAccessor
+    plt.switch_backend("Agg")
+    workerDataAccessor = DataAccessor()
+    workerDataAccessor.preloadTables(attachTables(descriptors))
+
+
+def executeReportInWorker(reportClass):
+    return executeReport(reportClass(DataWrangler(workerDataAccessor), createPlotter(workerDataAccessor.main_config)))
+
+
+# executes a report, in this or a worker process
+# @return: (report name, wall time, "ok" or "failed: " and the error)
+def executeReport(report):
+    report.printName()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        report.execute()
+    except Exception as error:
+        status = "failed: " + repr(error)
+    plt.close("all")
+    return (report.name, time.perf_counter() - start, status)
 
-if __name__=="__main__":  
-   report1 = Report_1_Market_Analysis(DataWrangler(DataAccessor()), Plotter())
-   #report2 = Report_2_Business_Development(DataWrangler(DataAccessor()), Plotter())
-   #report3 = Report_3_Supply_Chain(DataWrangler(DataAccessor()), Plotter())
-   #report4 = Report_4_Customer_Behaviour(DataWrangler(DataAccessor()), Plotter())
-   #report5 = Report_5_Customer_Satisfaction(DataWrangler(DataAccessor()), Plotter())
 
-   processor = ProcessorManually([report1])
+if __name__=="__main__":  
+   # alle reports teilen sich einen DataAccessor und damit den Tabellen-Cache
+   dataAccessor = DataAccessor()
+   dataAccessor.ingest()
+   # die Grafiken werden nur in Dateien gespeichert, kein Fenster nötig
+   plt.switch_backend("Agg")
+   # main.json "plots" -> "deferred": "y" sammelt die Plots aller reports und
+   # rendert sie danach auf "workers" Prozessen in alle "targets" (nacheinander
+   # und im planner; mit mehreren processor workers rendert jeder Prozess selbst)
+   plotConfig = dataAccessor.main_config.get("plots", {"deferred": "n"})
+   renderer = None
+   if(plotConfig.get("deferred", "n")=="y"):
+       renderer = PlotRenderer(Plotter, plotConfig.get("targets", DEFAULT_TARGETS), plotConfig.get("workers", 1))
+   report1 = Report_1_Market_Analysis(DataWrangler(dataAccessor), createPlotter(dataAccessor.main_config, renderer))
+   report2 = Report_2_Business_Development(DataWrangler(dataAccessor), createPlotter(dataAccessor.main_config, renderer))
+   report3 = Report_3_Supply_Chain(DataWrangler(dataAccessor), createPlotter(dataAccessor.main_config, renderer))
+   report4 = Report_4_Customer_Behaviour(DataWrangler(dataAccessor), createPlotter(dataAccessor.main_config, renderer))
+   report5 = Report_5_Customer_Satisfaction(DataWrangler(dataAccessor), createPlotter(dataAccessor.main_config, renderer))
+
+   # main.json "processor" -> "workers": Anzahl paralleler Prozesse (bzw. Threads im planner), 1 = nacheinander
+   # "planner": "y" berechnet die Daten aller reports über den executionPlan der reportings.json
+   processorConfig = dataAccessor.main_config.get("processor", {"workers": 1})
+   planner = None
+   if(processorConfig.get("planner", "n")=="y"):
+       planner = ExecutionPlanner(json_parser.JsonParser("config/reportings.json").parse(), DataWrangler(dataAccessor))
+   processor = ProcessorManually([report1, report2, report3, report4, report5], processorConfig["workers"], planner, renderer)
    processor.execute()
+   dataAccessor.printCacheStatistics()
 
@@ -0,0 +1,93 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+hands DataFrames to worker processes through shared memory
+
+Der ProcessorManually lädt die Tabellen einmal im Hauptprozess und legt die
+Spalten in multiprocessing.shared_memory Blöcke. Die Worker-Prozesse bauen
+daraus ihre DataFrames, ohne die .csv Dateien oder Snapshots erneut zu lesen.
+Numerische, boolesche, Datums- und Zeitdifferenz-Spalten sowie die codes von
+categoricals liegen im shared memory, alle übrigen Spalten (Strings) werden
+beim Start der Worker einmal gepickelt übergeben.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+# parent side: owns the shared memory blocks
+class SharedTables:
+
+    def __init__(self):
+        self.blocks = []
+        self.descriptors = {}
+
+    # copies the columns of a DataFrame into shared memory
+    # @param name: name of the table
+    # @param df: DataFrame to share
+    def share(self, name, df):
+        columns = []
+        for column in df.columns:
+            values = df[column]
+            if(isinstance(values.dtype, pd.CategoricalDtype)):
+                columns.append((column, "categorical", self.shareArray(values.cat.codes.to_numpy()),
+                                values.cat.categories, values.cat.ordered))
+            elif(isinstance(values.dtype, np.dtype) and values.dtype.kind in "biufcmM"):
+                columns.append((column, "array", self.shareArray(values.to_numpy())))
+            else:
+                columns.append((column, "series", values.reset_index(drop=True)))
+        self.descriptors[name] = columns
+
+    def shareArray(self, array):
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        self.blocks.append(block)
+        return (block.name, array.dtype.str, len(array))
+
+    # descriptors to pass to attachTables in the worker processes
+    def getDescriptors(self):
+        return self.descriptors
+
+    # frees the shared memory, call after all workers have finished
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+# worker side: blocks have to stay open as long as the DataFrames are used
+attachedBlocks = []
+
+
+# rebuilds the shared DataFrames in a worker process
+# @param descriptors: result of SharedTables.getDescriptors()
+def attachTables(descriptors):
+    tables = {}
+    for name, columns in descriptors.items():
+        data = {}
+        for column in columns:
+            if(column[1] == "categorical"):
+                data[column[0]] = pd.Categorical.from_codes(attachArray(column[2]), column[3], column[4])
+            elif(column[1] == "array"):
+                data[column[0]] = attachArray(column[2])
+            else:
+                data[column[0]] = column[2]
+        tables[name] = pd.DataFrame(data, copy=False)
+    return tables
+
+
+def attachArray(arrayDescriptor):
+    blockName, dtype, length = arrayDescriptor
+    # the workers share the resource tracker of the parent process, which
+    # unlinks the blocks in SharedTables.close()
+    block = shared_memory.SharedMemory(name=blockName)
+    attachedBlocks.append(block)
+    return np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf)
@@ -0,0 +1,184 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+mergeable sketches for the approximate mode
+
+Für sehr große Datenmengen (main.json "approximate" -> "enabled": "y")
+werden distinct counts und Verteilungen nicht exakt, sondern mit Sketches
+fester Größe und beschränktem Fehler berechnet:
+
+- HyperLogLog: Anzahl unterschiedlicher Werte (ids) mit 2^precision
+  Registern, relativer Standardfehler 1.04 / sqrt(2^precision), z.B. 0.8 %
+  bei precision 14 (16 KB)
+- TDigest: Quantile, CDF und Histogramme über gewichtete Zentroiden; mit
+  der k1 Skalenfunktion sind die Ränder (p1, p99) besonders genau
+
+Beide Sketches werden chunkweise gefüllt (vektorisiert, ein numpy Aufruf
+pro Chunk) und lassen sich über merge zusammenführen, z.B. die Sketches
+mehrerer Chunks oder Partitionen.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import numpy as np
+import pandas as pd
+
+
+# distinct count estimator, mergeable by the register maximum
+class HyperLogLog:
+
+    # @param precision: number of index bits, 2^precision registers (4 - 18)
+    def __init__(self, precision=14):
+        if(precision < 4 or precision > 18):
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = np.zeros(2**precision, dtype="uint8")
+
+    # adds values (Series, array or list); missing values are ignored
+    def add(self, values):
+        values = pd.Series(values, copy=False).dropna()
+        if(len(values) == 0):
+            return self
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        index = (hashes >> np.uint64(64 - self.precision)).astype("int64")
+        rest = hashes & np.uint64(2**(64 - self.precision) - 1)
+        # rank: position of the first 1 bit in the remaining 64 - precision bits
+        rank = (64 - self.precision) - bitLength(rest) + 1
+        np.maximum.at(self.registers, index, rank.astype("uint8"))
+        return self
+
+    # merges another HyperLogLog with the same precision into this one
+    def merge(self, other):
+        if(other.precision != self.precision):
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    # estimated number of distinct values
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype("int64")))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if(estimate <= 2.5 * m and zeros > 0):
+            # linear counting for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    # relative standard error of count()
+    def relativeError(self):
+        return 1.04 / np.sqrt(len(self.registers))
+
+
+# number of significant bits of unsigned 64 bit integers, 0 for 0; exact,
+# the two 32 bit halves are converted to float separately
+def bitLength(values):
+    high = (values >> np.uint64(32)).astype("float64")
+    low = (values & np.uint64(2**32 - 1)).astype("float64")
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+# quantile sketch: weighted centroids, small near the tails (k1 scale function)
+class TDigest:
+
+    # @param compression: about the number of centroids; larger is more exact
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+        # only whole numbers so far, e.g. hours floored like the reports do
+        self.integers = True
+
+    # adds values (Series, array or list), timedeltas in hours; missing
+    # values are ignored
+    def add(self, values):
+        values = pd.Series(values, copy=False)
+        if(pd.api.types.is_timedelta64_dtype(values.dtype)):
+            values = values / pd.Timedelta(hours=1)
+        numbers = values.to_numpy(dtype="float64", na_value=np.nan)
+        numbers = numbers[np.isfinite(numbers)]
+        if(len(numbers) == 0):
+            return self
+        self.min = min(self.min, numbers.min())
+        self.max = max(self.max, numbers.max())
+        self.integers = self.integers and bool(np.all(numbers == np.floor(numbers)))
+        self.compress(np.concatenate([self.means, numbers]), np.concatenate([self.weights, np.ones(len(numbers))]))
+        return self
+
+    # merges another TDigest into this one
+    def merge(self, other):
+        if(len(other.weights) > 0):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self.integers = self.integers and other.integers
+            self.compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+        return self
+
+    # sorts the points and merges neighbours whose quantiles fall into the
+    # same unit of the scale function k(q) = compression / (2 pi) * asin(2q - 1)
+    def compress(self, means, weights):
+        order = np.argsort(means, kind="mergesort")
+        means = means[order]
+        weights = weights[order]
+        total = weights.sum()
+        quantiles = (np.cumsum(weights) - weights / 2) / total
+        scale = self.compression / (2 * np.pi) * np.arcsin(2 * quantiles - 1)
+        clusters = np.floor(scale + self.compression / 4).astype("int64")
+        newWeights = np.bincount(clusters, weights=weights)
+        newMeans = np.bincount(clusters, weights=weights * means)
+        filled = newWeights > 0
+        self.weights = newWeights[filled]
+        self.means = newMeans[filled] / self.weights
+
+    def count(self):
+        return float(self.weights.sum())
+
+    # value at quantile q (number or array between 0 and 1)
+    def quantile(self, q):
+        positions, values = self.getCurve()
+        return np.interp(np.asarray(q, dtype="float64") * self.count(), positions, values)
+
+    # share of the values <= x (number or array). For whole numbers this is
+    # the share <= floor(x) + 0.5, there the curve between two neighbouring
+    # values passes the step of the exact cdf
+    def cdf(self, x):
+        x = np.asarray(x, dtype="float64")
+        if(self.integers):
+            x = np.floor(x) + 0.5
+        return self.interpolateShare(x)
+
+    # share of the values < x (number or array)
+    def cdfBelow(self, x):
+        x = np.asarray(x, dtype="float64")
+        if(self.integers):
+            x = np.ceil(x) - 0.5
+        return self.interpolateShare(x)
+
+    def interpolateShare(self, x):
+        positions, values = self.getCurve()
+        return np.interp(x, values, positions) / self.count()
+
+    # estimated number of values per bin like np.histogram, the bins include
+    # their left edge, the last bin also its right edge
+    # @param bins: number of equal bins between min and max, or the bin edges
+    # @return: counts and edges
+    def histogram(self, bins=10):
+        if(np.isscalar(bins)):
+            edges = np.linspace(self.min, self.max, int(bins) + 1)
+        else:
+            edges = np.asarray(bins, dtype="float64")
+        shares = self.cdfBelow(edges)
+        shares[-1] = self.cdf(edges[-1])
+        return np.diff(shares) * self.count(), edges
+
+    # cumulative weights at the centroids, extended by min and max
+    def getCurve(self):
+        if(len(self.weights) == 0):
+            raise ValueError("empty TDigest")
+        positions = np.cumsum(self.weights) - self.weights / 2
+        return (np.concatenate([[0.0], positions, [self.count()]]),
+                np.concatenate([[self.min], self.means, [self.max]]))
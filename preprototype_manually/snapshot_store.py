@@ -0,0 +1,147 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+persistent columnar snapshots of the Olist csv files
+
+Beim ersten Einlesen wird jede .csv Datei einmal in ein binäres, spaltenbasiertes
+Feather Snapshot (Apache Arrow IPC, unkomprimiert) umgewandelt. Spätere Läufe
+lesen das Snapshot per memory-map ein und sparen sich das Parsen des Textes.
+Jedes Snapshot ist über Größe, mtime und Hash der Quelldatei identifiziert und
+wird nur neu gebaut, wenn sich die Quelldatei geändert hat.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import hashlib
+import json
+import os
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+
+# stores one feather snapshot and one fingerprint file per table
+class SnapshotStore:
+
+    # @param snapshotFolder: folder in which the snapshots are stored
+    def __init__(self, snapshotFolder):
+        if feather is None:
+            raise ImportError("snapshots require the pyarrow package")
+        self.snapshotFolder = snapshotFolder
+        os.makedirs(self.snapshotFolder, exist_ok=True)
+
+    # returns the table from its snapshot. The snapshot is (re)built with
+    # reader(source) if it does not exist or the source file has changed.
+    # @param table: name of the table
+    # @param source: path of the csv file
+    # @param reader: function that parses the csv file into a DataFrame
+    # @param schemaKey: identifies the dtypes the reader produces
+    # @param columns: optional list of columns, only these are read from the
+    #                 snapshot (a rebuilt snapshot always contains all columns)
+    def getTable(self, table, source, reader, schemaKey="", columns=None):
+        if(self.isValid(table, source, schemaKey)):
+            return self.readSnapshot(table, columns)
+        df = self.buildSnapshot(table, source, reader, schemaKey)
+        if(columns is not None):
+            return df[columns]
+        return df
+
+    # builds the snapshot of a table only if it is missing or outdated
+    def ingest(self, table, source, reader, schemaKey=""):
+        if(not self.isValid(table, source, schemaKey)):
+            self.buildSnapshot(table, source, reader, schemaKey)
+
+    def buildSnapshot(self, table, source, reader, schemaKey):
+        print("building snapshot for " + table)
+        df = reader(source)
+        self.writeSnapshot(table, source, df, schemaKey)
+        return df
+
+    # a snapshot is valid if size, mtime and hash of its source and the schema
+    # are unchanged. The hash is only computed if size and mtime do not already
+    # match, so an unchanged file costs a single stat call.
+    def isValid(self, table, source, schemaKey=""):
+        if(not os.path.exists(self.snapshotPath(table))):
+            return False
+        fingerprint = self.readFingerprint(table)
+        if(fingerprint is None or fingerprint.get("schema") != schemaKey):
+            return False
+        stat = os.stat(source)
+        if(stat.st_size != fingerprint["size"]):
+            return False
+        if(stat.st_mtime_ns == fingerprint["mtime"]):
+            return True
+        # file was touched: only a changed content invalidates the snapshot
+        if(fileHash(source) != fingerprint["hash"]):
+            return False
+        fingerprint["mtime"] = stat.st_mtime_ns
+        self.writeFingerprint(table, fingerprint)
+        return True
+
+    # returns a table derived from several source files, e.g. the order fact
+    # table. It is rebuilt with builder() as soon as one of the sources changes.
+    # @param name: name of the derived table
+    # @param sources: paths of the csv files the table is built from
+    # @param builder: function that builds the DataFrame
+    # @param schemaKey: identifies the dtypes and the version of the builder
+    def getDerivedTable(self, name, sources, builder, schemaKey=""):
+        sourceKey = [[os.stat(source).st_size, os.stat(source).st_mtime_ns] for source in sources]
+        fingerprint = self.readFingerprint(name)
+        if(os.path.exists(self.snapshotPath(name)) and fingerprint is not None
+           and fingerprint.get("sources") == sourceKey and fingerprint.get("schema") == schemaKey):
+            return self.readSnapshot(name)
+        print("building snapshot for " + name)
+        df = builder()
+        self.writeFrame(name, df)
+        self.writeFingerprint(name, {"sources": sourceKey, "schema": schemaKey})
+        return df
+
+    def readSnapshot(self, table, columns=None):
+        arrowTable = feather.read_table(self.snapshotPath(table), columns=columns, memory_map=True)
+        return arrowTable.to_pandas()
+
+    def writeSnapshot(self, table, source, df, schemaKey=""):
+        self.writeFrame(table, df)
+        stat = os.stat(source)
+        self.writeFingerprint(table, {"source": source,
+                                      "size": stat.st_size,
+                                      "mtime": stat.st_mtime_ns,
+                                      "hash": fileHash(source),
+                                      "schema": schemaKey})
+
+    def writeFrame(self, table, df):
+        path = self.snapshotPath(table)
+        temporaryPath = path + ".tmp"
+        feather.write_feather(df.reset_index(drop=True), temporaryPath, compression="uncompressed")
+        os.replace(temporaryPath, path)
+
+    def readFingerprint(self, table):
+        try:
+            with open(self.fingerprintPath(table)) as fingerprintFile:
+                return json.load(fingerprintFile)
+        except (OSError, ValueError):
+            return None
+
+    def writeFingerprint(self, table, fingerprint):
+        with open(self.fingerprintPath(table), "w") as fingerprintFile:
+            json.dump(fingerprint, fingerprintFile, indent=4)
+
+    def snapshotPath(self, table):
+        return os.path.join(self.snapshotFolder, table + ".feather")
+
+    def fingerprintPath(self, table):
+        return os.path.join(self.snapshotFolder, table + ".json")
+
+
+# sha1 of a file, read in blocks of 1 MB
+def fileHash(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as sourceFile:
+        for block in iter(lambda: sourceFile.read(2**20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
@@ -0,0 +1,151 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+in-memory table cache for the DataAccessor
+
+Jede Tabelle wird pro Programmlauf nur einmal eingelesen. Die Tabellen werden
+in einem LRU-Cache mit einem konfigurierbaren Speicherbudget gehalten. Die
+Aufrufer bekommen copy-on-write Sichten, so dass DataWrangler Methoden, die
+Spalten hinzufügen oder überschreiben, den Cache nicht verändern. Dafür
+schaltet der Cache unter pandas 1.5 und 2.x pd.options.mode.copy_on_write
+ein (ab pandas 3.0 immer aktiv); ohne copy-on-write wäre jeder Treffer eine
+vollständige Kopie.
+Fragt ein Aufrufer nur einige Spalten an, bekommt er sie aus dem gecachten
+Frame, sofern dieser alle angefragten Spalten enthält.
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+from collections import OrderedDict
+import threading
+
+import pandas as pd
+
+
+# LRU cache for pandas DataFrames with a memory budget in bytes
+class TableCache:
+
+    # @param maxBytes: memory budget of the cache in bytes
+    def __init__(self, maxBytes):
+        enableCopyOnWrite()
+        self.maxBytes = maxBytes
+        self.tables = OrderedDict()
+        self.sizes = {}
+        self.usedBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # the ExecutionPlanner accesses the cache from several threads
+        self.lock = threading.RLock()
+
+    # returns a copy-on-write view of the cached table or None
+    # @param key: name of the table
+    # @param columns: optional list of columns; a cached frame that lacks one
+    #                 of them counts as miss
+    def get(self, key, columns=None):
+        with self.lock:
+            if key not in self.tables or not self.hasColumns(key, columns):
+                self.misses = self.misses + 1
+                return None
+            self.hits = self.hits + 1
+            self.tables.move_to_end(key)
+            table = self.tables[key]
+        if(columns is not None and list(table.columns) != list(columns)):
+            # selecting columns already returns a new frame
+            return table[columns]
+        return self.view(table)
+
+    # columns of the cached frame or None
+    # @param key: name of the table
+    def getColumns(self, key):
+        with self.lock:
+            if key not in self.tables:
+                return None
+            return list(self.tables[key].columns)
+
+    def hasColumns(self, key, columns):
+        if(columns is None):
+            return True
+        cachedColumns = self.tables[key].columns
+        return all([column in cachedColumns for column in columns])
+
+    # stores a table and evicts the least recently used tables if the
+    # memory budget is exceeded. Tables larger than the budget are not cached.
+    # @param key: name of the table
+    # @param table: DataFrame to cache
+    def put(self, key, table):
+        size = int(table.memory_usage(deep=True).sum())
+        if size > self.maxBytes:
+            return self.view(table)
+        with self.lock:
+            if key in self.tables:
+                self.remove(key)
+            while self.usedBytes + size > self.maxBytes:
+                oldestKey = next(iter(self.tables))
+                self.remove(oldestKey)
+                self.evictions = self.evictions + 1
+            self.tables[key] = table
+            self.sizes[key] = size
+            self.usedBytes = self.usedBytes + size
+        return self.view(table)
+
+    # removes a table from the cache
+    # @param key: name of the table
+    def remove(self, key):
+        del self.tables[key]
+        self.usedBytes = self.usedBytes - self.sizes.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+            self.sizes.clear()
+            self.usedBytes = 0
+
+    # hands out a view of the cached frame. With pandas copy-on-write the
+    # shallow copy shares the data until it is modified, otherwise a deep copy
+    # is necessary to protect the cache against in-place modifications.
+    def view(self, table):
+        if copyOnWriteEnabled():
+            return table.copy(deep=False)
+        return table.copy(deep=True)
+
+    def getStatistics(self):
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "tables": len(self.tables),
+                "usedBytes": self.usedBytes,
+                "maxBytes": self.maxBytes}
+
+    def printStatistics(self):
+        statistics = self.getStatistics()
+        print("table cache: {hits} hits, {misses} misses, {evictions} evictions, "
+              "{tables} tables, {used:.1f} of {max:.1f} MB used".format(
+                  hits=statistics["hits"], misses=statistics["misses"],
+                  evictions=statistics["evictions"], tables=statistics["tables"],
+                  used=statistics["usedBytes"] / 2**20, max=statistics["maxBytes"] / 2**20))
+
+
+# switches on copy-on-write for the whole process, so cache hits are shallow
+# copies. pandas 3.0 always copies on write, older versions than 1.5 do not
+# know the option and keep the deep copies.
+def enableCopyOnWrite():
+    if(int(pd.__version__.split(".")[0]) < 3):
+        try:
+            pd.set_option("mode.copy_on_write", True)
+        except KeyError:
+            pass
+
+
+# copy-on-write is always active from pandas 3.0 on and can be switched on
+# via pd.options.mode.copy_on_write from pandas 1.5 on
+def copyOnWriteEnabled():
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except KeyError:
+        # option unknown in pandas < 1.5
+        return False
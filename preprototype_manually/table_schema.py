@@ -0,0 +1,130 @@
+#!usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+schema-driven dtypes for the tables of config/db.json
+
+Die in der db.json deklarierten types (INT, FLOAT, VARCHAR, TIMESTAMP) werden
+in explizite pandas dtypes übersetzt, statt pandas raten zu lassen:
+  INT       -> kleinster passender Integer-Typ (float64 bei fehlenden Werten)
+  FLOAT     -> float64
+  VARCHAR   -> category bei wenigen unterschiedlichen Werten, sonst string
+  TIMESTAMP -> datetime64, einmalig beim Einlesen geparst
+
+@institution: TH Lübeck
+@project: DiWi WiSe20/21
+
+"""
+import json
+
+import pandas as pd
+
+
+# translates the declared types of one table into pandas dtypes
+class TableSchema:
+
+    # @param tableConfig: config of one table from config/db.json
+    # @param categoricalMaxUnique: VARCHAR columns with at most this many
+    #        distinct values are stored as category
+    def __init__(self, tableConfig, categoricalMaxUnique=100):
+        self.fields = tableConfig["fields"]
+        self.types = [sqlType.split("(")[0].strip().upper() for sqlType in tableConfig["types"]]
+        self.categoricalMaxUnique = categoricalMaxUnique
+
+    # reads a csv file with the declared dtypes
+    # @param source: path of the csv file
+    # @param columns: optional list of columns, the others are not parsed
+    def readCsv(self, source, columns=None):
+        csvDtypes, timestampFields = self.getCsvTypes(columns)
+        df = pd.read_csv(source, dtype=csvDtypes, usecols=columns)
+        return self.applyTypes(df, timestampFields)
+
+    # reads a csv file with the declared dtypes in DataFrames of chunkRows
+    # rows; VARCHAR columns stay text, the categories would differ per chunk
+    # @param columns: optional list of columns, the others are not parsed
+    def readCsvChunks(self, source, columns=None, chunkRows=100000):
+        csvDtypes, timestampFields = self.getCsvTypes(columns)
+        for chunk in pd.read_csv(source, dtype=csvDtypes, usecols=columns, chunksize=chunkRows):
+            yield self.applyTypes(chunk, timestampFields, categoricals=False)
+
+    # dtypes for read_csv and the TIMESTAMP columns to parse afterwards
+    def getCsvTypes(self, columns=None):
+        csvDtypes = {}
+        timestampFields = []
+        for field, sqlType in zip(self.fields, self.types):
+            if(columns is not None and field not in columns):
+                continue
+            if(sqlType == "FLOAT"):
+                csvDtypes[field] = "float64"
+            elif(sqlType == "VARCHAR"):
+                csvDtypes[field] = str
+            elif(sqlType == "TIMESTAMP"):
+                timestampFields.append(field)
+        return csvDtypes, timestampFields
+
+    # converts the columns of an already loaded DataFrame (e.g. from postgres)
+    # @param df: DataFrame with the columns named like in config/db.json
+    # @param timestampFields: TIMESTAMP columns to parse, default all of them
+    # @param categoricals: False leaves VARCHAR columns as they are, e.g. for
+    #        chunks whose categories would differ (see applyCategoricals)
+    def applyTypes(self, df, timestampFields=None, categoricals=True):
+        for field, sqlType in zip(self.fields, self.types):
+            if(field not in df.columns):
+                continue
+            if(sqlType == "INT"):
+                df[field] = self.toInteger(df[field])
+            elif(sqlType == "FLOAT"):
+                df[field] = df[field].astype("float64")
+            elif(sqlType == "VARCHAR" and categoricals):
+                df[field] = self.toCategoricalIfLowCardinality(df[field])
+            elif(sqlType == "TIMESTAMP" and (timestampFields is None or field in timestampFields)):
+                df[field] = pd.to_datetime(df[field])
+        return df
+
+    # converts the low-cardinality VARCHAR columns of the complete table;
+    # columns already replaced by surrogate keys stay integers
+    def applyCategoricals(self, df):
+        for field, sqlType in zip(self.fields, self.types):
+            if(field in df.columns and sqlType == "VARCHAR" and not pd.api.types.is_integer_dtype(df[field].dtype)):
+                df[field] = self.toCategoricalIfLowCardinality(df[field])
+        return df
+
+    def toInteger(self, column):
+        if(column.isna().any()):
+            return column.astype("float64")
+        return pd.to_numeric(column, downcast="integer")
+
+    def toCategoricalIfLowCardinality(self, column):
+        if(isinstance(column.dtype, pd.CategoricalDtype)):
+            return column
+        if(column.nunique() <= self.categoricalMaxUnique):
+            return column.astype("category")
+        return column
+
+    # identifies the schema, e.g. to invalidate snapshots after a change of db.json
+    def getKey(self):
+        return json.dumps([self.fields, self.types, self.categoricalMaxUnique])
+
+
+# compares the memory usage of untyped and typed loading per table
+# @param db_config: parsed config/db.json
+# @param schemas: dict table name -> TableSchema
+def printMemoryReport(db_config, schemas):
+    print("table           untyped (MB)   typed (MB)   saved (MB)   saved (%)")
+    totalUntyped = 0
+    totalTyped = 0
+    for table in db_config["tables"]:
+        source = db_config["tables"][table]["source"]
+        untypedBytes = int(pd.read_csv(source).memory_usage(deep=True).sum())
+        typedBytes = int(schemas[table].readCsv(source).memory_usage(deep=True).sum())
+        printMemoryReportLine(table, untypedBytes, typedBytes)
+        totalUntyped = totalUntyped + untypedBytes
+        totalTyped = totalTyped + typedBytes
+    printMemoryReportLine("total", totalUntyped, totalTyped)
+
+
+def printMemoryReportLine(name, untypedBytes, typedBytes):
+    savedBytes = untypedBytes - typedBytes
+    print("{:<15} {:>12.2f} {:>12.2f} {:>12.2f} {:>11.1f}".format(
+        name, untypedBytes / 2**20, typedBytes / 2**20, savedBytes / 2**20,
+        100 * savedBytes / untypedBytes if untypedBytes else 0))